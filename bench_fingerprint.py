@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: history fingerprinting (normalize_and_hash) over a corpus of
+realistic statements - ORM-generated IN lists, multi-row inserts, OLTP
+lookups with literals and binds, and doc_st_monster_query.txt.
+
+Reports per-statement cost cold (memo and tokenizer cache cleared) and warm
+(memo hit), and how many distinct fingerprints the corpus collapses to
+compared with plain literal replacement.
+
+Usage:
+    python bench_fingerprint.py [iterations]
+"""
+
+import sys
+import time
+import random
+import hashlib
+sys.path.insert(0, 'server')
+
+from sql_lexer import tokenize, rebuild, NUMBER, STRING
+from history_tracker import normalize_and_hash, fingerprint_memo
+
+SQL_FILE = "doc_st_monster_query.txt"
+
+
+def build_corpus(seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    corpus = []
+    for _ in range(300):
+        ids = ", ".join(str(rnd.randint(1, 10**6)) for _ in range(rnd.randint(1, 60)))
+        corpus.append(f"SELECT o.id, o.status, o.total FROM orders o WHERE o.customer_id IN ({ids}) ORDER BY o.id")
+    for _ in range(200):
+        rows = ", ".join(f"({rnd.randint(1, 9999)}, 'sku-{rnd.randint(1, 999)}', {rnd.random():.2f})"
+                         for _ in range(rnd.randint(1, 25)))
+        corpus.append(f"INSERT INTO order_lines (order_id, sku, price) VALUES {rows}")
+    for _ in range(300):
+        corpus.append(
+            f"select * from customer c join accounts a on a.customer_id = c.id "
+            f"where c.id = {rnd.randint(1, 10**6)} and a.status = '{rnd.choice(['OPEN', 'CLOSED'])}' "
+            f"and a.created_at > sysdate - {rnd.randint(1, 90)}"
+        )
+    for _ in range(200):
+        binds = ", ".join(f":{i}" for i in range(1, rnd.randint(2, 40)))
+        corpus.append(f"SELECT * FROM merchant_statement WHERE contract_id IN ({binds}) AND period = :period")
+    with open(SQL_FILE, encoding="utf-8") as f:
+        corpus.append(f.read())
+    rnd.shuffle(corpus)
+    return corpus
+
+
+def literal_only_fingerprint(sql: str) -> str:
+    """Reference: literals replaced, nothing collapsed."""
+    def placeholder(token):
+        if token.kind == NUMBER:
+            return ':N'
+        if token.kind == STRING:
+            return ':S'
+        return token.value
+    return hashlib.md5(rebuild(tokenize(sql), placeholder).upper().encode()).hexdigest()
+
+
+def timed(fn, corpus, iterations: int) -> float:
+    """Average microseconds per statement."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for sql in corpus:
+            fn(sql)
+    return (time.perf_counter() - started) * 1e6 / (iterations * len(corpus))
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    corpus = build_corpus()
+
+    def cold(sql):
+        fingerprint_memo.clear()
+        tokenize.cache_clear()
+        normalize_and_hash(sql)
+
+    def reference_cold(sql):
+        tokenize.cache_clear()
+        literal_only_fingerprint(sql)
+
+    normalize_and_hash(corpus[0])  # warm-up (imports, regex compilation)
+
+    print(f"📄 corpus: {len(corpus):,} statements, {sum(map(len, corpus)):,} chars, {iterations} iterations")
+    print(f"   literal-only reference (cold): {timed(reference_cold, corpus, iterations):8.2f} µs/stmt")
+    print(f"   normalize_and_hash (cold):     {timed(cold, corpus, iterations):8.2f} µs/stmt")
+    for sql in corpus:
+        normalize_and_hash(sql)
+    print(f"   normalize_and_hash (memo hit): {timed(normalize_and_hash, corpus, iterations):8.2f} µs/stmt")
+    print(f"   distinct fingerprints: {len({literal_only_fingerprint(s) for s in corpus}):,} literal-only"
+          f" → {len({normalize_and_hash(s) for s in corpus}):,} collapsed")
+    print(f"   memo: {fingerprint_memo.stats()}")
+
+
+if __name__ == "__main__":
+    main()
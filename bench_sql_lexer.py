@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: end-to-end SQL text processing cost per analysis request.
+
+Runs every consumer of the shared token stream (fingerprint, safety
+validation, table and column extraction) on doc_st_monster_query.txt,
+cold (tokenizer cache cleared) and warm (token stream memoized).
+
+Usage:
+    python bench_sql_lexer.py [iterations]
+"""
+
+import sys
+import time
+sys.path.insert(0, 'server')
+
+from sql_lexer import tokenize
+from history_tracker import normalize_and_hash
+from tools.oracle_collector_impl import validate_sql, extract_sql_objects, extract_columns_from_sql
+
+SQL_FILE = "doc_st_monster_query.txt"
+
+
+def one_request(sql: str):
+    normalize_and_hash(sql)
+    validate_sql(None, sql)
+    extract_sql_objects(sql)
+    extract_columns_from_sql(sql)
+
+
+def timed(fn, iterations: int) -> float:
+    """Average milliseconds per call."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) * 1000 / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with open(SQL_FILE, encoding="utf-8") as f:
+        sql = f.read()
+
+    def tokenize_cold():
+        tokenize.cache_clear()
+        tokenize(sql)
+
+    def request_cold():
+        tokenize.cache_clear()
+        one_request(sql)
+
+    def request_warm():
+        one_request(sql)
+
+    one_request(sql)  # warm-up (imports, regex compilation)
+
+    print(f"📄 {SQL_FILE}: {len(sql):,} chars, {len(tokenize(sql)):,} tokens, {iterations} iterations")
+    print(f"   tokenize (cold):            {timed(tokenize_cold, iterations):8.3f} ms")
+    print(f"   full request (cold cache):  {timed(request_cold, iterations):8.3f} ms")
+    print(f"   full request (warm cache):  {timed(request_warm, iterations):8.3f} ms")
+    print(f"   cache: {tokenize.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
         self.config = config
         self.public_paths = [
             "/healthz",
+            "/readyz",
             "/version",
             "/_info",
         ]
@@ -1,7 +1,6 @@
 import yaml
 import os
 import logging
-import sys
 
 SETTINGS_PATH = os.path.join(os.path.dirname(__file__), "config/settings.yaml")
 
@@ -25,21 +24,38 @@ class Config:
 
         # Logging configuration
         log_config = self._raw.get("logging", {})
+        self.logging = log_config
         self.log_level = log_config.get("level", "INFO").upper()
         self.show_tool_calls = log_config.get("show_tool_calls", True)
         self.show_sql_queries = log_config.get("show_sql_queries", False)
-        
-        # DEBUG: Force print to stderr to see in Docker logs
-        sys.stderr.write(f"[CONFIG-DEBUG] show_sql_queries = {self.show_sql_queries}\n")
-        sys.stderr.flush()
 
         # Oracle analysis configuration
         oracle_analysis = self._raw.get("oracle_analysis", {})
         self.output_preset = oracle_analysis.get("output_preset", "standard").lower()
+        self.metadata_cache = oracle_analysis.get("metadata_cache", {})
+        self.plan_table = oracle_analysis.get("plan_table", "PLAN_TABLE")
 
         # Performance monitoring configuration
         self.performance_monitoring = self._raw.get("performance_monitoring", {})
 
+        # Connectivity probing (list_available_databases, startup checks)
+        self.connectivity = self._raw.get("connectivity", {})
+
+        # Result cache shared by the analyze_* tools
+        self.result_cache = self._raw.get("result_cache", {})
+
+        # analyze_*_queries_batch limits
+        self.batch_analysis = self._raw.get("batch_analysis", {})
+
+        # SQLite database shared by history and snapshots
+        self.storage = self._raw.get("storage", {})
+
+        # SQLite query history store (WAL, write-behind batching)
+        self.query_history = self._raw.get("query_history", {})
+
+        # Phase timing / metrics
+        self.metrics = self._raw.get("metrics", {})
+
         # Database presets
         self.database_presets = self._raw.get("database_presets", {})
 
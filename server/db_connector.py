@@ -1,35 +1,178 @@
 # server/db_connector.py
 
 import os
+import time
+import threading
+from contextlib import contextmanager
+
 import oracledb
 import logging
 from config import config
+from metrics import register_collector
 
 logger = logging.getLogger("db-check")
 
 # Ensure UTF-8 handling for Oracle Thin mode
 os.environ["NLS_LANG"] = ".AL32UTF8"
 
+# Pool defaults - override per preset with a `pool:` block in settings.yaml
+DEFAULT_POOL_SETTINGS = {
+    "min": 1,
+    "max": 4,
+    "increment": 1,
+    "ping_interval": 60,     # seconds; liveness check on acquire after idle
+    "wait_timeout": 5000,    # milliseconds to wait for a free session
+    "stmtcachesize": 50,
+}
+
 
 class OracleConnector:
-    def connect(self, preset_name: str):
+    """
+    Per-preset oracledb session pools.
+
+    connect()/acquire() hand out a pooled session, release() (or conn.close())
+    returns it. Pools are created lazily on first use, one per preset.
+    """
+
+    def __init__(self):
+        self._pools = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _pool_settings(self, preset_name: str) -> dict:
         p = config.get_db_preset(preset_name)
+        settings = dict(DEFAULT_POOL_SETTINGS)
+        settings.update(p.get("pool", {}) or {})
+        return settings
 
-        # Thin mode → cannot use encoding=
-        return oracledb.connect(
-            user=p["user"],
-            password=p["password"],
-            dsn=p["dsn"]
-        )
+    def _get_or_create_pool(self, preset_name: str):
+        pool = self._pools.get(preset_name)
+        if pool is not None:
+            return pool
+
+        with self._lock:
+            if preset_name in self._pools:
+                return self._pools[preset_name]
+
+            p = config.get_db_preset(preset_name)
+            s = self._pool_settings(preset_name)
+
+            logger.debug(
+                f"🔗 Creating Oracle pool for '{preset_name}' "
+                f"(min={s['min']}, max={s['max']}, increment={s['increment']})"
+            )
+
+            # Thin mode → cannot use encoding=
+            pool = oracledb.create_pool(
+                user=p["user"],
+                password=p["password"],
+                dsn=p["dsn"],
+                min=s["min"],
+                max=s["max"],
+                increment=s["increment"],
+                ping_interval=s["ping_interval"],
+                wait_timeout=s["wait_timeout"],
+                stmtcachesize=s["stmtcachesize"],
+                getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+            )
+
+            self._pools[preset_name] = pool
+            self._stats[preset_name] = {
+                "acquires": 0,
+                "waits": 0,
+                "wait_time_ms": 0.0,
+                "failures": 0,
+            }
+            return pool
+
+    def acquire(self, preset_name: str):
+        """Acquire a pooled session for the preset (blocks up to wait_timeout)."""
+        pool = self._get_or_create_pool(preset_name)
+        stats = self._stats[preset_name]
+
+        # A wait is an acquire that found every open session busy at the cap
+        must_wait = pool.busy >= pool.opened and pool.opened >= pool.max
+        started = time.perf_counter()
 
-    def test_connection(self, preset_name: str) -> bool:
         try:
-            conn = self.connect(preset_name)
-            cur = conn.cursor()
-            cur.execute("SELECT 1 FROM dual")
-            cur.fetchone()
-            cur.close()
+            conn = pool.acquire()
+        except Exception:
+            with self._stats_lock:
+                stats["failures"] += 1
+            raise
+
+        with self._stats_lock:
+            stats["acquires"] += 1
+            if must_wait:
+                stats["waits"] += 1
+                stats["wait_time_ms"] += (time.perf_counter() - started) * 1000
+        return conn
+
+    def release(self, conn):
+        """Return a session to its pool. Safe to call with None."""
+        if conn is None:
+            return
+        try:
             conn.close()
+        except Exception as e:
+            logger.debug(f"Ignoring error on session release: {e}")
+
+    @contextmanager
+    def connection(self, preset_name: str):
+        """Context manager: acquire on enter, release on exit."""
+        conn = self.acquire(preset_name)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    # Backward-compatible name used by the tools
+    connect = acquire
+
+    def get_pool_stats(self) -> dict:
+        """Busy/open/wait counters per preset pool, for operators."""
+        result = {}
+        for name, pool in list(self._pools.items()):
+            s = self._pool_settings(name)
+            stats = self._stats.get(name, {})
+            try:
+                busy, opened = pool.busy, pool.opened
+            except Exception:
+                busy, opened = None, None
+            result[name] = {
+                "busy": busy,
+                "open": opened,
+                "min": s["min"],
+                "max": s["max"],
+                "increment": s["increment"],
+                "ping_interval": s["ping_interval"],
+                "wait_timeout_ms": s["wait_timeout"],
+                "acquires": stats.get("acquires", 0),
+                "waits": stats.get("waits", 0),
+                "avg_wait_ms": round(stats["wait_time_ms"] / stats["waits"], 2) if stats.get("waits") else 0.0,
+                "failures": stats.get("failures", 0),
+            }
+        return result
+
+    def close_all_pools(self):
+        """Close every pool (for shutdown)."""
+        with self._lock:
+            for name, pool in self._pools.items():
+                try:
+                    pool.close(force=True)
+                    logger.info(f"🔒 Closed Oracle pool for '{name}'")
+                except Exception as e:
+                    logger.warning(f"⚠️  Error closing pool for '{name}': {e}")
+            self._pools.clear()
+
+    def test_connection(self, preset_name: str) -> bool:
+        try:
+            with self.connection(preset_name) as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT 1 FROM dual")
+                cur.fetchone()
+                cur.close()
             logger.info(f"   ✅ {preset_name} (Oracle)")
             return True
         except Exception as e:
@@ -39,6 +182,21 @@ class OracleConnector:
 oracle_connector = OracleConnector()
 
 
+@register_collector
+def _pool_metrics():
+    pools = oracle_connector.get_pool_stats()
+    def samples(key):
+        return [({"preset": name}, s[key]) for name, s in pools.items()]
+    return [
+        ("metaquery_oracle_pool_busy_sessions", "gauge", "Sessions checked out of the pool", samples("busy")),
+        ("metaquery_oracle_pool_open_sessions", "gauge", "Sessions open in the pool", samples("open")),
+        ("metaquery_oracle_pool_max_sessions", "gauge", "Pool size cap", samples("max")),
+        ("metaquery_oracle_pool_acquires_total", "counter", "Session acquires", samples("acquires")),
+        ("metaquery_oracle_pool_waits_total", "counter", "Acquires that waited for a free session", samples("waits")),
+        ("metaquery_oracle_pool_failures_total", "counter", "Acquires that failed", samples("failures")),
+    ]
+
+
 # =============================================================================
 # UNIFIED DATABASE CONNECTOR - Routes to Oracle or MySQL based on config
 # =============================================================================
@@ -0,0 +1,246 @@
+# server/db_probe.py
+# Concurrent, cached connectivity probing for all database presets
+
+import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from config import config
+from db_connector import oracle_connector
+
+logger = logging.getLogger("db-probe")
+
+_settings = config.connectivity
+PROBE_TIMEOUT = _settings.get("probe_timeout_seconds", 10)
+CACHE_TTL = _settings.get("cache_ttl_seconds", 300)
+REFRESH_INTERVAL = _settings.get("refresh_interval_seconds", 240)
+MAX_WORKERS = _settings.get("max_workers", 8)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="db-probe")
+_lock = threading.RLock()  # re-entrant: done-callbacks may fire inside refresh()
+_results = {}       # db_name -> db_info dict (latest completed or timed-out probe)
+_in_flight = {}     # db_name -> Future still running
+_last_refresh = None
+_refresher = None
+_stop = threading.Event()
+initial_checks_done = threading.Event()  # set once the first full probe round finished
+
+
+def _base_info(db_name: str, db_config: dict) -> dict:
+    db_type = db_config.get("type", "oracle")
+    db_info = {
+        "name": db_name,
+        "type": db_type,
+        "user": db_config.get("user", ""),
+        "status": "unknown",
+        "message": ""
+    }
+
+    # Add type-specific connection info
+    if db_type == "oracle":
+        db_info["dsn"] = db_config.get("dsn", "")
+    elif db_type == "mysql":
+        db_info["host"] = db_config.get("host", "")
+        db_info["port"] = db_config.get("port", 3306)
+        db_info["database"] = db_config.get("database", "")
+    return db_info
+
+
+def probe_database(db_name: str) -> dict:
+    """
+    Test one preset and return its status dict.
+    Never raises - failures are reported in status/message.
+    """
+    db_config = config.get_db_preset(db_name)
+    db_type = db_config.get("type", "oracle")
+    db_info = _base_info(db_name, db_config)
+    started = time.perf_counter()
+
+    try:
+        if db_type == "oracle":
+            version = "Unknown"
+            db_instance = "Unknown"
+
+            with oracle_connector.connection(db_name) as conn:
+                cur = conn.cursor()
+
+                # Try to get database version and name (requires V$ access)
+                try:
+                    cur.execute("SELECT banner FROM v$version WHERE ROWNUM = 1")
+                    row = cur.fetchone()
+                    if row:
+                        version = row[0]
+
+                    cur.execute("SELECT name FROM v$database")
+                    row = cur.fetchone()
+                    if row:
+                        db_instance = row[0]
+                except Exception as v_error:
+                    # User doesn't have V$ access, but connection is valid
+                    if "ORA-00942" in str(v_error):
+                        logger.info(f"⚠️  {db_name}: Connected but no V$ view access")
+                    else:
+                        raise  # Re-raise if it's not a permission issue
+
+            db_info["status"] = "accessible"
+            db_info["message"] = "Connected successfully" if version != "Unknown" else "Connected (limited V$ access)"
+            db_info["version"] = version
+            db_info["instance"] = db_instance
+            logger.info(f"✅ {db_name}: accessible")
+
+        elif db_type == "mysql":
+            import mysql_connector
+            success, message = mysql_connector.test_connection(db_name)
+
+            if success:
+                db_info["status"] = "accessible"
+                db_info["message"] = message
+                # Extract version from message (format: "Connected successfully. MySQL version: X.X.X")
+                if "MySQL version:" in message:
+                    db_info["version"] = message.split("MySQL version:")[-1].strip()
+                logger.info(f"✅ {db_name}: accessible")
+            else:
+                db_info["status"] = "error"
+                db_info["message"] = message
+                logger.warning(f"❌ {db_name}: {message}")
+        else:
+            db_info["status"] = "error"
+            db_info["message"] = f"Unsupported database type: {db_type}"
+            logger.warning(f"❌ {db_name}: Unsupported type {db_type}")
+
+    except Exception as e:
+        db_info["status"] = "error"
+        db_info["message"] = str(e)
+        logger.warning(f"❌ {db_name}: {e}")
+
+    db_info["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    db_info["checked_at"] = datetime.now().isoformat()
+    return db_info
+
+
+def _store(db_name: str, future):
+    """Done-callback: record the probe result, even if it finished after the deadline."""
+    try:
+        info = future.result()
+    except Exception as e:
+        info = _base_info(db_name, config.get_db_preset(db_name))
+        info.update({"status": "error", "message": str(e), "checked_at": datetime.now().isoformat()})
+    with _lock:
+        _results[db_name] = info
+        if _in_flight.get(db_name) is future:
+            del _in_flight[db_name]
+
+
+def refresh(timeout: float = None) -> dict:
+    """
+    Probe every preset concurrently and wait at most `timeout` seconds.
+
+    Presets that do not answer in time are reported with status "timeout";
+    their probe keeps running and updates the cache when it completes.
+    A preset whose previous probe is still running is not probed again.
+    """
+    global _last_refresh
+    timeout = PROBE_TIMEOUT if timeout is None else timeout
+
+    futures = {}
+    with _lock:
+        for db_name in config.database_presets:
+            future = _in_flight.get(db_name)
+            if future is None:
+                future = _executor.submit(probe_database, db_name)
+                _in_flight[db_name] = future
+                future.add_done_callback(lambda f, name=db_name: _store(name, f))
+            futures[db_name] = future
+
+    wait(futures.values(), timeout=timeout)
+
+    now = datetime.now().isoformat()
+    with _lock:
+        for db_name, future in futures.items():
+            if not future.done():
+                info = _base_info(db_name, config.get_db_preset(db_name))
+                info.update({
+                    "status": "timeout",
+                    "message": f"No response within {timeout}s (probe still running)",
+                    "checked_at": now
+                })
+                _results[db_name] = info
+        _last_refresh = time.time()
+        return dict(_results)
+
+
+def get_statuses(refresh_now: bool = False) -> tuple:
+    """
+    Return (results, as_of_epoch, from_cache).
+
+    Serves from the cache while it is younger than CACHE_TTL; otherwise
+    (or when refresh_now is set, or nothing was probed yet) probes first.
+    """
+    with _lock:
+        fresh = _last_refresh is not None and (time.time() - _last_refresh) < CACHE_TTL
+        if fresh and not refresh_now:
+            return dict(_results), _last_refresh, True
+
+    results = refresh()
+    return results, _last_refresh, False
+
+
+def _refresh_loop(on_first_refresh=None):
+    first = True
+    while not _stop.is_set():
+        try:
+            results = refresh()
+            if first and on_first_refresh:
+                on_first_refresh(results)
+        except Exception as e:
+            logger.warning(f"⚠️  Background connectivity refresh failed: {e}")
+        if first:
+            initial_checks_done.set()
+            first = False
+        _stop.wait(REFRESH_INTERVAL)
+
+
+def start_background_refresh(on_first_refresh=None):
+    """
+    Start the periodic refresher thread (idempotent).
+    The first round runs immediately; on_first_refresh(results) is called after it.
+    """
+    global _refresher
+    with _lock:
+        if _refresher is not None and _refresher.is_alive():
+            return
+        _stop.clear()
+        _refresher = threading.Thread(
+            target=_refresh_loop, args=(on_first_refresh,),
+            name="db-probe-refresh", daemon=True
+        )
+        _refresher.start()
+    logger.info(f"🔄 Connectivity refresher started (every {REFRESH_INTERVAL}s)")
+
+
+def stop_background_refresh():
+    _stop.set()
+
+
+def readiness() -> tuple:
+    """
+    Return (ready, per_database) for the /readyz endpoint.
+    The server is ready once the first probe round completed; each database
+    reports its own readiness from the latest probe.
+    """
+    with _lock:
+        results = dict(_results)
+    databases = {}
+    for db_name in config.database_presets:
+        info = results.get(db_name)
+        databases[db_name] = {
+            "type": config.database_presets[db_name].get("type", "oracle"),
+            "ready": bool(info) and info["status"] == "accessible",
+            "status": info["status"] if info else "pending",
+            "message": info.get("message", "") if info else "",
+            "checked_at": info.get("checked_at") if info else None,
+            "latency_ms": info.get("latency_ms") if info else None,
+        }
+    return initial_checks_done.is_set(), databases
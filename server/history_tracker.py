@@ -1,78 +1,485 @@
 # server/history_tracker.py
 # Query execution history tracking with SQLite
 
-import sqlite3
 import hashlib
-import re
 import json
+import time
+import zlib
+import queue
+import atexit
 import logging
+import threading
 from datetime import datetime
-from pathlib import Path
+from collections import OrderedDict
+
+from config import config
+from storage import Storage, storage
+from plan_digest import encode_plan, plan_digest
+from sql_lexer import tokenize, NUMBER, STRING, BIND, WORD, OP, PUNCT
+from metrics import SQLITE_WRITE_SECONDS, register_collector
 
 logger = logging.getLogger("history_tracker")
 
-# Database location
-DATA_DIR = Path(__file__).parent / "data"
-DATA_DIR.mkdir(exist_ok=True)
-DB_PATH = DATA_DIR / "query_history.db"
-
-
-def init_db():
-    """Initialize the SQLite database with schema."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS executions (
-            fingerprint TEXT NOT NULL,
-            db_name TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            plan_hash TEXT,
-            cost INTEGER,
-            table_stats TEXT,
-            plan_operations TEXT
-        )
-    """)
-    conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_lookup 
-        ON executions(fingerprint, db_name, timestamp DESC)
-    """)
-    conn.commit()
-    conn.close()
-    logger.info(f"📁 History database initialized at {DB_PATH}")
+# Database location (storage.path in settings.yaml)
+DB_PATH = storage.db_path
+
+INSERT_EXECUTION = """
+    INSERT INTO executions (fingerprint, db_name, timestamp, plan_hash, cost,
+                            table_stats, plan_operations, plan_digest, runtime_stats)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Full plans, content-addressed: one compressed blob per distinct plan
+INSERT_PLAN = """
+    INSERT OR IGNORE INTO plans (digest, plan_hash, codec, raw_bytes, plan, first_seen)
+    VALUES (?, ?, 'zlib', ?, ?, ?)
+"""
+
+# Per-(fingerprint, preset) running aggregates, updated in O(1) per insert.
+# Welford mean/M2 and EWMA of cost; every SET expression reads the old row.
+UPSERT_BASELINE = """
+    INSERT INTO baselines (fingerprint, db_name, executions, cost_samples, cost_mean, cost_m2,
+                           cost_ewma, last_plan_hash, first_seen, last_seen)
+    VALUES (?1, ?2, 1, ?3 IS NOT NULL, CAST(?3 AS REAL), 0.0, CAST(?3 AS REAL), ?4, ?5, ?5)
+    ON CONFLICT (fingerprint, db_name) DO UPDATE SET
+        executions = executions + 1,
+        cost_samples = cost_samples + (excluded.cost_mean IS NOT NULL),
+        cost_mean = CASE
+            WHEN excluded.cost_mean IS NULL THEN cost_mean
+            WHEN cost_mean IS NULL THEN excluded.cost_mean
+            ELSE cost_mean + (excluded.cost_mean - cost_mean) / (cost_samples + 1) END,
+        cost_m2 = CASE
+            WHEN excluded.cost_mean IS NULL OR cost_mean IS NULL THEN cost_m2
+            ELSE cost_m2 + (excluded.cost_mean - cost_mean)
+                 * (excluded.cost_mean - (cost_mean + (excluded.cost_mean - cost_mean) / (cost_samples + 1))) END,
+        cost_ewma = CASE
+            WHEN excluded.cost_mean IS NULL THEN cost_ewma
+            WHEN cost_ewma IS NULL THEN excluded.cost_mean
+            ELSE ?6 * excluded.cost_mean + (1 - ?6) * cost_ewma END,
+        last_plan_hash = excluded.last_plan_hash,
+        first_seen = MIN(first_seen, excluded.first_seen),
+        last_seen = MAX(last_seen, excluded.last_seen)
+"""
+
+# One row per distinct plan of a fingerprint, keyed by structural digest
+# (plan_key; 'plan_hash:<hash>' for executions stored without a plan)
+UPSERT_BASELINE_PLAN = """
+    INSERT INTO baseline_plans (fingerprint, db_name, plan_key, plan_hash, plan_digest, executions, first_seen, last_seen)
+    VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+    ON CONFLICT (fingerprint, db_name, plan_key) DO UPDATE SET
+        executions = executions + 1,
+        plan_hash = excluded.plan_hash,
+        last_seen = MAX(last_seen, excluded.last_seen)
+"""
+
+_baseline_settings = config.query_history.get("baseline", {})
+EWMA_ALPHA = _baseline_settings.get("ewma_alpha", 0.3)
+MIN_BASELINE_EXECUTIONS = _baseline_settings.get("min_executions", 3)
+COST_CHANGE_PCT = _baseline_settings.get("cost_change_pct", 10)
+Z_THRESHOLD = _baseline_settings.get("z_threshold", 2.0)
+
+# Queue markers for the writer thread
+_FLUSH = object()
+_STOP = object()
+
+
+def plan_key(digest, plan_hash) -> str:
+    """baseline_plans key: the structural digest, else the plan hash of a plan-less execution."""
+    return digest or f"plan_hash:{plan_hash}"
+
+
+def update_baselines(conn, rows):
+    """Fold executions rows (fingerprint, db_name, timestamp, plan_hash, cost, ..., plan_digest) into the baselines."""
+    conn.executemany(UPSERT_BASELINE, [
+        (r[0], r[1], r[4], r[3], r[2], EWMA_ALPHA) for r in rows
+    ])
+    conn.executemany(UPSERT_BASELINE_PLAN, [
+        (r[0], r[1], plan_key(r[7], r[3]), r[3], r[7], r[2], r[2]) for r in rows
+    ])
+
+
+def store_plans(conn, plans):
+    """Insert (digest, plan_hash, json_text) plans not stored yet, zlib-compressed."""
+    now = datetime.now().isoformat()
+    for digest, plan_hash, text in {p[0]: p for p in plans}.values():
+        if conn.execute("SELECT 1 FROM plans WHERE digest = ?", (digest,)).fetchone():
+            continue  # compress only plans we have never seen
+        raw = text.encode()
+        conn.execute(INSERT_PLAN, (digest, plan_hash, len(raw), zlib.compress(raw, 6), now))
+
+
+class HistoryStore:
+    """
+    Query history writes and reads on top of the shared Storage.
+
+    - WAL journal + busy_timeout (see storage.py): readers never block the
+      writer and lock contention waits instead of failing
+    - one persistent connection per thread (no connect() per call)
+    - write-behind: inserts are queued and a background thread writes them in
+      batched transactions (one commit per batch instead of per row)
+    - flush() before reads keeps read-your-writes; close() flushes on shutdown
+    """
+
+    def __init__(self, store: Storage, write_behind: bool = True, batch_size: int = 200,
+                 flush_interval_ms: int = 200, max_queue: int = 10000):
+        self.storage = store
+        self.db_path = store.db_path
+        self.write_behind = write_behind
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue = max_queue
+
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._enqueued = 0      # rows handed to the writer
+        self._processed = 0     # rows the writer has written (or failed to)
+        self._writer = None
+        self._closed = False
+
+        self.batches = 0
+        self.rows_written = 0
+        self.failed_rows = 0
+        self.sync_writes = 0
+        self.flush_seconds_total = 0.0
+        self.last_flush_ms = None
+        self.max_flush_ms = 0.0
+
+    # --------------------------------------------------------
+    # Connections
+    # --------------------------------------------------------
+    def connect(self):
+        return self.storage.connect()
+
+    # --------------------------------------------------------
+    # Writes
+    # --------------------------------------------------------
+    def _insert(self, conn, items, operation: str):
+        rows = [row for row, _ in items]
+        with SQLITE_WRITE_SECONDS.time((operation,)):
+            with conn:  # one transaction
+                store_plans(conn, [plan for _, plan in items if plan])
+                conn.executemany(INSERT_EXECUTION, rows)
+                update_baselines(conn, rows)
+
+    def add(self, row: tuple, plan: tuple = None):
+        """
+        Queue one executions row (written synchronously when write-behind is
+        off or full). plan: optional (digest, plan_hash, json_text) to store
+        alongside if that digest is new.
+        """
+        if not self.write_behind or self._closed or self._queue.qsize() >= self.max_queue:
+            self._insert(self.connect(), [(row, plan)], "history_insert")
+            with self._cond:
+                self.sync_writes += 1
+                self.rows_written += 1
+            return
+
+        with self._cond:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="history-writer", daemon=True)
+                self._writer.start()
+            self._enqueued += 1
+            self._queue.put((row, plan))
+
+    def _run_writer(self):
+        conn = self.connect()
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [] if item is _FLUSH else [item]
+            # Gather up to batch_size rows or until flush_interval has passed;
+            # a flush request writes what we have immediately
+            deadline = time.monotonic() + self.flush_interval
+            while batch and item is not _FLUSH and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                elif item is not _FLUSH:
+                    batch.append(item)
+                if stop:
+                    break
+            if batch:
+                self._write_batch(conn, batch)
+
+        # Drain whatever is left after the stop marker
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _FLUSH and item is not _STOP:
+                rest.append(item)
+        for i in range(0, len(rest), self.batch_size):
+            self._write_batch(conn, rest[i:i + self.batch_size])
+        self.storage.close_thread_connection()
+
+    def _write_batch(self, conn, batch):
+        started = time.perf_counter()
+        ok = True
+        try:
+            self._insert(conn, batch, "history_batch")
+        except Exception as e:
+            ok = False
+            logger.warning(f"⚠️  Failed to write {len(batch)} history row(s): {e}")
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._processed += len(batch)
+            if ok:
+                self.rows_written += len(batch)
+                self.batches += 1
+                self.flush_seconds_total += elapsed
+                self.last_flush_ms = round(elapsed * 1000, 2)
+                self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            else:
+                self.failed_rows += len(batch)
+            self._cond.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every row queued so far is written. False on timeout."""
+        with self._cond:
+            target = self._enqueued
+            if self._processed >= target or self._writer is None:
+                return True
+        self._queue.put(_FLUSH)
+        with self._cond:
+            return self._cond.wait_for(lambda: self._processed >= target, timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Flush queued rows and stop the writer (idempotent; registered atexit)."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            writer = self._writer
+        if writer is not None:
+            self._queue.put(_STOP)
+            writer.join(timeout)
+            if writer.is_alive():
+                logger.warning(f"⚠️  History writer did not finish within {timeout}s")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "db_path": self.db_path,
+                "journal_mode": self.storage.journal_mode,
+                "write_behind": self.write_behind,
+                "queue_depth": self._enqueued - self._processed,
+                "rows_queued": self._enqueued,
+                "rows_written": self.rows_written,
+                "failed_rows": self.failed_rows,
+                "sync_writes": self.sync_writes,
+                "batches": self.batches,
+                "avg_batch_rows": round((self.rows_written - self.sync_writes) / self.batches, 1) if self.batches else 0.0,
+                "last_flush_ms": self.last_flush_ms,
+                "avg_flush_ms": round(self.flush_seconds_total / self.batches * 1000, 2) if self.batches else None,
+                "max_flush_ms": round(self.max_flush_ms, 2),
+            }
+
+
+_settings = config.query_history
+history_store = HistoryStore(
+    storage,
+    write_behind=_settings.get("write_behind", True),
+    batch_size=_settings.get("batch_size", 200),
+    flush_interval_ms=_settings.get("flush_interval_ms", 200),
+    max_queue=_settings.get("max_queue", 10000),
+)
+atexit.register(history_store.close)
+
+
+@register_collector
+def _history_metrics():
+    stats = history_store.stats()
+    return [
+        ("metaquery_history_queue_depth", "gauge", "History rows waiting for the background writer",
+         [({}, stats["queue_depth"])]),
+        ("metaquery_history_rows_written_total", "counter", "History rows written to SQLite",
+         [({}, stats["rows_written"])]),
+        ("metaquery_history_failed_rows_total", "counter", "History rows lost to write errors",
+         [({}, stats["failed_rows"])]),
+    ]
+
+
+def init_db(store: HistoryStore = None):
+    """
+    Bring the schema up to date (storage migrations) and build baselines
+    from existing history the first time they are empty.
+    """
+    store = store or history_store
+    store.storage.migrate()
+    conn = store.connect()
+    with conn:
+        if conn.execute("SELECT 1 FROM baselines LIMIT 1").fetchone() is None:
+            rows = conn.execute("""
+                SELECT fingerprint, db_name, timestamp, plan_hash, cost, table_stats, plan_operations, plan_digest
+                FROM executions ORDER BY timestamp
+            """).fetchall()
+            if rows:
+                update_baselines(conn, rows)
+                logger.info(f"📈 Built baselines from {len(rows)} historical execution(s)")
+    logger.info(f"📁 History database at {store.db_path} (journal_mode={store.storage.journal_mode})")
+
+
+# Literal-only groups such as IN (1, 2, 3) or a VALUES row: literals, binds,
+# commas and unary signs between one pair of parentheses
+_LIST_ITEM_KINDS = (NUMBER, STRING, BIND)
+_SIGNS = ("-", "+")
+
+
+def _placeholder(token) -> str:
+    if token.kind == NUMBER:
+        return ':N'
+    if token.kind == STRING:
+        return ':S'
+    if token.kind == BIND:
+        return ':B'
+    return token.value.upper()
+
+
+def _literal_group_end(tokens, i: int):
+    """Index after the ')' closing a literal-only group starting at tokens[i], else None."""
+    if i >= len(tokens) or tokens[i].kind != PUNCT or tokens[i].value != "(":
+        return None
+    j = i + 1
+    seen_item = False
+    while j < len(tokens):
+        t = tokens[j]
+        if t.kind in _LIST_ITEM_KINDS:
+            seen_item = True
+        elif t.kind == PUNCT and t.value == ")":
+            return j + 1 if seen_item else None
+        elif not ((t.kind == PUNCT and t.value == ",") or (t.kind == OP and t.value in _SIGNS)):
+            return None
+        j += 1
+    return None
+
+
+def normalize_sql_text(sql: str) -> str:
+    """
+    Canonical text of a statement in one walk over the shared token stream:
+    comments dropped, tokens separated by single spaces, keywords/identifiers
+    upper-cased, literals and bind variables replaced by :N / :S / :B,
+    IN lists collapsed to IN ( :LIST ) and multi-row VALUES reduced to the first row.
+
+    Examples:
+        WHERE id IN (12345, 67890, 3) → WHERE ID IN ( :LIST )
+        WHERE name = 'John' → WHERE NAME = :S
+        VALUES (1, 'a'), (2, 'b') → VALUES ( :N , :S )
+    """
+    tokens = tokenize(sql.rstrip().rstrip(';'))
+    out = []
+    i = 0
+    n = len(tokens)
+    while i < n:
+        t = tokens[i]
+        if t.kind == WORD and t.upper == "IN":
+            end = _literal_group_end(tokens, i + 1)
+            if end:
+                out.append("IN ( :LIST )")
+                i = end
+                continue
+        elif t.kind == WORD and t.upper == "VALUES":
+            end = _literal_group_end(tokens, i + 1)
+            if end:
+                out.append("VALUES")
+                out.extend(_placeholder(tokens[k]) for k in range(i + 1, end))
+                # Further literal rows: , ( ... ) , ( ... ) ...
+                while end < n and tokens[end].kind == PUNCT and tokens[end].value == ",":
+                    next_end = _literal_group_end(tokens, end + 1)
+                    if not next_end:
+                        break
+                    end = next_end
+                i = end
+                continue
+        out.append(_placeholder(t))
+        i += 1
+    return " ".join(out)
+
+
+class _FingerprintMemo:
+    """Bounded LRU of raw-text digest -> fingerprint (never holds the SQL text itself)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            fingerprint = self._entries.get(key)
+            if fingerprint is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return fingerprint
+
+    def put(self, key, fingerprint: str):
+        with self._lock:
+            self._entries[key] = fingerprint
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+fingerprint_memo = _FingerprintMemo(_settings.get("fingerprint_cache_size", 4096))
 
 
 def normalize_and_hash(sql: str) -> str:
     """
     Normalize SQL query and return MD5 hash fingerprint.
-    Replaces literals with placeholders so structurally identical queries match.
-    
-    Examples:
-        WHERE id IN (12345, 67890) → WHERE id IN (:N, :N)
-        WHERE name = 'John' → WHERE name = :S
+    Structurally identical queries match regardless of literals, bind names,
+    formatting, comments and IN-list / VALUES-list length (see normalize_sql_text).
+
+    Memoized by a digest of the raw text, so the analysis and compare paths
+    normalize a given statement once.
     """
     if not sql:
         return ""
-    
-    # Strip trailing semicolons first (common difference between runs)
-    sql = sql.rstrip(';').strip()
-    
-    # Normalize: replace numbers and strings with placeholders
-    normalized = re.sub(r'\b\d+\b', ':N', sql)  # Numbers
-    normalized = re.sub(r"'[^']*'", ':S', normalized)  # Strings
-    normalized = re.sub(r'\s+', ' ', normalized).strip().upper()  # Whitespace
-    
-    # Debug logging
+
+    key = hashlib.blake2b(sql.encode(), digest_size=16).digest()
+    fingerprint = fingerprint_memo.get(key)
+    if fingerprint is not None:
+        return fingerprint
+
+    normalized = normalize_sql_text(sql)
     fingerprint = hashlib.md5(normalized.encode()).hexdigest()
-    logger.debug(f"🔑 Normalized SQL: {normalized[:100]}...")
-    logger.debug(f"🔑 Fingerprint: {fingerprint}")
-    
-    # Hash for compact storage
+    fingerprint_memo.put(key, fingerprint)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"🔑 Normalized SQL: {normalized[:100]}... → {fingerprint}")
     return fingerprint
 
 
 def store_history(fingerprint: str, db_name: str, plan_hash: str, cost: int, 
-                  table_stats: dict, plan_operations: list):
+                  table_stats: dict, plan_operations: list, plan_details: list = None):
     """
     Store query execution record in history.
+    The full plan (plan_details) is stored once per distinct plan structure
+    and referenced from the execution by digest; runtime figures (A-Rows,
+    buffers, timings, child cursor) go on the execution row.
     
     Args:
         fingerprint: MD5 hash of normalized query
@@ -81,22 +488,25 @@ def store_history(fingerprint: str, db_name: str, plan_hash: str, cost: int,
         cost: Optimizer cost
         table_stats: Dict of {table_name: num_rows}
         plan_operations: List of key operations like ["INDEX RANGE SCAN", "HASH JOIN"]
+        plan_details: Full plan steps as returned by the collector (optional)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute("""
-            INSERT INTO executions VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        plan = None
+        runtime = None
+        if plan_details:
+            digest, text, runtime = encode_plan(plan_details)
+            plan = (digest, str(plan_hash or "unknown"), text)
+        history_store.add((
             fingerprint,
             db_name,
             datetime.now().isoformat(),
             plan_hash or "unknown",
             cost,
             json.dumps(table_stats),
-            json.dumps(plan_operations)
-        ))
-        conn.commit()
-        conn.close()
+            json.dumps(plan_operations),
+            plan[0] if plan else None,
+            runtime
+        ), plan)
         logger.info(f"💾 Stored execution: fingerprint={fingerprint[:8]}..., cost={cost}")
     except Exception as e:
         logger.warning(f"⚠️  Failed to store history: {e}")
@@ -107,12 +517,15 @@ def get_recent_history(fingerprint: str, db_name: str, days: int = 30) -> list:
     Fetch recent execution history for a query fingerprint.
     
     Returns:
-        List of dicts with timestamp, plan_hash, cost, table_stats, plan_operations
+        List of dicts with timestamp, plan_hash, cost, table_stats, plan_operations,
+        plan_digest (full plan via get_plan) and runtime_stats (per-step runtime
+        figures of that execution, or None)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.execute("""
-            SELECT timestamp, plan_hash, cost, table_stats, plan_operations
+        # Rows still queued for the writer must be visible to this read
+        history_store.flush()
+        cur = history_store.connect().execute("""
+            SELECT timestamp, plan_hash, cost, table_stats, plan_operations, plan_digest, runtime_stats
             FROM executions
             WHERE fingerprint = ? AND db_name = ?
               AND timestamp >= datetime('now', '-' || ? || ' days')
@@ -127,10 +540,11 @@ def get_recent_history(fingerprint: str, db_name: str, days: int = 30) -> list:
                 "plan_hash": r[1],
                 "cost": r[2],
                 "table_stats": json.loads(r[3]) if r[3] else {},
-                "plan_operations": json.loads(r[4]) if r[4] else []
+                "plan_operations": json.loads(r[4]) if r[4] else [],
+                "plan_digest": r[5],
+                "runtime_stats": json.loads(r[6]) if r[6] else None
             })
         
-        conn.close()
         logger.info(f"📊 Found {len(rows)} historical executions for fingerprint {fingerprint[:8]}...")
         return rows
     
@@ -139,13 +553,210 @@ def get_recent_history(fingerprint: str, db_name: str, days: int = 30) -> list:
         return []
 
 
-def compare_with_history(history: list, current_facts: dict) -> dict:
+def get_plan(digest: str):
+    """
+    Stored plan by digest: the plan_details steps without runtime fields
+    (input for build_visual_plan), or None. Estimates (cost, cardinality)
+    are those of the first execution seen with this plan.
+    """
+    try:
+        history_store.flush()
+        row = history_store.connect().execute(
+            "SELECT codec, plan FROM plans WHERE digest = ?", (digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        codec, blob = row
+        if codec != "zlib":
+            raise ValueError(f"unsupported plan codec {codec}")
+        return json.loads(zlib.decompress(blob))
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to load plan {digest}: {e}")
+        return None
+
+
+def plan_storage_stats() -> dict:
+    """Distinct stored plans and their raw vs compressed size."""
+    try:
+        history_store.flush()
+        conn = history_store.connect()
+        plans, raw, stored = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(LENGTH(plan)), 0) FROM plans"
+        ).fetchone()
+        referencing = conn.execute("SELECT COUNT(*) FROM executions WHERE plan_digest IS NOT NULL").fetchone()[0]
+        return {
+            "distinct_plans": plans,
+            "executions_with_plan": referencing,
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "compression_ratio": round(raw / stored, 2) if stored else None,
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_baseline(fingerprint: str, db_name: str):
+    """
+    Aggregate history of a fingerprint on one preset (all time), or None.
+
+    Returns:
+        Dict with executions, cost mean/stddev/EWMA, plans {plan key: count}
+        (most frequent first; see plan_key), plan_hashes {hash: count},
+        dominant plan digest/hash, last plan hash and first/last seen
+    """
+    try:
+        history_store.flush()
+        conn = history_store.connect()
+        row = conn.execute("""
+            SELECT executions, cost_samples, cost_mean, cost_m2, cost_ewma,
+                   last_plan_hash, first_seen, last_seen
+            FROM baselines
+            WHERE fingerprint = ? AND db_name = ?
+        """, (fingerprint, db_name)).fetchone()
+        if row is None:
+            return None
+        plans = conn.execute("""
+            SELECT plan_key, plan_hash, executions, plan_digest FROM baseline_plans
+            WHERE fingerprint = ? AND db_name = ?
+            ORDER BY executions DESC, last_seen DESC
+        """, (fingerprint, db_name)).fetchall()
+
+        executions, samples, mean, m2, ewma, last_plan_hash, first_seen, last_seen = row
+        variance = m2 / (samples - 1) if samples > 1 and m2 is not None else 0.0
+        plan_hashes = {}
+        for _, plan_hash, n, _ in plans:
+            plan_hashes[plan_hash] = plan_hashes.get(plan_hash, 0) + n
+        return {
+            "executions": executions,
+            "cost_samples": samples,
+            "cost_mean": round(mean, 2) if mean is not None else None,
+            "cost_stddev": round(max(variance, 0.0) ** 0.5, 2),
+            "cost_ewma": round(ewma, 2) if ewma is not None else None,
+            "plans": {key: n for key, _, n, _ in plans},
+            "plan_hashes": plan_hashes,
+            "dominant_plan_hash": plans[0][1] if plans else None,
+            "dominant_plan_digest": plans[0][3] if plans else None,
+            "last_plan_hash": last_plan_hash,
+            "first_seen": first_seen,
+            "last_seen": last_seen,
+        }
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to fetch baseline: {e}")
+        return None
+
+
+def _table_growth(last: dict, current_facts: dict) -> list:
+    """Row-count changes since the last stored execution, e.g. ["ORDERS: +40%"]."""
+    current_tables = {t["table_name"]: t["num_rows"] for t in current_facts.get("table_stats", [])}
+    table_growth = []
+    for table, old_rows in (last or {}).get("table_stats", {}).items():
+        new_rows = current_tables.get(table, old_rows)
+        if new_rows != old_rows and old_rows and new_rows is not None:
+            growth_pct = ((new_rows - old_rows) / old_rows) * 100
+            table_growth.append(f"{table}: {growth_pct:+.0f}%")
+    return table_growth
+
+
+def _compare_with_baseline(baseline: dict, current_facts: dict, last: dict) -> dict:
+    """
+    Verdict against the aggregate baseline: is the plan one we have seen
+    before, and does the cost deviate from its EWMA by more than the
+    configured percentage and z-score?
+    """
+    current_plan = current_facts.get("plan_details", [])
+    if not current_plan:
+        return {"status": "no_plan", "message": "No execution plan available"}
+
+    current_plan_hash = str(current_plan[0].get("plan_hash_value", "unknown"))
+    current_digest = plan_digest(current_plan)
+    current_cost = current_plan[0].get("cost") or 0
+    runs = baseline["executions"]
+    plan_seen = baseline["plans"].get(current_digest, 0)
+    if not plan_seen and "plan_hash_value" in current_plan[0]:
+        # Executions recorded before plans were stored are known by hash only
+        plan_seen = baseline["plans"].get(plan_key(None, current_plan_hash), 0)
+    reference = baseline["cost_ewma"]
+    stddev = baseline["cost_stddev"]
+
+    verdict = {
+        "baseline_executions": runs,
+        "baseline_cost_ewma": reference,
+        "baseline_cost_mean": baseline["cost_mean"],
+        "baseline_cost_stddev": stddev,
+        "plan_seen_before": plan_seen,
+        "plan_share_pct": round(plan_seen / runs * 100, 1) if runs else 0.0,
+        "known_plans": len(baseline["plans"]),
+    }
+
+    cost_change_pct = None
+    z_score = None
+    if reference and current_cost:
+        cost_change_pct = round((current_cost - reference) / reference * 100, 1)
+        verdict["cost_change_pct"] = cost_change_pct
+        if stddev:
+            z_score = round((current_cost - baseline["cost_mean"]) / stddev, 2)
+            verdict["z_score"] = z_score
+
+    # Outside normal variation: beyond the % threshold and (when the baseline
+    # has spread) beyond z_threshold standard deviations
+    deviates = cost_change_pct is not None and abs(cost_change_pct) >= COST_CHANGE_PCT and (
+        z_score is None or abs(z_score) >= Z_THRESHOLD
+    )
+
+    if plan_seen == 0:
+        verdict.update({
+            "status": "plan_changed",
+            "old_plan_hash": baseline["dominant_plan_hash"],
+            "old_plan_digest": baseline["dominant_plan_digest"],  # get_historical_plan
+            "new_plan_hash": current_plan_hash,
+            "new_plan_digest": current_digest,
+        })
+        if cost_change_pct is None:
+            verdict["message"] = f"⚠️  New execution plan - not seen in {runs} previous execution(s) (cost comparison unavailable)"
+            return verdict
+        improved = cost_change_pct < 0
+        verdict["improved"] = improved
+        verdict["message"] = (
+            f"✅ New plan, cost {abs(cost_change_pct):.0f}% below the baseline of {runs} execution(s)."
+            if improved else
+            f"⚠️  New plan, cost {cost_change_pct:+.0f}% vs the baseline of {runs} execution(s). Review optimizer statistics."
+        )
+        return verdict
+
+    if deviates:
+        table_growth = _table_growth(last, current_facts)
+        verdict.update({
+            "status": "data_growth",
+            "regression": cost_change_pct > 0,
+            "table_growth": table_growth,
+            "message": (
+                f"⚠️  Known plan but cost {cost_change_pct:+.0f}% vs baseline (EWMA {reference:.0f} over {runs} runs)"
+                + (f" - likely due to data growth: {', '.join(table_growth)}" if table_growth else "")
+            ),
+        })
+        return verdict
+
+    verdict.update({
+        "status": "stable",
+        "message": f"✅ Performance stable - consistent with the baseline of {runs} execution(s)",
+    })
+    return verdict
+
+
+def compare_with_history(history: list, current_facts: dict, baseline: dict = None) -> dict:
     """
     Compare current execution with historical data.
+
+    With a baseline (get_baseline) of at least baseline.min_executions runs -
+    or no recent rows at all - the verdict is against the aggregate; otherwise
+    against the most recent execution.
     
     Returns:
         Dict with status, message, and metrics about performance change
     """
+    if baseline and (baseline["executions"] >= MIN_BASELINE_EXECUTIONS or not history):
+        return _compare_with_baseline(baseline, current_facts, history[0] if history else None)
+
     if not history:
         return {
             "status": "new_query",
@@ -158,7 +769,8 @@ def compare_with_history(history: list, current_facts: dict) -> dict:
     if not current_plan:
         return {"status": "no_plan", "message": "No execution plan available"}
     
-    current_plan_hash = current_plan[0].get("plan_hash_value", "unknown")
+    current_plan_hash = str(current_plan[0].get("plan_hash_value", "unknown"))  # stored as TEXT
+    current_digest = plan_digest(current_plan)
     current_cost = current_plan[0].get("cost", 0)
     
     # Extract key operations from current plan
@@ -167,8 +779,10 @@ def compare_with_history(history: list, current_facts: dict) -> dict:
         for step in current_plan[:5]  # Top 5 operations
     ]
     
-    # Same plan hash = optimizer using same strategy
-    if last["plan_hash"] == current_plan_hash:
+    # Same plan structure = optimizer using same strategy (plan hash for
+    # executions stored without a plan)
+    same_plan = (last["plan_digest"] == current_digest) if last.get("plan_digest") else (last["plan_hash"] == current_plan_hash)
+    if same_plan:
         if current_cost == 0 or last["cost"] == 0:
             return {
                 "status": "stable",
@@ -184,15 +798,7 @@ def compare_with_history(history: list, current_facts: dict) -> dict:
                 "message": "✅ Performance stable - consistent with previous execution"
             }
         else:
-            # Check if table sizes changed
-            current_tables = {t["table_name"]: t["num_rows"] for t in current_facts.get("table_stats", [])}
-            table_growth = []
-            
-            for table, old_rows in last["table_stats"].items():
-                new_rows = current_tables.get(table, old_rows)
-                if new_rows != old_rows and old_rows > 0:
-                    growth_pct = ((new_rows - old_rows) / old_rows) * 100
-                    table_growth.append(f"{table}: {growth_pct:+.0f}%")
+            table_growth = _table_growth(last, current_facts)
             
             return {
                 "status": "data_growth",
@@ -207,7 +813,9 @@ def compare_with_history(history: list, current_facts: dict) -> dict:
             return {
                 "status": "plan_changed",
                 "old_plan_hash": last["plan_hash"],
+                "old_plan_digest": last.get("plan_digest"),
                 "new_plan_hash": current_plan_hash,
+                "new_plan_digest": current_digest,
                 "message": "⚠️  Execution plan changed (cost comparison unavailable)"
             }
         
@@ -228,7 +836,9 @@ def compare_with_history(history: list, current_facts: dict) -> dict:
             "improved": is_better,
             "cost_change_pct": round(cost_change_pct, 1),
             "old_plan_hash": last["plan_hash"],
+            "old_plan_digest": last.get("plan_digest"),
             "new_plan_hash": current_plan_hash,
+            "new_plan_digest": current_digest,
             "operation_changes": operation_changes,
             "message": (
                 f"✅ Plan improved {abs(cost_change_pct):.0f}%! Optimizer found better strategy."
@@ -237,6 +847,3 @@ def compare_with_history(history: list, current_facts: dict) -> dict:
             )
         }
 
-
-# Initialize database on module import
-init_db()
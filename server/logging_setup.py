@@ -0,0 +1,123 @@
+# server/logging_setup.py
+# Non-blocking logging pipeline: QueueHandler in request threads, one
+# QueueListener thread doing formatting and I/O, optional JSON output and
+# sampling of verbose collector logs.
+
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from datetime import datetime, timezone
+
+from config import config
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, thread, msg (+ exc)."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Merge args into the message in the calling thread (args may be mutable),
+    but keep the traceback in exc_text so the listener's formatter places it.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of DEBUG records from the given (verbose) loggers.
+    Deterministic: with rate 0.1 every 10th record passes. Other levels and
+    loggers always pass.
+    """
+
+    def __init__(self, loggers, rate: float):
+        super().__init__()
+        self.prefixes = tuple(loggers)
+        self.rate = max(0.0, min(1.0, rate))
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate >= 1.0 or record.levelno > logging.DEBUG or not record.name.startswith(self.prefixes):
+            return True
+        with self._lock:
+            self._seen += 1
+            return int(self._seen * self.rate) != int((self._seen - 1) * self.rate)
+
+
+def setup_logging() -> logging.Logger:
+    """
+    Route every logger through a queue (idempotent).
+
+    Request threads only enqueue records; a single listener thread formats
+    and writes them, so concurrent tool calls never contend on the stream.
+    JSON output: logging.json in settings.yaml or LOG_JSON=1.
+    """
+    global _listener
+    settings = config.logging
+
+    with _lock:
+        root = logging.getLogger()
+        if _listener is not None:
+            return root
+
+        use_json = settings.get("json", False) or os.getenv("LOG_JSON") == "1"
+        stream = logging.StreamHandler(sys.stdout if use_json else sys.stderr)
+        stream.setFormatter(JSONFormatter() if use_json else logging.Formatter(TEXT_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _QueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(
+            settings.get("sampled_loggers", ["oracle_collector", "tools.mysql_collector_impl"]),
+            settings.get("collector_sample_rate", 1.0),
+        ))
+
+        root.handlers = [queue_handler]
+        root.setLevel(getattr(logging, config.log_level, logging.INFO))
+
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return root
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -2,7 +2,9 @@
 
 from fastmcp import FastMCP
 from config import config
+from tool_metrics import ToolMetricsMiddleware
 
 
 # Single shared instance – everything else will import this
 mcp = FastMCP(config.server_name)
+mcp.add_middleware(ToolMetricsMiddleware())
@@ -0,0 +1,319 @@
+# server/metrics.py
+# In-process metrics: counters, gauges, labelled latency histograms, per-request
+# phase timing and Prometheus text exposition
+
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from config import config
+
+# Seconds; covers a 1 ms dictionary lookup up to a multi-minute EXPLAIN
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram (Prometheus semantics) per label tuple.
+    Thread-safe; observe() is O(number of buckets).
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # labels tuple -> {"counts": [...], "sum": float, "count": int}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, labels: tuple = ()):
+        """Observe the duration of a block (monotonic clock)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(labels, time.perf_counter() - started)
+
+    def series(self) -> dict:
+        """Copy of {labels: {"counts", "sum", "count"}} (counts are cumulative per bucket)."""
+        with self._lock:
+            return {k: {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]}
+                    for k, v in self._series.items()}
+
+    def quantile(self, labels: tuple, q: float):
+        """Bucket-interpolated quantile estimate (like histogram_quantile()), or None."""
+        series = self.series().get(labels)
+        if not series or not series["count"]:
+            return None
+        rank = q * series["count"]
+        lower, prev = 0.0, 0
+        for bound, cumulative in zip(self.buckets, series["counts"]):
+            if cumulative >= rank:
+                in_bucket = cumulative - prev
+                fraction = (rank - prev) / in_bucket if in_bucket else 0.0
+                return lower + (bound - lower) * fraction
+            lower, prev = bound, cumulative
+        return self.buckets[-1]  # above the last bucket
+
+    def summary(self) -> list:
+        """Per-series count / mean / p50 / p95 in milliseconds (for resources and logs)."""
+        rows = []
+        for labels, s in sorted(self.series().items()):
+            p50, p95 = self.quantile(labels, 0.5), self.quantile(labels, 0.95)
+            rows.append({
+                **dict(zip(self.labelnames, labels)),
+                "count": s["count"],
+                "mean_ms": round(s["sum"] / s["count"] * 1000, 2) if s["count"] else 0.0,
+                "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+            })
+        return rows
+
+
+class Counter:
+    """Monotonic counter per label tuple."""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def series(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Gauge(Counter):
+    """Value that goes up and down (e.g. in-flight requests)."""
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def set(self, labels: tuple, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+STARTED_AT = time.time()
+
+TOOL_CALLS = Counter(
+    "metaquery_tool_calls_total",
+    "MCP tool calls by tool, database preset and outcome (ok | error | exception)",
+    ("tool", "preset", "status"),
+)
+TOOL_ERRORS = Counter(
+    "metaquery_tool_errors_total",
+    "MCP tool calls that returned an error or raised",
+    ("tool", "preset"),
+)
+TOOL_SECONDS = Histogram(
+    "metaquery_tool_duration_seconds",
+    "MCP tool call latency",
+    ("tool", "preset"),
+)
+IN_FLIGHT = Gauge(
+    "metaquery_tool_calls_in_flight",
+    "MCP tool calls currently executing",
+    ("tool",),
+)
+SQLITE_WRITE_SECONDS = Histogram(
+    "metaquery_sqlite_write_duration_seconds",
+    "Latency of SQLite writes (history, snapshots)",
+    ("operation",),
+)
+
+PHASE_SECONDS = Histogram(
+    "metaquery_phase_duration_seconds",
+    "Duration of analysis phases (validate, explain, metadata queries, history, ...)",
+    ("collector", "phase"),
+)
+
+ATTACH_TIMINGS = config.metrics.get("attach_timings", False)
+
+_current_timer = contextvars.ContextVar("metaquery_phase_timer", default=None)
+
+
+class PhaseTimer:
+    """
+    Per-request phase breakdown. Use as a context manager (or start()/stop())
+    around a tool call; phase() blocks anywhere below it (including worker
+    threads started with run_in_context) record into it.
+    """
+
+    def __init__(self, collector: str):
+        self.collector = collector
+        self.phases = {}    # phase -> {"ms": float, "calls": int}
+        self._lock = threading.Lock()
+        self._started = None
+        self._token = None
+        self.total_ms = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._token = _current_timer.set(self)
+        return self
+
+    def stop(self):
+        if self._token is not None:
+            self.total_ms = (time.perf_counter() - self._started) * 1000
+            _current_timer.reset(self._token)
+            self._token = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.phases.setdefault(name, {"ms": 0.0, "calls": 0})
+            entry["ms"] += seconds * 1000
+            entry["calls"] += 1
+
+    def as_dict(self) -> dict:
+        total = self.total_ms if self.total_ms is not None else (time.perf_counter() - self._started) * 1000
+        with self._lock:
+            phases = {k: {"ms": round(v["ms"], 2), "calls": v["calls"]} for k, v in self.phases.items()}
+        return {"total_ms": round(total, 2), "phases": phases}
+
+    def attach(self, result: dict) -> dict:
+        """
+        Add the breakdown under result["_timings"] when metrics.attach_timings
+        is enabled. Times JSON serialization of the response as a last phase.
+        """
+        if not ATTACH_TIMINGS or not isinstance(result, dict):
+            return result
+        with phase("serialization"):
+            size = len(json.dumps(result, default=str))
+        timings = self.as_dict()
+        timings["response_bytes"] = size
+        result["_timings"] = timings
+        return result
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Time a block with the monotonic clock. The duration goes into the
+    phase-latency histogram and, inside a PhaseTimer, into its breakdown.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timer = _current_timer.get()
+        PHASE_SECONDS.observe((timer.collector if timer else "none", name), elapsed)
+        if timer is not None:
+            timer.record(name, elapsed)
+
+
+def run_in_context(fn):
+    """Wrap fn so it runs in a copy of the caller's context (for executor.submit)."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+# ------------------------------------------------------------
+# Prometheus exposition
+# ------------------------------------------------------------
+_METRICS = [TOOL_CALLS, TOOL_ERRORS, TOOL_SECONDS, IN_FLIGHT, SQLITE_WRITE_SECONDS, PHASE_SECONDS]
+_collectors = []
+
+
+def register_collector(fn):
+    """
+    Register a callback evaluated at scrape time. It returns an iterable of
+    (name, type, help, [(labels_dict, value), ...]) - for pool and cache
+    figures that live in other modules.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus() -> str:
+    """All metrics in Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _METRICS:
+        kind = "histogram" if isinstance(metric, Histogram) else "gauge" if isinstance(metric, Gauge) else "counter"
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        if kind == "histogram":
+            for labels, s in sorted(metric.series().items()):
+                for bound, cumulative in zip(metric.buckets, s["counts"]):
+                    lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, labels, [('le', _number(float(bound)))])} {cumulative}")
+                lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, labels, [('le', '+Inf')])} {s['count']}")
+                lines.append(f"{metric.name}_sum{_labels(metric.labelnames, labels)} {_number(s['sum'])}")
+                lines.append(f"{metric.name}_count{_labels(metric.labelnames, labels)} {s['count']}")
+        else:
+            for labels, value in sorted(metric.series().items()):
+                lines.append(f"{metric.name}{_labels(metric.labelnames, labels)} {_number(value)}")
+
+    lines.append("# HELP metaquery_uptime_seconds Seconds since the server process started")
+    lines.append("# TYPE metaquery_uptime_seconds gauge")
+    lines.append(f"metaquery_uptime_seconds {_number(round(time.time() - STARTED_AT, 3))}")
+
+    # Collectors may contribute samples to the same family (e.g. one per cache)
+    families = {}
+    for collector in list(_collectors):
+        try:
+            collected = list(collector())
+        except Exception:
+            continue  # one failing source must not break the scrape
+        for name, kind, help_text, samples in collected:
+            families.setdefault(name, (kind, help_text, []))[2].extend(samples)
+
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+
+    return "\n".join(lines) + "\n"
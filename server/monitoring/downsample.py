@@ -0,0 +1,148 @@
+"""
+Time-Series Downsampling
+
+Largest-Triangle-Three-Buckets (Steinarsson, 2013): reduce a series to
+max_points points that keep its visual shape. Unlike averaging or striding,
+LTTB picks in every bucket the point forming the largest triangle with its
+neighbours, so isolated spikes survive.
+
+numpy is used when installed (per-bucket areas are computed as array
+operations, bucket averages in one reduceat pass); otherwise a pure-Python
+loop gives the same selection.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python fallback below
+    np = None
+
+
+def _bucket_edges(n: int, max_points: int) -> List[int]:
+    """
+    Start offsets of the max_points - 2 inner buckets (plus the end offset).
+    The first and last points are always kept and are not part of a bucket.
+    """
+    every = (n - 2) / (max_points - 2)
+    return [int(math.floor(i * every)) + 1 for i in range(max_points - 2)] + [n - 1]
+
+
+def _lttb_numpy(y, max_points: int) -> List[int]:
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    edges = np.asarray(_bucket_edges(n, max_points))
+    x = np.arange(n, dtype=float)
+
+    # Centroid of every bucket, plus the last point acting as the final "next bucket"
+    counts = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, n - 1)
+    avg_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / counts, y[-1])
+
+    selected = [0]
+    a = 0
+    for i in range(len(edges) - 1):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area (a, candidate, next centroid); the constant factor does not matter
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
+
+
+def _lttb_python(y: Sequence[float], max_points: int) -> List[int]:
+    n = len(y)
+    edges = _bucket_edges(n, max_points)
+
+    selected = [0]
+    a = 0
+    for i in range(len(edges) - 1):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nlo, nhi = hi, edges[i + 2]
+            avg_x = (nlo + nhi - 1) / 2
+            avg_y = sum(y[nlo:nhi]) / (nhi - nlo)
+        else:
+            avg_x, avg_y = n - 1, y[n - 1]
+
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((a - avg_x) * (y[j] - y[a]) - (a - j) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
+
+
+def lttb_indices(values: Sequence[Optional[float]], max_points: int) -> List[int]:
+    """
+    Indexes of the points LTTB keeps, in order.
+
+    Points are treated as evenly spaced (snapshots and rollup buckets are).
+    None values are never selected; a series shorter than max_points is
+    returned whole.
+
+    Args:
+        values: Series values (None for missing)
+        max_points: Target number of points (at least 3)
+
+    Returns:
+        Sorted list of indexes into values
+    """
+    n = len(values)
+    if max_points <= 0 or n <= max_points:
+        return list(range(n))
+    max_points = max(max_points, 3)
+
+    present = [i for i, v in enumerate(values) if v is not None]
+    if len(present) <= max_points:
+        return present
+    y = [float(values[i]) for i in present]
+    picked = _lttb_numpy(y, max_points) if np is not None else _lttb_python(y, max_points)
+    return [present[i] for i in picked]
+
+
+def downsample_points(points: List[Dict], field: str, max_points: int,
+                      series_key: Optional[str] = None) -> List[Dict]:
+    """
+    Reduce a list of snapshot/rollup dicts to at most max_points, choosing
+    which points to keep by LTTB over point[field].
+
+    Args:
+        points: History points in time order
+        field: Key of the value that drives the selection
+        max_points: Target number of points (0 or less: no downsampling)
+        series_key: When the list interleaves several series (e.g. sql_id),
+                    downsample each one separately. Busiest series (largest
+                    sum of field) are served first with an even share of
+                    what is left; when the cap cannot give a series at
+                    least 3 points, the least active series are dropped
+
+    Returns:
+        The kept points (the same dict objects), in their original order
+    """
+    if max_points <= 0 or len(points) <= max_points:
+        return points
+
+    groups = {}
+    for i, p in enumerate(points):
+        value = p.get(field)
+        groups.setdefault(p.get(series_key) if series_key else None, []).append(
+            (i, value if isinstance(value, (int, float)) else None)
+        )
+    busiest = sorted(groups.values(), key=lambda g: sum(abs(v) for _, v in g if v is not None), reverse=True)
+
+    kept = []
+    remaining = max_points
+    for position, series in enumerate(busiest):
+        quota = min(len(series), remaining, max(remaining // (len(busiest) - position), 3))
+        if quota < len(series) and quota < 3:
+            continue  # too little budget left to draw this series; a shorter one may still fit
+        picked = lttb_indices([v for _, v in series], quota)
+        kept.extend(series[j][0] for j in picked)
+        remaining -= len(picked)
+    return [points[i] for i in sorted(kept)]
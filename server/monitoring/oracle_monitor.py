@@ -185,7 +185,8 @@ class OracleMonitor:
         
         Returns:
             Dict containing:
-            - queries: List of top queries with metrics
+            - queries: List of top queries (one per child cursor) with
+              cumulative metrics since the cursor was loaded
             - collection_time: When data was collected
             - metric_used: Which metric was used for ranking
         
@@ -243,6 +244,10 @@ class OracleMonitor:
         query = f"""
             SELECT 
                 SQL_ID,
+                CHILD_NUMBER,
+                PLAN_HASH_VALUE,
+                TO_DATE(LAST_LOAD_TIME, 'YYYY-MM-DD/HH24:MI:SS') as LAST_LOAD_TIME,
+                SYSDATE as DB_TIME,
                 SUBSTR(SQL_TEXT, 1, 500) as SQL_TEXT,
                 EXECUTIONS,
                 CPU_TIME / 1000000 as CPU_SECONDS,
@@ -270,8 +275,9 @@ class OracleMonitor:
             self.cursor.execute(query, bind_params)
             
             queries = []
+            db_time = None
             for row in self.cursor:
-                sql_id, sql_text, executions, cpu_sec, elapsed_sec, buffer_gets, disk_reads, rows_proc, last_active, schema, module = row
+                sql_id, child_number, plan_hash, last_load, db_time, sql_text, executions, cpu_sec, elapsed_sec, buffer_gets, disk_reads, rows_proc, last_active, schema, module = row
                 
                 # Calculate averages
                 avg_cpu_ms = (cpu_sec * 1000 / executions) if executions > 0 else 0
@@ -280,6 +286,9 @@ class OracleMonitor:
                 
                 query_data = {
                     'sql_id': sql_id,
+                    'child_number': child_number,
+                    'plan_hash_value': plan_hash,
+                    'last_load_time': last_load.isoformat() if last_load else None,
                     'sql_text': sql_text,
                     'executions': executions,
                     'cpu_seconds': round(cpu_sec, 2),
@@ -311,6 +320,8 @@ class OracleMonitor:
                 },
                 'queries_found': len(queries),
                 'queries': queries,
+                # Database clock, comparable with last_load_time (used for interval deltas)
+                'db_time': db_time.isoformat() if db_time else None,
                 'timestamp': datetime.now().isoformat(),
                 'security_note': 'All SQL is read from V$SQL for analysis only. No user SQL is executed by this tool.'
             }
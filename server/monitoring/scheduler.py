@@ -188,7 +188,8 @@ if scheduler_enabled:
                             db_name, 
                             datetime.now(), 
                             queries.get('queries', []),
-                            'cpu'
+                            'cpu',
+                            queries.get('db_time')
                         )
                 
                 scheduler.add_query_job(
@@ -8,109 +8,451 @@ SECURITY:
 - Automatic cleanup of old snapshots based on retention policy
 - Read-only queries against snapshot history
 
-Database: Extends existing query_history.db with new tables
+Database: the shared storage database (storage.py; schema migration 4)
 Tables:
 - system_health_snapshots: System metrics over time
 - query_performance_snapshots: Top query metrics over time
+- snapshot_rollups: 5-minute / hourly / daily min/avg/max/p95 of both,
+  updated as snapshots are saved (hourly and daily from the finer level)
+- query_counter_state: last cumulative V$SQL counters per child cursor, so
+  query snapshots also store what happened since the previous snapshot
 """
 
 import sqlite3
 import json
+import math
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
 import logging
 
+from metrics import SQLITE_WRITE_SECONDS
+from config import config
+from storage import Storage, storage as shared_storage
+
 logger = logging.getLogger(__name__)
 
+# Rollup resolutions, finest first: (name, bucket seconds)
+RESOLUTIONS = (("5m", 300), ("1h", 3600), ("1d", 86400))
+RESOLUTION_SECONDS = dict(RESOLUTIONS)
+
+HEALTH_METRICS = ("cpu_usage_pct", "active_sessions", "buffer_cache_hit_ratio")
+QUERY_METRICS = (
+    "executions", "cpu_seconds", "elapsed_seconds", "buffer_gets",
+    "disk_reads", "avg_cpu_ms", "avg_elapsed_ms",
+    "delta_executions", "delta_cpu_seconds", "delta_elapsed_seconds",
+    "delta_buffer_gets", "delta_disk_reads",
+)
+
+# Cumulative V$SQL counters that get a per-interval delta_<counter>
+COUNTERS = ("executions", "cpu_seconds", "elapsed_seconds", "buffer_gets", "disk_reads", "rows_processed")
+
+# Query rows are per child cursor; rollups are per sql_id, so the children
+# of one snapshot are summed first (averages re-derived from the sums)
+_QUERY_ROLLUP_ROWS = """(
+    SELECT db_name, snapshot_time, sql_id,
+           SUM(executions) AS executions, SUM(cpu_seconds) AS cpu_seconds,
+           SUM(elapsed_seconds) AS elapsed_seconds, SUM(buffer_gets) AS buffer_gets,
+           SUM(disk_reads) AS disk_reads,
+           SUM(cpu_seconds) * 1000.0 / NULLIF(SUM(executions), 0) AS avg_cpu_ms,
+           SUM(elapsed_seconds) * 1000.0 / NULLIF(SUM(executions), 0) AS avg_elapsed_ms,
+           SUM(delta_executions) AS delta_executions, SUM(delta_cpu_seconds) AS delta_cpu_seconds,
+           SUM(delta_elapsed_seconds) AS delta_elapsed_seconds,
+           SUM(delta_buffer_gets) AS delta_buffer_gets, SUM(delta_disk_reads) AS delta_disk_reads
+    FROM query_performance_snapshots
+    GROUP BY db_name, snapshot_time, sql_id
+)"""
+
+# source -> (raw rows, series column, metrics)
+_ROLLUP_SOURCES = {
+    "health": ("system_health_snapshots", "''", HEALTH_METRICS),
+    "query": (_QUERY_ROLLUP_ROWS, "sql_id", QUERY_METRICS),
+}
+
+_rollup_settings = config.performance_monitoring.get("snapshots", {}).get("rollups", {})
+ROLLUP_RETENTION_DAYS = {"5m": 7, "1h": 90, "1d": 730, **_rollup_settings.get("retention_days", {})}
+MIN_TREND_POINTS = _rollup_settings.get("min_points", 24)
+
+# Counter state of cursors not seen for this long is dropped (aged out of the shared pool)
+COUNTER_STATE_HOURS = config.performance_monitoring.get("snapshots", {}).get("counter_state_hours", 24)
+
+UPSERT_ROLLUP = """
+    INSERT OR REPLACE INTO snapshot_rollups
+    (source, db_name, series, metric, resolution, bucket_start,
+     samples, min_value, avg_value, max_value, p95_value, sum_value)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# One coarse bucket from the finer buckets inside it: count, sum, min and max
+# combine exactly; p95 does not and is left for _close_rollups
+UPSERT_ROLLUP_FROM_FINER = """
+    INSERT OR REPLACE INTO snapshot_rollups
+    (source, db_name, series, metric, resolution, bucket_start,
+     samples, min_value, avg_value, max_value, p95_value, sum_value)
+    SELECT source, db_name, series, metric, ?, ?,
+           SUM(samples), MIN(min_value), SUM(sum_value) / SUM(samples), MAX(max_value), NULL, SUM(sum_value)
+    FROM snapshot_rollups
+    WHERE source = ? AND db_name = ? AND resolution = ? AND bucket_start >= ? AND bucket_start < ?
+    GROUP BY series, metric
+"""
+
+# Stores whose rollups were checked for a backfill in this process
+_backfill_checked = set()
+
+
+def _db_time(value: datetime) -> str:
+    """Timestamp in the text form sqlite3 stores datetime parameters in."""
+    return value.isoformat(" ")
+
+
+def bucket_start(value: datetime, resolution: str) -> datetime:
+    """Start of the rollup bucket containing value."""
+    if resolution == "5m":
+        return value.replace(minute=value.minute - value.minute % 5, second=0, microsecond=0)
+    if resolution == "1h":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def choose_resolution(hours: float, min_points: int = None) -> str:
+    """
+    Coarsest resolution that still yields min_points buckets over the window
+    ('raw' when even 5-minute buckets would be too few).
+    24h -> 1h, 7 days -> 1h, 30 days -> 1d, 6h -> 5m, 1h -> raw.
+    """
+    min_points = min_points or MIN_TREND_POINTS
+    for name, seconds in reversed(RESOLUTIONS):
+        if hours * 3600 / seconds >= min_points:
+            return name
+    return "raw"
+
+
+def _p95(sorted_values: list):
+    """Nearest-rank 95th percentile of an ascending list."""
+    return sorted_values[max(0, math.ceil(0.95 * len(sorted_values)) - 1)]
+
+
+def load_time_iso(value) -> Optional[str]:
+    """
+    Cursor load time as an ISO string comparable with db_time. Accepts a
+    datetime or V$SQL's VARCHAR2 form 'YYYY-MM-DD/HH24:MI:SS'.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    try:
+        return datetime.fromisoformat(str(value).replace("/", "T", 1)).isoformat()
+    except ValueError:
+        return None  # unparseable: treated like an unknown load time
+
+
+def counter_deltas(previous: Optional[Dict], current: Dict, previous_collection: Optional[str] = None) -> Tuple[str, Dict]:
+    """
+    Activity of one child cursor since the previous snapshot, from cumulative
+    V$SQL counters.
+
+    Args:
+        previous: Last stored state for the cursor (counters, last_load_time), or None
+        current: Current V$SQL row (counters, last_load_time)
+        previous_collection: When this preset was last collected (database clock)
+
+    Returns:
+        (status, {counter: delta}):
+        - 'delta': same cursor load, counters diffed
+        - 'reset': cursor reloaded (new last_load_time) or a counter went
+          down (aged out and reloaded, flushed) - counters restarted, so
+          the current values are the interval activity
+        - 'new': not seen before but loaded after the previous collection,
+          so everything it has done happened in the interval
+        - 'baseline': not seen before and older than the previous collection
+          (or nothing collected yet) - no delta, stored as the new baseline
+    """
+    def values(row):
+        return {c: row.get(c) or 0 for c in COUNTERS}
+
+    cur = values(current)
+    load_time = load_time_iso(current.get("last_load_time"))
+    if previous is None:
+        if previous_collection and load_time and load_time >= previous_collection:
+            return "new", cur
+        return "baseline", {c: None for c in COUNTERS}
+
+    prev = values(previous)
+    previous_load = load_time_iso(previous.get("last_load_time"))
+    reloaded = load_time and previous_load and load_time != previous_load
+    if reloaded or any(cur[c] < prev[c] for c in COUNTERS):
+        return "reset", cur
+    return "delta", {c: cur[c] - prev[c] for c in COUNTERS}
+
 
 class SnapshotManager:
     """Manages historical performance snapshots in SQLite"""
     
-    def __init__(self, db_path: str = "query_history.db"):
+    def __init__(self, db_path: Optional[str] = None):
         """
         Initialize snapshot manager
         
         Args:
-            db_path: Path to SQLite database (default: query_history.db)
+            db_path: SQLite database path (default: the shared storage database).
+                     Instantiating is cheap - the schema is migrated once per process.
         """
-        self.db_path = db_path
-        self._ensure_schema()
-    
-    def _ensure_schema(self):
-        """Create tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
+        if db_path is None:
+            self.storage = shared_storage
+        else:
+            self.storage = Storage(db_path)
+            self.storage.migrate()
+        self.db_path = self.storage.db_path
+        if self.db_path not in _backfill_checked:
+            _backfill_checked.add(self.db_path)
+            self._backfill_rollups()
+
+    # ------------------------------------------------------------------
+    # Rollups
+    # ------------------------------------------------------------------
+    def _bucket_values(self, cursor, source: str, db_name: str, resolution: str, start: datetime) -> Dict:
+        """Raw values of one bucket: {(series, metric): ascending [value, ...]}."""
+        table, series_col, metrics = _ROLLUP_SOURCES[source]
+        end = start + timedelta(seconds=RESOLUTION_SECONDS[resolution])
+        cursor.execute(f"""
+            SELECT {series_col}, {', '.join(metrics)}
+            FROM {table}
+            WHERE db_name = ? AND snapshot_time >= ? AND snapshot_time < ?
+        """, (db_name, _db_time(start), _db_time(end)))
+
+        values = {}
+        for row in cursor.fetchall():
+            for metric, value in zip(metrics, row[1:]):
+                if value is not None:
+                    values.setdefault((row[0], metric), []).append(value)
+        for vals in values.values():
+            vals.sort()
+        return values
+
+    def _update_rollups(self, cursor, source: str, db_name: str, snapshot_times) -> int:
+        """
+        Refresh the 5m/1h/1d buckets containing the given snapshot times.
+
+        Only 5-minute buckets are computed from raw rows; hourly buckets are
+        combined from the 5-minute ones and daily from the hourly, so a save
+        reads a few minutes of raw snapshots rather than a whole day.
+        Returns the number of rollup rows written.
+        """
+        written = 0
+        for start in sorted({bucket_start(t, "5m") for t in snapshot_times}):
+            rows = [
+                (source, db_name, series, metric, "5m", _db_time(start),
+                 len(vals), vals[0], sum(vals) / len(vals), vals[-1], _p95(vals), sum(vals))
+                for (series, metric), vals in self._bucket_values(cursor, source, db_name, "5m", start).items()
+            ]
+            cursor.executemany(UPSERT_ROLLUP, rows)
+            written += len(rows)
+
+        for (finer, _), (resolution, seconds) in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+            for start in sorted({bucket_start(t, resolution) for t in snapshot_times}):
+                written += cursor.execute(UPSERT_ROLLUP_FROM_FINER, (
+                    resolution, _db_time(start), source, db_name, finer,
+                    _db_time(start), _db_time(start + timedelta(seconds=seconds)),
+                )).rowcount
+
+        self._close_rollups(cursor, source, db_name, max(snapshot_times))
+        return written
+
+    def _close_rollups(self, cursor, source: str, db_name: str, latest: datetime):
+        """
+        Fill in the p95 of hourly/daily buckets that ended before latest.
+        A percentile cannot be combined from finer buckets, so it is computed
+        from the raw rows, once per bucket (until a late snapshot reopens it).
+        """
+        for resolution, seconds in RESOLUTIONS[1:]:
+            closed = cursor.execute("""
+                SELECT DISTINCT bucket_start FROM snapshot_rollups
+                WHERE source = ? AND db_name = ? AND resolution = ? AND p95_value IS NULL AND bucket_start <= ?
+            """, (source, db_name, resolution, _db_time(latest - timedelta(seconds=seconds)))).fetchall()
+            for (start,) in closed:
+                values = self._bucket_values(cursor, source, db_name, resolution, datetime.fromisoformat(start))
+                cursor.executemany("""
+                    UPDATE snapshot_rollups SET p95_value = ?
+                    WHERE source = ? AND db_name = ? AND resolution = ? AND bucket_start = ?
+                      AND series = ? AND metric = ?
+                """, [
+                    (_p95(vals), source, db_name, resolution, start, series, metric)
+                    for (series, metric), vals in values.items()
+                ])
+
+    def _backfill_rollups(self):
+        """Build rollups once for snapshots saved before rollups existed."""
+        conn = self.storage.connect()
+        cursor = conn.cursor()
+        try:
+            if cursor.execute("SELECT 1 FROM snapshot_rollups LIMIT 1").fetchone():
+                return
+            written = 0
+            for source, (table, _, _) in _ROLLUP_SOURCES.items():
+                times = {}
+                for db_name, snapshot_time in cursor.execute(
+                    f"SELECT DISTINCT db_name, snapshot_time FROM {table}"
+                ).fetchall():
+                    times.setdefault(db_name, []).append(datetime.fromisoformat(snapshot_time))
+                for db_name, snapshot_times in times.items():
+                    written += self._update_rollups(cursor, source, db_name, snapshot_times)
+            with SQLITE_WRITE_SECONDS.time(("snapshot_rollups",)):
+                conn.commit()
+            if written:
+                logger.info(f"Built {written} snapshot rollup rows from existing snapshots")
+        except (sqlite3.Error, ValueError) as e:
+            conn.rollback()
+            logger.error(f"Error building snapshot rollups: {e}")
+        finally:
+            cursor.close()
+
+    def get_rollups(
+        self,
+        source: str,
+        db_name: str,
+        resolution: str,
+        hours: int = 24,
+        sql_id: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Rolled-up snapshots shaped like get_health_history / get_query_trends
+        rows: each metric field holds the bucket average, with <metric>_min,
+        <metric>_max and <metric>_p95 alongside and 'samples' per bucket.
+        Hourly and daily p95 is None until the bucket has closed (a later
+        snapshot was saved).
+        
+        Args:
+            source: 'health' or 'query'
+            db_name: Database identifier
+            resolution: '5m', '1h' or '1d'
+            hours: Hours of history to retrieve
+            sql_id: Only this SQL ID (query source)
+        
+        Returns:
+            List of bucket points ordered by time
+        """
+        conn = self.storage.connect()
         cursor = conn.cursor()
         
         try:
-            # System Health Snapshots Table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS system_health_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    db_name TEXT NOT NULL,
-                    snapshot_time DATETIME NOT NULL,
-                    cpu_usage_pct REAL,
-                    active_sessions INTEGER,
-                    buffer_cache_hit_ratio REAL,
-                    top_wait_event TEXT,
-                    top_wait_time_seconds REAL,
-                    health_score TEXT,
-                    metadata TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(db_name, snapshot_time)
-                )
-            """)
-            
-            # Index for time-based queries
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_health_db_time 
-                ON system_health_snapshots(db_name, snapshot_time DESC)
-            """)
-            
-            # Query Performance Snapshots Table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS query_performance_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    db_name TEXT NOT NULL,
-                    snapshot_time DATETIME NOT NULL,
-                    sql_id TEXT NOT NULL,
-                    sql_text TEXT,
-                    executions INTEGER,
-                    cpu_seconds REAL,
-                    elapsed_seconds REAL,
-                    buffer_gets INTEGER,
-                    disk_reads INTEGER,
-                    rows_processed INTEGER,
-                    avg_cpu_ms REAL,
-                    avg_elapsed_ms REAL,
-                    parsing_schema TEXT,
-                    metric_rank INTEGER,
-                    metric_type TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(db_name, snapshot_time, sql_id)
-                )
-            """)
-            
-            # Index for queries
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_query_perf_db_time 
-                ON query_performance_snapshots(db_name, snapshot_time DESC)
-            """)
-            
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_query_perf_sql_id 
-                ON query_performance_snapshots(sql_id)
-            """)
-            
-            conn.commit()
-            logger.info("Snapshot schema ensured in database")
+            cutoff = bucket_start(datetime.now() - timedelta(hours=hours), resolution)
+            query = """
+                SELECT bucket_start, series, metric, samples, min_value, avg_value, max_value, p95_value
+                FROM snapshot_rollups
+                WHERE source = ? AND db_name = ? AND resolution = ? AND bucket_start >= ?
+            """
+            params = [source, db_name, resolution, _db_time(cutoff)]
+            if sql_id:
+                query += " AND series = ?"
+                params.append(sql_id)
+            query += " ORDER BY bucket_start ASC, series ASC"
+            cursor.execute(query, params)
+
+            points = {}
+            for bucket, series, metric, samples, lo, avg, hi, p95 in cursor:
+                point = points.get((bucket, series))
+                if point is None:
+                    point = points[(bucket, series)] = {"timestamp": bucket, "resolution": resolution, "samples": 0}
+                    if source == "query":
+                        point["sql_id"] = series
+                point[metric] = avg
+                point[f"{metric}_min"] = lo
+                point[f"{metric}_max"] = hi
+                point[f"{metric}_p95"] = p95
+                point["samples"] = max(point["samples"], samples)
+
+            logger.info(f"Retrieved {len(points)} {resolution} {source} rollup points for {db_name}")
+            return list(points.values())
             
         except sqlite3.Error as e:
-            logger.error(f"Error creating snapshot schema: {e}")
-            raise
+            logger.error(f"Error retrieving rollups: {e}")
+            return []
         finally:
-            conn.close()
+            cursor.close()
     
+    # ------------------------------------------------------------------
+    # Interval deltas
+    # ------------------------------------------------------------------
+    def _apply_deltas(self, cursor, db_name: str, queries: List[Dict], observed_at: str) -> None:
+        """
+        Annotate queries with delta_status, interval_seconds and
+        delta_<counter>, then store their counters as the new state.
+        """
+        previous_collection = cursor.execute(
+            "SELECT MAX(observed_at) FROM query_counter_state WHERE db_name = ?", (db_name,)
+        ).fetchone()[0]
+        if previous_collection:
+            self._purge_counter_state(cursor, db_name, previous_collection)
+
+        state_rows = []
+        for query in queries:
+            key = (db_name, query['sql_id'], query.get('child_number') or 0, query.get('plan_hash_value') or 0)
+            row = cursor.execute(f"""
+                SELECT last_load_time, observed_at, {', '.join(COUNTERS)}
+                FROM query_counter_state
+                WHERE db_name = ? AND sql_id = ? AND child_number = ? AND plan_hash_value = ?
+            """, key).fetchone()
+            previous = None
+            if row is not None:
+                previous = {"last_load_time": row[0], "observed_at": row[1], **dict(zip(COUNTERS, row[2:]))}
+
+            status, deltas = counter_deltas(previous, query, previous_collection)
+            since = previous["observed_at"] if previous else previous_collection
+            query['delta_status'] = status
+            query['interval_seconds'] = (
+                (datetime.fromisoformat(observed_at) - datetime.fromisoformat(since)).total_seconds()
+                if since and status != 'baseline' else None
+            )
+            for counter, delta in deltas.items():
+                query[f'delta_{counter}'] = round(delta, 2) if isinstance(delta, float) else delta
+
+            state_rows.append(key + (load_time_iso(query.get('last_load_time')), observed_at) + tuple(query.get(c) for c in COUNTERS))
+
+        cursor.executemany(f"""
+            INSERT OR REPLACE INTO query_counter_state
+            (db_name, sql_id, child_number, plan_hash_value, last_load_time, observed_at, {', '.join(COUNTERS)})
+            VALUES (?, ?, ?, ?, ?, ?, {', '.join('?' * len(COUNTERS))})
+        """, state_rows)
+
+    def _purge_counter_state(self, cursor, db_name: str, latest: str) -> int:
+        """
+        Drop counter state of cursors not seen for counter_state_hours before
+        latest, the newest observed_at of db_name (database clock, like the
+        rows it is compared with). Returns the number of rows deleted.
+        """
+        cursor.execute("""
+            DELETE FROM query_counter_state WHERE db_name = ? AND observed_at < ?
+        """, (db_name, (datetime.fromisoformat(latest) - timedelta(hours=COUNTER_STATE_HOURS)).isoformat()))
+        return cursor.rowcount
+
+    def apply_deltas(self, db_name: str, queries: List[Dict], observed_at: Optional[str] = None) -> List[Dict]:
+        """
+        Compute per-interval activity for V$SQL rows against the previous
+        collection of the same child cursors (AWR-style deltas).
+
+        Args:
+            db_name: Database identifier
+            queries: Rows from OracleMonitor.get_top_queries_realtime(); annotated in place
+            observed_at: Collection time on the database clock (its 'db_time');
+                         defaults to now
+
+        Returns:
+            The annotated queries
+        """
+        observed_at = observed_at or datetime.now().isoformat()
+        conn = self.storage.connect()
+        cursor = conn.cursor()
+        try:
+            self._apply_deltas(cursor, db_name, queries, observed_at)
+            with SQLITE_WRITE_SECONDS.time(("query_counter_state",)):
+                conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Error computing query deltas: {e}")
+        finally:
+            cursor.close()
+        return queries
+
     def save_health_snapshot(self, db_name: str, health_data: Dict) -> bool:
         """
         Save system health snapshot
@@ -126,7 +468,7 @@ class SnapshotManager:
             logger.warning(f"Skipping health snapshot with error: {health_data['error']}")
             return False
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self.storage.connect()
         cursor = conn.cursor()
         
         try:
@@ -163,32 +505,39 @@ class SnapshotManager:
                 health_data.get('health_score'),
                 json.dumps(metadata)
             ))
+            self._update_rollups(cursor, "health", db_name, [snapshot_time])
             
-            conn.commit()
+            with SQLITE_WRITE_SECONDS.time(("health_snapshot",)):
+                conn.commit()
             logger.info(f"Saved health snapshot for {db_name} at {snapshot_time}")
             return True
             
         except sqlite3.Error as e:
+            conn.rollback()
             logger.error(f"Error saving health snapshot: {e}")
             return False
         finally:
-            conn.close()
+            cursor.close()
     
     def save_query_snapshots(
         self, 
         db_name: str, 
         snapshot_time: datetime,
         queries: List[Dict],
-        metric_type: str
+        metric_type: str,
+        db_time: Optional[str] = None
     ) -> int:
         """
-        Save query performance snapshots
+        Save query performance snapshots (cumulative counters plus the
+        interval deltas; deltas are computed here unless apply_deltas()
+        already annotated the queries)
         
         Args:
             db_name: Database identifier
             snapshot_time: When snapshot was taken
             queries: List of queries from OracleMonitor.get_top_queries_realtime()
             metric_type: Metric used for ranking (cpu, elapsed, etc.)
+            db_time: Collection time on the database clock (result's 'db_time')
         
         Returns:
             Number of queries saved
@@ -196,24 +545,34 @@ class SnapshotManager:
         if not queries:
             return 0
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self.storage.connect()
         cursor = conn.cursor()
         saved_count = 0
         
         try:
+            pending = [q for q in queries if 'delta_status' not in q]
+            if pending:
+                self._apply_deltas(cursor, db_name, pending, db_time or snapshot_time.isoformat())
+            
             for rank, query in enumerate(queries, 1):
                 cursor.execute("""
                     INSERT OR REPLACE INTO query_performance_snapshots
-                    (db_name, snapshot_time, sql_id, sql_text, executions,
+                    (db_name, snapshot_time, sql_id, child_number, plan_hash_value,
+                     last_load_time, sql_text, executions,
                      cpu_seconds, elapsed_seconds, buffer_gets, disk_reads,
                      rows_processed, avg_cpu_ms, avg_elapsed_ms, parsing_schema,
-                     metric_rank, metric_type)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     metric_rank, metric_type, delta_status, interval_seconds,
+                     delta_executions, delta_cpu_seconds, delta_elapsed_seconds,
+                     delta_buffer_gets, delta_disk_reads, delta_rows_processed)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     db_name,
                     snapshot_time,
                     query['sql_id'],
-                    query['sql_text'],
+                    query.get('child_number') or 0,
+                    query.get('plan_hash_value'),
+                    load_time_iso(query.get('last_load_time')),
+                    query.get('sql_text'),
                     query['executions'],
                     query['cpu_seconds'],
                     query['elapsed_seconds'],
@@ -224,19 +583,25 @@ class SnapshotManager:
                     query['avg_elapsed_ms'],
                     query['parsing_schema'],
                     rank,
-                    metric_type
+                    metric_type,
+                    query.get('delta_status'),
+                    query.get('interval_seconds'),
+                    *(query.get(f'delta_{c}') for c in COUNTERS)
                 ))
                 saved_count += 1
+            self._update_rollups(cursor, "query", db_name, [snapshot_time])
             
-            conn.commit()
+            with SQLITE_WRITE_SECONDS.time(("query_snapshots",)):
+                conn.commit()
             logger.info(f"Saved {saved_count} query snapshots for {db_name}")
             return saved_count
             
         except sqlite3.Error as e:
+            conn.rollback()
             logger.error(f"Error saving query snapshots: {e}")
-            return saved_count
+            return 0
         finally:
-            conn.close()
+            cursor.close()
     
     def get_health_history(
         self, 
@@ -253,7 +618,7 @@ class SnapshotManager:
         Returns:
             List of health snapshots ordered by time
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self.storage.connect()
         cursor = conn.cursor()
         
         try:
@@ -295,7 +660,7 @@ class SnapshotManager:
             logger.error(f"Error retrieving health history: {e}")
             return []
         finally:
-            conn.close()
+            cursor.close()
     
     def get_query_trends(
         self,
@@ -316,7 +681,7 @@ class SnapshotManager:
         Returns:
             List of query snapshots ordered by time
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self.storage.connect()
         cursor = conn.cursor()
         
         try:
@@ -327,6 +692,15 @@ class SnapshotManager:
                     snapshot_time,
                     sql_id,
                     sql_text,
+                    child_number,
+                    plan_hash_value,
+                    delta_status,
+                    interval_seconds,
+                    delta_executions,
+                    delta_cpu_seconds,
+                    delta_elapsed_seconds,
+                    delta_buffer_gets,
+                    delta_disk_reads,
                     executions,
                     cpu_seconds,
                     elapsed_seconds,
@@ -360,15 +734,24 @@ class SnapshotManager:
                     'timestamp': row[0],
                     'sql_id': row[1],
                     'sql_text': row[2],
-                    'executions': row[3],
-                    'cpu_seconds': row[4],
-                    'elapsed_seconds': row[5],
-                    'buffer_gets': row[6],
-                    'disk_reads': row[7],
-                    'avg_cpu_ms': row[8],
-                    'avg_elapsed_ms': row[9],
-                    'metric_rank': row[10],
-                    'metric_type': row[11]
+                    'child_number': row[3],
+                    'plan_hash_value': row[4],
+                    'delta_status': row[5],
+                    'interval_seconds': row[6],
+                    'delta_executions': row[7],
+                    'delta_cpu_seconds': row[8],
+                    'delta_elapsed_seconds': row[9],
+                    'delta_buffer_gets': row[10],
+                    'delta_disk_reads': row[11],
+                    'executions': row[12],
+                    'cpu_seconds': row[13],
+                    'elapsed_seconds': row[14],
+                    'buffer_gets': row[15],
+                    'disk_reads': row[16],
+                    'avg_cpu_ms': row[17],
+                    'avg_elapsed_ms': row[18],
+                    'metric_rank': row[19],
+                    'metric_type': row[20]
                 })
             
             logger.info(f"Retrieved {len(trends)} query trend snapshots for {db_name}")
@@ -378,11 +761,12 @@ class SnapshotManager:
             logger.error(f"Error retrieving query trends: {e}")
             return []
         finally:
-            conn.close()
+            cursor.close()
     
     def cleanup_old_snapshots(self, retention_days: int = 30) -> Tuple[int, int]:
         """
-        Delete snapshots older than retention period
+        Delete snapshots older than retention period (rollups use
+        snapshots.rollups.retention_days per resolution)
         
         Args:
             retention_days: Number of days to keep (default 30)
@@ -390,7 +774,7 @@ class SnapshotManager:
         Returns:
             Tuple of (health_deleted, query_deleted) counts
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self.storage.connect()
         cursor = conn.cursor()
         
         try:
@@ -408,12 +792,27 @@ class SnapshotManager:
             """, (cutoff_time,))
             query_deleted = cursor.rowcount
             
-            conn.commit()
+            # Counter state of cursors that aged out long ago is of no use
+            for db_name, latest in cursor.execute(
+                "SELECT db_name, MAX(observed_at) FROM query_counter_state GROUP BY db_name"
+            ).fetchall():
+                self._purge_counter_state(cursor, db_name, latest)
+            
+            # Rollups outlive raw snapshots: each resolution has its own retention
+            for resolution, days in ROLLUP_RETENTION_DAYS.items():
+                cursor.execute("""
+                    DELETE FROM snapshot_rollups
+                    WHERE resolution = ? AND bucket_start < ?
+                """, (resolution, _db_time(datetime.now() - timedelta(days=days))))
+            
+            with SQLITE_WRITE_SECONDS.time(("snapshot_cleanup",)):
+                conn.commit()
             logger.info(f"Cleaned up {health_deleted} health + {query_deleted} query snapshots older than {retention_days} days")
             return (health_deleted, query_deleted)
             
         except sqlite3.Error as e:
+            conn.rollback()
             logger.error(f"Error cleaning up snapshots: {e}")
             return (0, 0)
         finally:
-            conn.close()
+            cursor.close()
@@ -0,0 +1,55 @@
+# server/plan_digest.py
+# Plan identity for history: a digest over the plan's structure only, so the
+# same plan hashes the same whatever its runtime figures or cursor.
+
+import json
+import hashlib
+
+# Step fields that make up the plan shape (Oracle PLAN_TABLE / V$SQL_PLAN and
+# the MySQL EXPLAIN steps built by mysql_collector_impl)
+STRUCTURAL_KEYS = (
+    "id", "parent_id", "operation", "options", "object_owner", "object_name",
+    "access_predicates", "filter_predicates",
+    "depth", "table", "access_type", "key_used", "extra",
+)
+
+# Per-execution / per-cursor figures (apply_runtime_stats, get_cursor_plan):
+# kept with the execution row, never in the content-addressed plan
+RUNTIME_KEYS = (
+    "child_number", "starts", "a_rows", "buffers", "disk_reads", "elapsed_ms",
+    "self_ms", "e_rows", "misestimate_ratio", "misestimate",
+)
+
+
+def _canonical(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def plan_digest(plan_details: list) -> str:
+    """Digest of the structural columns of every step; identical plans, identical digests."""
+    shape = [{k: step.get(k) for k in STRUCTURAL_KEYS if k in step} for step in plan_details]
+    return hashlib.blake2b(_canonical(shape).encode(), digest_size=16).hexdigest()
+
+
+def split_runtime(plan_details: list) -> tuple:
+    """
+    (plan without runtime fields, runtime figures or None).
+
+    Runtime figures are [{"id": step id, <runtime field>: value, ...}, ...]
+    for the steps that carry any.
+    """
+    plan, runtime = [], []
+    for step in plan_details:
+        plan.append({k: v for k, v in step.items() if k not in RUNTIME_KEYS})
+        figures = {k: step[k] for k in RUNTIME_KEYS if k in step}
+        if figures:
+            runtime.append({"id": step.get("id"), **figures})
+    return plan, runtime or None
+
+
+def encode_plan(plan_details: list) -> tuple:
+    """
+    (digest, canonical JSON of the plan without runtime fields, runtime JSON or None).
+    """
+    plan, runtime = split_runtime(plan_details)
+    return plan_digest(plan), _canonical(plan), _canonical(runtime) if runtime else None
@@ -69,11 +69,14 @@ Example response structure:
 #### For ORACLE Databases:
 - ✅ Use: `analyze_oracle_query(db_name, sql_text)`
 - ✅ Use: `compare_oracle_query_plans(db_name, original_sql, optimized_sql)`
+- ✅ Use: `analyze_oracle_sql_id(db_name, sql_id)` for statements already running (e.g. from `get_top_queries`)
+- ✅ Use: `analyze_oracle_queries_batch(db_name, sql_list)` for a workload of several statements
 - ❌ DON'T use MySQL tools for Oracle databases!
 
 #### For MYSQL Databases:
 - ✅ Use: `analyze_mysql_query(db_name, sql_text)`
 - ✅ Use: `compare_mysql_query_plans(db_name, original_sql, optimized_sql)`
+- ✅ Use: `analyze_mysql_queries_batch(db_name, sql_list)` for a workload of several statements
 - ❌ DON'T use Oracle tools for MySQL databases!
 
 ### Step 3: Verification
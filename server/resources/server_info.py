@@ -1,23 +1,90 @@
 # server/resources/server_info.py
+import time
 from mcp_app import mcp
 from datetime import datetime
 from config import config
+from db_connector import oracle_connector
+from tools.oracle_metadata_cache import metadata_cache
+from tools.analysis_result_cache import result_cache
+from history_tracker import history_store, fingerprint_memo, plan_storage_stats
+from storage import storage
+from metrics import PHASE_SECONDS, TOOL_CALLS, TOOL_ERRORS, IN_FLIGHT, STARTED_AT
 
 @mcp.resource("data://statistics/summary")
 def get_statistics() -> dict:
     """
-    Dynamic statistics resource.
+    Dynamic statistics resource (same counters as the /metrics endpoint).
     """
+    calls_by_tool = {}
+    for (tool, _preset, _status), count in TOOL_CALLS.series().items():
+        calls_by_tool[tool] = calls_by_tool.get(tool, 0) + count
     return {
         "server_name": config.server_name,
-        "uptime_hours": 42,  # Placeholder; implement actual uptime tracking
-        "total_requests": 1337,  # Placeholder
+        "uptime_hours": round((time.time() - STARTED_AT) / 3600, 3),
+        "total_requests": int(TOOL_CALLS.total()),
+        "total_errors": int(TOOL_ERRORS.total()),
+        "in_flight": int(IN_FLIGHT.total()),
+        "requests_by_tool": calls_by_tool,
         "active_tools": len(mcp.tools),
         "active_resources": len(mcp.resources),
         "active_prompts": len(mcp.prompts),
         "generated_at": datetime.now().isoformat()
     }
 
+@mcp.resource("data://statistics/pools")
+def get_pool_statistics() -> dict:
+    """
+    Oracle session pool utilization per database preset.
+    """
+    return {
+        "oracle_pools": oracle_connector.get_pool_stats(),
+        "generated_at": datetime.now().isoformat()
+    }
+
+@mcp.resource("data://statistics/metadata_cache")
+def get_metadata_cache_statistics() -> dict:
+    """
+    Oracle dictionary metadata cache counters (hits, misses, invalidations).
+    """
+    return {
+        "metadata_cache": metadata_cache.stats(),
+        "generated_at": datetime.now().isoformat()
+    }
+
+@mcp.resource("data://statistics/result_cache")
+def get_result_cache_statistics() -> dict:
+    """
+    analyze_* result cache counters (hits, misses, coalesced duplicate calls).
+    """
+    return {
+        "result_cache": result_cache.stats(),
+        "generated_at": datetime.now().isoformat()
+    }
+
+@mcp.resource("data://statistics/history_store")
+def get_history_store_statistics() -> dict:
+    """
+    Storage file (path, schema version, size), query history writer (queue
+    depth, batches, flush latency), the fingerprint memo and stored plan sizes.
+    """
+    return {
+        "storage": storage.stats(),
+        "history_store": history_store.stats(),
+        "fingerprint_cache": fingerprint_memo.stats(),
+        "plan_storage": plan_storage_stats(),
+        "generated_at": datetime.now().isoformat()
+    }
+
+@mcp.resource("data://statistics/phase_timings")
+def get_phase_timing_statistics() -> dict:
+    """
+    Per-phase analysis latency (count, mean, p50, p95) by collector.
+    """
+    return {
+        "phases": PHASE_SECONDS.summary(),
+        "generated_at": datetime.now().isoformat()
+    }
+
 @mcp.resource("config://server/settings")
 def get_server_config() -> dict:
     """
@@ -6,15 +6,19 @@ import logging
 import importlib
 import pkgutil
 import warnings
+from contextlib import asynccontextmanager
 
 from starlette.applications import Starlette
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.responses import JSONResponse, PlainTextResponse, Response
 import uvicorn
 
 from config import config
+from logging_setup import setup_logging, stop_logging
 from mcp_app import mcp
-import db_connector
+import db_probe
+import metrics
+import history_tracker
 from db_connector import oracle_connector
 from auth_middleware import AuthMiddleware
 
@@ -22,27 +26,14 @@ from auth_middleware import AuthMiddleware
 # -------------------------------------------------------------
 # Logging
 # -------------------------------------------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.StreamHandler()]
-)
+# Queue-based: request threads enqueue, one listener thread formats and writes
+# (JSON lines with logging.json: true or LOG_JSON=1)
+setup_logging()
 logger = logging.getLogger("server")
 
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("fastmcp").setLevel(logging.WARNING)
 
-# Optional JSON log mode
-if os.getenv("LOG_JSON") == "1":
-    import json
-    class JSONHandler(logging.StreamHandler):
-        def emit(self, record):
-            sys.stdout.write(json.dumps({
-                "level": record.levelname,
-                "msg": record.getMessage()
-            }) + "\n")
-    logger.handlers = [JSONHandler()]
-
 
 AUTO_DISCOVER = os.getenv("AUTO_DISCOVER", "true").lower() in ("1", "true", "yes", "on")
 
@@ -52,6 +43,8 @@ AUTO_DISCOVER = os.getenv("AUTO_DISCOVER", "true").lower() in ("1", "true", "yes
 # -------------------------------------------------------------
 def _graceful(*_):
     logger.info("🛑 Received shutdown signal. Shutting down gracefully.")
+    oracle_connector.close_all_pools()
+    stop_logging()
     sys.exit(0)
 
 for sig in (signal.SIGINT, signal.SIGTERM):
@@ -105,55 +98,25 @@ else:
 
 
 # -------------------------------------------------------------
-# DB Connectivity Test (Init Step)
+# DB Connectivity Test (Background)
 # -------------------------------------------------------------
-logger.info("🔍 Performing initial DB connectivity tests...")
-logger.info("")
-
-# Group databases by type
-oracle_dbs = []
-mysql_dbs = []
-other_dbs = []
-
-for preset_name, preset_config in config.database_presets.items():
-    db_type = preset_config.get("type", "oracle")
-    if db_type == "oracle":
-        oracle_dbs.append(preset_name)
-    elif db_type == "mysql":
-        mysql_dbs.append(preset_name)
-    else:
-        other_dbs.append(preset_name)
-
-# Test Oracle databases
-if oracle_dbs:
-    logger.info(f"📊 ORACLE DATABASES ({len(oracle_dbs)}):")
-    for db_name in oracle_dbs:
-        success = db_connector.test_connection(db_name)
-        if not success:
-            logger.warning(f"   ⚠️  {db_name}: Connection failed")
-    logger.info("")
-
-# Test MySQL databases
-if mysql_dbs:
-    logger.info(f"📊 MYSQL DATABASES ({len(mysql_dbs)}):")
-    for db_name in mysql_dbs:
-        success = db_connector.test_connection(db_name)
-        if not success:
-            logger.warning(f"   ⚠️  {db_name}: Connection failed")
-    logger.info("")
-
-# Test other database types
-if other_dbs:
-    logger.info(f"📊 OTHER DATABASES ({len(other_dbs)}):")
-    for db_name in other_dbs:
-        success = db_connector.test_connection(db_name)
-        if not success:
-            logger.warning(f"   ⚠️  {db_name}: Connection failed")
-    logger.info("")
-
-total_dbs = len(oracle_dbs) + len(mysql_dbs) + len(other_dbs)
-logger.info(f"✅ Database connectivity check complete! ({total_dbs} databases tested)")
-logger.info("")
+# Checks run concurrently in a background thread once the app starts, so an
+# unreachable listener never delays startup. Progress is visible on /readyz.
+def _log_connectivity_summary(results: dict):
+    groups = {}
+    for db_name, preset_config in config.database_presets.items():
+        groups.setdefault(preset_config.get("type", "oracle"), []).append(db_name)
+
+    for db_type, names in groups.items():
+        logger.info(f"📊 {db_type.upper()} DATABASES ({len(names)}):")
+        for db_name in names:
+            info = results.get(db_name, {})
+            if info.get("status") != "accessible":
+                logger.warning(f"   ⚠️  {db_name}: Connection failed ({info.get('status', 'pending')})")
+        logger.info("")
+
+    accessible = sum(1 for r in results.values() if r.get("status") == "accessible")
+    logger.info(f"✅ Database connectivity check complete! ({accessible}/{len(results)} databases accessible)")
 
 
 print(f"🌐 Listening on port: {config.server_port}")
@@ -168,7 +131,20 @@ os.environ["PYTHONUNBUFFERED"] = "1"
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 mcp_http_app = mcp.http_app()
-app = Starlette(lifespan=mcp_http_app.lifespan)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Schema migrations and the one-time baseline backfill, before any tool runs
+    history_tracker.init_db()
+    logger.info(f"🔍 Starting background DB connectivity checks ({len(config.database_presets)} databases)...")
+    db_probe.start_background_refresh(on_first_refresh=_log_connectivity_summary)
+    async with mcp_http_app.lifespan(app):
+        yield
+    db_probe.stop_background_refresh()
+
+
+app = Starlette(lifespan=lifespan)
 
 
 # ---- Simple Endpoints ----
@@ -176,6 +152,19 @@ async def health(request):
     return PlainTextResponse("ok")
 
 
+async def ready(request):
+    is_ready, databases = db_probe.readiness()
+    return JSONResponse(
+        {
+            "ready": is_ready,
+            "databases": databases,
+            "accessible": sum(1 for d in databases.values() if d["ready"]),
+            "total": len(databases),
+        },
+        status_code=200 if is_ready else 503,
+    )
+
+
 async def info(request):
     return JSONResponse({
         "name": config.server_name,
@@ -183,6 +172,14 @@ async def info(request):
     })
 
 
+async def pools(request):
+    return JSONResponse({"oracle_pools": oracle_connector.get_pool_stats()})
+
+
+async def prometheus_metrics(request):
+    return Response(metrics.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 async def version(request):
     return JSONResponse({
         "server": config.server_name,
@@ -194,7 +191,10 @@ async def version(request):
 # ---- Routes ----
 app.add_route("/version", version, methods=["GET"])
 app.add_route("/healthz", health, methods=["GET"])
+app.add_route("/readyz", ready, methods=["GET"])
 app.add_route("/_info", info, methods=["GET"])
+app.add_route("/_pools", pools, methods=["GET"])
+app.add_route("/metrics", prometheus_metrics, methods=["GET"])
 
 
 # ---- Authentication ----
@@ -0,0 +1,193 @@
+# server/sql_lexer.py
+# Single-pass, dialect-aware SQL tokenizer shared by fingerprinting,
+# safety validation and object/column extraction.
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Token kinds
+WORD = "WORD"                  # keyword or unquoted identifier (value upper-cased in .upper)
+QUOTED_IDENT = "QUOTED_IDENT"  # "Name" (Oracle) / `name` (MySQL)
+STRING = "STRING"              # '...', N'...', q'[...]' (Oracle), "..." (MySQL)
+NUMBER = "NUMBER"
+BIND = "BIND"                  # :name, :1, ? and $$SUBSTITUTION placeholders
+OP = "OP"
+PUNCT = "PUNCT"                # ( ) , . ; @
+OTHER = "OTHER"
+
+Token = namedtuple("Token", "kind value upper start gap")
+"""
+kind:  one of the token kinds above
+value: the token text as written
+upper: value.upper() for WORD tokens, value otherwise
+start: offset in the original text
+gap:   True when whitespace or a comment precedes the token
+"""
+
+_NUMBER = r"(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?"
+_OPS = r"<>|!=|\^=|<=|>=|\|\||:=|=>|[-+*/%=<>!~^&|]"
+
+_ORACLE = re.compile(
+    r"""
+      (?P<ws>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<qquote>[nN]?[qQ]'(?:\[.*?\]|\{.*?\}|<.*?>|\(.*?\)|(?P<qd>[^\s\[{<(])(?:.*?)(?P=qd))')
+    | (?P<string>[nN]?'(?:[^']|'')*(?:'|\Z))
+    | (?P<qident>"(?:[^"]|"")*(?:"|\Z))
+    | (?P<bind>:(?:\d+|[A-Za-z_][\w$#]*)|\$\$?[A-Za-z_]\w*)
+    | (?P<word>[A-Za-z_][\w$#]*)
+    | (?P<number>""" + _NUMBER + r""")
+    | (?P<op>""" + _OPS + r""")
+    | (?P<punct>[(),.;@])
+    | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# MySQL executes the body of /*! ... */ and /*!NNNNN ... */ comments, so only
+# their delimiters are dropped and the body is tokenized as code
+_MYSQL = re.compile(
+    r"""
+      (?P<ws>\s+)
+    | (?P<exec_open>/\*!\d*)
+    | (?P<exec_close>\*/)
+    | (?P<comment>(?:--(?=\s|\Z)|\#)[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<string>[nN]?'(?:[^'\\]|\\.|'')*(?:'|\Z)|"(?:[^"\\]|\\.|"")*(?:"|\Z))
+    | (?P<qident>`(?:[^`]|``)*(?:`|\Z))
+    | (?P<bind>\?|:[A-Za-z_]\w*)
+    | (?P<word>[A-Za-z_$][\w$]*)
+    | (?P<number>""" + _NUMBER + r""")
+    | (?P<op>""" + _OPS + r""")
+    | (?P<punct>[(),.;@])
+    | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_KINDS = {
+    "qquote": STRING,
+    "string": STRING,
+    "qident": QUOTED_IDENT,
+    "bind": BIND,
+    "word": WORD,
+    "number": NUMBER,
+    "op": OP,
+    "punct": PUNCT,
+    "other": OTHER,
+}
+
+_DIALECTS = {"oracle": _ORACLE, "mysql": _MYSQL}
+
+
+@lru_cache(maxsize=256)
+def tokenize(sql: str, dialect: str = "oracle") -> tuple:
+    """
+    Tokenize SQL in one pass. Comments and whitespace are dropped (recorded
+    as Token.gap on the following token); in MySQL the body of /*! ... */
+    comments is kept as code, because the server executes it.
+
+    Results are memoized per (text, dialect), so every consumer in one request
+    shares a single scan. Returns an immutable tuple of Token.
+    """
+    pattern = _DIALECTS[dialect]
+    tokens = []
+    gap = False
+    in_exec = False  # inside a MySQL /*! executable comment
+    sql = sql or ""
+    pos = 0
+    while pos < len(sql):
+        m = pattern.match(sql, pos)
+        group = m.lastgroup
+        pos = m.end()
+        if group == "exec_open" or (group == "exec_close" and in_exec):
+            in_exec = group == "exec_open"
+            gap = True
+            continue
+        if group == "exec_close":
+            # Not closing anything: an ordinary *, then lex again from the /
+            tokens.append(Token(OP, "*", "*", m.start(), gap))
+            gap = False
+            pos = m.start() + 1
+            continue
+        if group in ("ws", "comment"):
+            gap = True
+            continue
+        value = m.group()
+        kind = _KINDS[group]
+        tokens.append(Token(kind, value, value.upper() if kind == WORD else value, m.start(), gap))
+        gap = False
+    return tuple(tokens)
+
+
+def identifier(token) -> str:
+    """Dictionary name of an identifier token: WORD upper-cased, quoted as written."""
+    if token.kind == QUOTED_IDENT:
+        return token.value[1:-1].replace(token.value[0] * 2, token.value[0])
+    return token.upper
+
+
+def is_name(token) -> bool:
+    return token.kind in (WORD, QUOTED_IDENT)
+
+
+def words(tokens) -> set:
+    """Upper-cased WORD tokens (keywords/identifiers outside strings and comments)."""
+    return {t.upper for t in tokens if t.kind == WORD}
+
+
+def first_word(tokens) -> str:
+    """First significant token, upper-cased ('' for empty SQL)."""
+    for t in tokens:
+        if t.kind == PUNCT and t.value == "(":
+            continue
+        return t.upper
+    return ""
+
+
+def max_paren_depth(tokens) -> int:
+    depth = 0
+    max_depth = 0
+    for t in tokens:
+        if t.kind == PUNCT:
+            if t.value == "(":
+                depth += 1
+                max_depth = max(max_depth, depth)
+            elif t.value == ")":
+                depth -= 1
+    return max_depth
+
+
+def qualified_names(tokens):
+    """
+    Yield (start_index, [part, ...]) for every dotted name chain such as
+    OWNER.TABLE or ALIAS.COLUMN or OWNER.TABLE.COLUMN.
+    """
+    i = 0
+    n = len(tokens)
+    while i < n:
+        if is_name(tokens[i]):
+            parts = [identifier(tokens[i])]
+            j = i + 1
+            while (j + 1 < n and tokens[j].kind == PUNCT and tokens[j].value == "."
+                   and is_name(tokens[j + 1]) and not tokens[j].gap and not tokens[j + 1].gap):
+                parts.append(identifier(tokens[j + 1]))
+                j += 2
+            if len(parts) > 1:
+                yield i, parts
+            i = j
+        else:
+            i += 1
+
+
+def rebuild(tokens, replace=None) -> str:
+    """
+    Re-join tokens with single spaces where the original had whitespace or
+    comments. `replace(token)` may return substitute text for a token.
+    """
+    out = []
+    for t in tokens:
+        if t.gap and out:
+            out.append(" ")
+        out.append(replace(t) if replace else t.value)
+    return "".join(out)
@@ -0,0 +1,486 @@
+# server/storage.py
+# The one SQLite database behind query history, baselines, stored plans and
+# performance snapshots: absolute path, WAL connections, versioned schema.
+
+import os
+import json
+import zlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from config import config
+from plan_digest import split_runtime, plan_digest
+
+logger = logging.getLogger("storage")
+
+SERVER_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = SERVER_DIR / "data" / "query_history.db"
+
+# Snapshots used to go to a query_history.db relative to the working directory
+# (normally server/); rows found there are copied in once by migration 4
+LEGACY_SNAPSHOT_DB = SERVER_DIR / "query_history.db"
+
+
+def resolve_db_path(path=None) -> Path:
+    """
+    Absolute database path: METAQUERY_DB_PATH, then storage.path from
+    settings.yaml (relative paths are relative to server/), then the default.
+    """
+    path = path or os.getenv("METAQUERY_DB_PATH") or config.storage.get("path")
+    if not path:
+        return DEFAULT_DB_PATH
+    path = Path(path).expanduser()
+    return path if path.is_absolute() else (SERVER_DIR / path).resolve()
+
+
+def add_column(conn, table: str, column_def: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    if column_def.split()[0] not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column_def}")
+
+
+# ============================================================
+# MIGRATIONS
+# ============================================================
+# Append only: (version, description, fn(conn, storage)). Each runs once, in
+# its own explicit transaction (DDL included) together with its
+# schema_version row, so a failed migration leaves no trace and is retried. Early migrations use
+# IF NOT EXISTS because databases from before versioning already have them.
+
+def _m1_executions(conn, storage):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS executions (
+            fingerprint TEXT NOT NULL,
+            db_name TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            plan_hash TEXT,
+            cost INTEGER,
+            table_stats TEXT,
+            plan_operations TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_lookup
+        ON executions(fingerprint, db_name, timestamp DESC)
+    """)
+
+
+def _m2_baselines(conn, storage):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS baselines (
+            fingerprint TEXT NOT NULL,
+            db_name TEXT NOT NULL,
+            executions INTEGER NOT NULL,
+            cost_samples INTEGER NOT NULL,
+            cost_mean REAL,
+            cost_m2 REAL,
+            cost_ewma REAL,
+            last_plan_hash TEXT,
+            first_seen TEXT,
+            last_seen TEXT,
+            PRIMARY KEY (fingerprint, db_name)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS baseline_plans (
+            fingerprint TEXT NOT NULL,
+            db_name TEXT NOT NULL,
+            plan_hash TEXT NOT NULL,
+            executions INTEGER NOT NULL,
+            first_seen TEXT,
+            last_seen TEXT,
+            PRIMARY KEY (fingerprint, db_name, plan_hash)
+        )
+    """)
+
+
+def _m3_plans(conn, storage):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS plans (
+            digest TEXT PRIMARY KEY,
+            plan_hash TEXT,
+            codec TEXT NOT NULL,
+            raw_bytes INTEGER NOT NULL,
+            plan BLOB NOT NULL,
+            first_seen TEXT
+        )
+    """)
+    add_column(conn, "executions", "plan_digest TEXT")
+    add_column(conn, "baseline_plans", "plan_digest TEXT")
+
+
+def _m4_snapshots(conn, storage):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS system_health_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            db_name TEXT NOT NULL,
+            snapshot_time DATETIME NOT NULL,
+            cpu_usage_pct REAL,
+            active_sessions INTEGER,
+            buffer_cache_hit_ratio REAL,
+            top_wait_event TEXT,
+            top_wait_time_seconds REAL,
+            health_score TEXT,
+            metadata TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(db_name, snapshot_time)
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_health_db_time
+        ON system_health_snapshots(db_name, snapshot_time DESC)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_performance_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            db_name TEXT NOT NULL,
+            snapshot_time DATETIME NOT NULL,
+            sql_id TEXT NOT NULL,
+            sql_text TEXT,
+            executions INTEGER,
+            cpu_seconds REAL,
+            elapsed_seconds REAL,
+            buffer_gets INTEGER,
+            disk_reads INTEGER,
+            rows_processed INTEGER,
+            avg_cpu_ms REAL,
+            avg_elapsed_ms REAL,
+            parsing_schema TEXT,
+            metric_rank INTEGER,
+            metric_type TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(db_name, snapshot_time, sql_id)
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_query_perf_db_time
+        ON query_performance_snapshots(db_name, snapshot_time DESC)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_query_perf_sql_id
+        ON query_performance_snapshots(sql_id)
+    """)
+    _import_legacy_snapshots(conn, storage)
+
+
+def _import_legacy_snapshots(conn, storage):
+    """Copy snapshot rows from the old CWD-relative database, if there is one."""
+    legacy = LEGACY_SNAPSHOT_DB.resolve()
+    if not legacy.exists() or legacy == Path(storage.db_path).resolve():
+        return
+    # Read through a separate read-only connection: ATTACH is not allowed
+    # inside the migration's transaction, and the legacy file is left in place
+    source = sqlite3.connect(f"{legacy.as_uri()}?mode=ro", uri=True)
+    try:
+        tables = {r[0] for r in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in ("system_health_snapshots", "query_performance_snapshots"):
+            if table not in tables:
+                continue
+            columns = [r[1] for r in source.execute(f"PRAGMA table_info({table})") if r[1] != "id"]
+            column_list = ", ".join(columns)
+            copied = conn.executemany(
+                f"INSERT OR IGNORE INTO {table} ({column_list}) VALUES ({', '.join('?' * len(columns))})",
+                source.execute(f"SELECT {column_list} FROM {table}"),
+            ).rowcount
+            if copied:
+                logger.info(f"📥 Imported {copied} row(s) of {table} from {legacy}")
+    finally:
+        source.close()
+
+
+def _m5_snapshot_rollups(conn, storage):
+    # Long format: one row per (source, preset, series, metric, resolution, bucket).
+    # series is the sql_id for query snapshots and '' for health snapshots.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshot_rollups (
+            source TEXT NOT NULL,
+            db_name TEXT NOT NULL,
+            series TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            samples INTEGER NOT NULL,
+            min_value REAL,
+            avg_value REAL,
+            max_value REAL,
+            p95_value REAL,
+            PRIMARY KEY (source, db_name, resolution, bucket_start, series, metric)
+        )
+    """)
+
+
+def _m6_query_deltas(conn, storage):
+    # Snapshots become per child cursor (V$SQL child_number / plan_hash_value)
+    # and carry per-interval deltas next to the cumulative counters. SQLite
+    # cannot change a UNIQUE constraint in place, so the table is rebuilt.
+    conn.execute("DROP TABLE IF EXISTS query_performance_snapshots_v6")
+    conn.execute("""
+        CREATE TABLE query_performance_snapshots_v6 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            db_name TEXT NOT NULL,
+            snapshot_time DATETIME NOT NULL,
+            sql_id TEXT NOT NULL,
+            child_number INTEGER NOT NULL DEFAULT 0,
+            plan_hash_value INTEGER,
+            last_load_time TEXT,
+            sql_text TEXT,
+            executions INTEGER,
+            cpu_seconds REAL,
+            elapsed_seconds REAL,
+            buffer_gets INTEGER,
+            disk_reads INTEGER,
+            rows_processed INTEGER,
+            avg_cpu_ms REAL,
+            avg_elapsed_ms REAL,
+            parsing_schema TEXT,
+            metric_rank INTEGER,
+            metric_type TEXT,
+            delta_status TEXT,
+            interval_seconds REAL,
+            delta_executions INTEGER,
+            delta_cpu_seconds REAL,
+            delta_elapsed_seconds REAL,
+            delta_buffer_gets INTEGER,
+            delta_disk_reads INTEGER,
+            delta_rows_processed INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(db_name, snapshot_time, sql_id, child_number)
+        )
+    """)
+    columns = (
+        "db_name, snapshot_time, sql_id, sql_text, executions, cpu_seconds, elapsed_seconds, "
+        "buffer_gets, disk_reads, rows_processed, avg_cpu_ms, avg_elapsed_ms, parsing_schema, "
+        "metric_rank, metric_type, created_at"
+    )
+    conn.execute(f"""
+        INSERT INTO query_performance_snapshots_v6 ({columns})
+        SELECT {columns} FROM query_performance_snapshots
+    """)
+    conn.execute("DROP TABLE query_performance_snapshots")
+    conn.execute("ALTER TABLE query_performance_snapshots_v6 RENAME TO query_performance_snapshots")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_query_perf_db_time
+        ON query_performance_snapshots(db_name, snapshot_time DESC)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_query_perf_sql_id
+        ON query_performance_snapshots(sql_id)
+    """)
+    # Last cumulative V$SQL counters seen per child cursor, to diff against
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_counter_state (
+            db_name TEXT NOT NULL,
+            sql_id TEXT NOT NULL,
+            child_number INTEGER NOT NULL,
+            plan_hash_value INTEGER NOT NULL,
+            last_load_time TEXT,
+            observed_at TEXT NOT NULL,
+            executions INTEGER,
+            cpu_seconds REAL,
+            elapsed_seconds REAL,
+            buffer_gets INTEGER,
+            disk_reads INTEGER,
+            rows_processed INTEGER,
+            PRIMARY KEY (db_name, sql_id, child_number, plan_hash_value)
+        )
+    """)
+
+
+def _m7_structural_plan_digests(conn, storage):
+    # Plans used to be digested (and stored) with their runtime figures, so
+    # one plan became a new digest per execution. Re-key them on structure
+    # and move the figures of the old blobs onto the executions.
+    add_column(conn, "executions", "runtime_stats TEXT")
+    rekeyed = 0
+    for digest, plan_hash, codec, blob, first_seen in conn.execute(
+        "SELECT digest, plan_hash, codec, plan, first_seen FROM plans"
+    ).fetchall():
+        if codec != "zlib":
+            continue
+        plan, runtime = split_runtime(json.loads(zlib.decompress(blob)))
+        new_digest = plan_digest(plan)
+        if runtime:
+            conn.execute(
+                "UPDATE executions SET runtime_stats = ? WHERE plan_digest = ? AND runtime_stats IS NULL",
+                (json.dumps(runtime, sort_keys=True, separators=(",", ":"), default=str), digest),
+            )
+        if new_digest == digest:
+            continue
+        raw = json.dumps(plan, sort_keys=True, separators=(",", ":"), default=str).encode()
+        conn.execute(
+            "INSERT OR IGNORE INTO plans (digest, plan_hash, codec, raw_bytes, plan, first_seen) "
+            "VALUES (?, ?, 'zlib', ?, ?, ?)",
+            (new_digest, plan_hash, len(raw), zlib.compress(raw, 6), first_seen),
+        )
+        conn.execute("UPDATE executions SET plan_digest = ? WHERE plan_digest = ?", (new_digest, digest))
+        conn.execute("UPDATE baseline_plans SET plan_digest = ? WHERE plan_digest = ?", (new_digest, digest))
+        conn.execute("DELETE FROM plans WHERE digest = ?", (digest,))
+        rekeyed += 1
+    if rekeyed:
+        logger.info(f"🔑 Re-keyed {rekeyed} stored plan(s) on plan structure")
+
+
+def _m8_baseline_plans_by_digest(conn, storage):
+    # EXPLAIN plans carry no plan_hash_value, so keying on plan_hash folded
+    # every plan of a fingerprint into "unknown". Plans are now told apart by
+    # their structural digest; rows from before plans were stored keep a
+    # 'plan_hash:<hash>' key.
+    conn.execute("DROP TABLE IF EXISTS baseline_plans_v8")
+    conn.execute("""
+        CREATE TABLE baseline_plans_v8 (
+            fingerprint TEXT NOT NULL,
+            db_name TEXT NOT NULL,
+            plan_key TEXT NOT NULL,
+            plan_hash TEXT,
+            plan_digest TEXT,
+            executions INTEGER NOT NULL,
+            first_seen TEXT,
+            last_seen TEXT,
+            PRIMARY KEY (fingerprint, db_name, plan_key)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO baseline_plans_v8
+        SELECT fingerprint, db_name, COALESCE(plan_digest, 'plan_hash:' || plan_hash),
+               MAX(plan_hash), MAX(plan_digest), SUM(executions), MIN(first_seen), MAX(last_seen)
+        FROM baseline_plans
+        GROUP BY fingerprint, db_name, COALESCE(plan_digest, 'plan_hash:' || plan_hash)
+    """)
+    conn.execute("DROP TABLE baseline_plans")
+    conn.execute("ALTER TABLE baseline_plans_v8 RENAME TO baseline_plans")
+
+
+def _m9_rollup_sums(conn, storage):
+    # Coarse rollups are combined from the finer level (count/sum/min/max);
+    # their p95 is filled from raw rows once the bucket has closed
+    add_column(conn, "snapshot_rollups", "sum_value REAL")
+    conn.execute("UPDATE snapshot_rollups SET sum_value = avg_value * samples WHERE sum_value IS NULL")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_rollups_open
+        ON snapshot_rollups(source, db_name, resolution, bucket_start)
+        WHERE p95_value IS NULL
+    """)
+
+
+MIGRATIONS = [
+    (1, "query history executions", _m1_executions),
+    (2, "per-fingerprint baselines", _m2_baselines),
+    (3, "content-addressed plans", _m3_plans),
+    (4, "performance snapshots (moved from the CWD-relative database)", _m4_snapshots),
+    (5, "5m / 1h / 1d snapshot rollups", _m5_snapshot_rollups),
+    (6, "per-child query snapshots with interval deltas", _m6_query_deltas),
+    (7, "structural plan digests, runtime figures per execution", _m7_structural_plan_digests),
+    (8, "baseline plans keyed by plan digest", _m8_baseline_plans_by_digest),
+    (9, "incremental rollups (sum per bucket)", _m9_rollup_sums),
+]
+
+
+class Storage:
+    """
+    Owner of the SQLite file shared by history_tracker and SnapshotManager.
+
+    Each thread keeps one long-lived connection (WAL, busy_timeout), so there
+    is no connect() per call; migrate() brings the schema to the latest
+    version once per process instead of running DDL on every use. Nothing
+    touches the file at import: the server migrates at startup, and the
+    first connection of any other process migrates before it is used.
+    """
+
+    def __init__(self, db_path, busy_timeout_ms: int = 5000):
+        self.db_path = str(db_path)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.journal_mode = None
+        self._local = threading.local()
+        self._migrate_lock = threading.Lock()
+        self._migrated = False
+
+    def connect(self) -> sqlite3.Connection:
+        """This thread's persistent connection (opened on first use)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+            self.journal_mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            conn.execute("PRAGMA synchronous = NORMAL")  # durable at checkpoints; safe with WAL
+            self._local.conn = conn
+            if not self._migrated:
+                self.migrate()
+        return conn
+
+    def close_thread_connection(self):
+        """Close the calling thread's connection (worker threads on exit)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def schema_version(self) -> int:
+        """Latest applied migration (0 for a database never migrated)."""
+        try:
+            return self.connect().execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+        except sqlite3.OperationalError:  # no schema_version table yet
+            return 0
+
+    def migrate(self) -> int:
+        """Apply pending migrations in order (idempotent). Returns the schema version."""
+        conn = self.connect()  # a thread's first connect() lands back here, outside the lock
+        with self._migrate_lock:
+            current = self.schema_version()
+            if self._migrated and current >= MIGRATIONS[-1][0]:
+                return current
+            # Explicit BEGIN/COMMIT: the sqlite3 module's implicit transactions
+            # do not cover DDL, which would otherwise autocommit piecemeal
+            isolation_level, conn.isolation_level = conn.isolation_level, None
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT,
+                        applied_at TEXT NOT NULL
+                    )
+                """)
+                for version, description, migration in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        # Another process may have applied it while we waited for the lock
+                        if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                            conn.execute("COMMIT")
+                            current = version
+                            continue
+                        migration(conn, self)
+                        conn.execute(
+                            "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                            (version, description, datetime.now().isoformat()),
+                        )
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        conn.execute("ROLLBACK")
+                        raise
+                    logger.info(f"🗄️  Storage schema migrated to v{version}: {description}")
+                    current = version
+            finally:
+                conn.isolation_level = isolation_level
+            self._migrated = True
+            return current
+
+    def stats(self) -> dict:
+        path = Path(self.db_path)
+        return {
+            "db_path": self.db_path,
+            "journal_mode": self.journal_mode,
+            "schema_version": self.schema_version(),
+            "size_bytes": path.stat().st_size if path.exists() else 0,
+        }
+
+
+storage = Storage(
+    resolve_db_path(),
+    busy_timeout_ms=config.storage.get("busy_timeout_ms", 5000),
+)
@@ -0,0 +1,38 @@
+# server/tool_metrics.py
+# FastMCP middleware recording per-tool call counts, errors, latency and in-flight calls
+
+import time
+
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+
+from metrics import TOOL_CALLS, TOOL_ERRORS, TOOL_SECONDS, IN_FLIGHT
+
+
+def _returned_error(result) -> bool:
+    """Tools report failures as {"error": ...} dicts rather than raising."""
+    content = getattr(result, "structured_content", None)
+    if isinstance(content, dict) and isinstance(content.get("result"), dict):
+        content = content["result"]  # non-object return values are wrapped
+    return isinstance(content, dict) and bool(content.get("error"))
+
+
+class ToolMetricsMiddleware(Middleware):
+    """Feeds the metaquery_tool_* metrics for every tools/call request."""
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        tool = context.message.name
+        preset = (context.message.arguments or {}).get("db_name") or "none"
+        status = "exception"
+
+        IN_FLIGHT.inc((tool,))
+        started = time.perf_counter()
+        try:
+            result = await call_next(context)
+            status = "error" if _returned_error(result) else "ok"
+            return result
+        finally:
+            TOOL_SECONDS.observe((tool, preset), time.perf_counter() - started)
+            TOOL_CALLS.inc((tool, preset, status))
+            if status != "ok":
+                TOOL_ERRORS.inc((tool, preset))
+            IN_FLIGHT.dec((tool,))
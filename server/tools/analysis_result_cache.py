@@ -0,0 +1,163 @@
+# server/tools/analysis_result_cache.py
+# In-process TTL cache of complete analyze_* results with single-flight coalescing
+
+import copy
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from config import config
+from metrics import register_collector
+from sql_lexer import tokenize, rebuild
+
+
+def statement_fingerprint(sql_text: str, dialect: str = "oracle") -> str:
+    """
+    Hash of the statement with whitespace, comments and keyword case normalized.
+    Literals are kept: a different literal may produce a different plan.
+    """
+    text = rebuild(tokenize(sql_text or "", dialect), replace=lambda t: t.upper)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """One in-progress computation that identical requests wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of tool results keyed by (tool, preset, fingerprint, env, ...).
+
+    get_or_compute() runs compute() at most once per key at a time: concurrent
+    callers with the same key wait for the in-flight computation and share its
+    result. Only successful results (no "error" key) are stored.
+    """
+
+    def __init__(self, max_entries: int = 200, ttl_seconds: int = 120,
+                 wait_timeout_seconds: int = 300, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        """Fresh entry for key or None. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] > self.ttl_seconds:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_or_compute(self, key, compute):
+        """
+        Return (result, cache_info) for key, computing it when needed.
+
+        cache_info: {"hit": bool, "coalesced": bool, "age_seconds": float}
+        The returned result is a private copy; callers may modify it.
+        """
+        if not self.enabled:
+            return compute(), {"hit": False, "coalesced": False, "age_seconds": 0.0}
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                age = round(time.time() - entry["stored_at"], 1)
+                return copy.deepcopy(entry["result"]), {"hit": True, "coalesced": False, "age_seconds": age}
+
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout_seconds) and flight.result is not None:
+                shared = copy.deepcopy(flight.result)
+                return shared, {"hit": "error" not in shared, "coalesced": True, "age_seconds": 0.0}
+            # Leader too slow or failed hard - compute independently
+            return compute(), {"hit": False, "coalesced": False, "age_seconds": 0.0}
+
+        result = None
+        try:
+            result = compute()
+            return result, {"hit": False, "coalesced": False, "age_seconds": 0.0}
+        finally:
+            # Waiters and the cache get their own copy; the caller keeps `result`
+            shared = copy.deepcopy(result) if result is not None else None
+            with self._lock:
+                if shared is not None and "error" not in shared:
+                    self._entries[key] = {"result": shared, "stored_at": time.time()}
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+                del self._in_flight[key]
+            flight.result = shared
+            flight.done.set()
+
+    def clear(self, preset: str = None):
+        """Drop every entry, or only the entries of one preset."""
+        with self._lock:
+            if preset is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[1] == preset]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "in_flight": len(self._in_flight),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
+
+
+_settings = config.result_cache
+result_cache = ResultCache(
+    max_entries=_settings.get("max_entries", 200),
+    ttl_seconds=_settings.get("ttl_seconds", 120),
+    wait_timeout_seconds=_settings.get("wait_timeout_seconds", 300),
+    enabled=_settings.get("enabled", True),
+)
+
+
+@register_collector
+def _cache_metrics():
+    stats = result_cache.stats()
+    labels = {"cache": "analysis_result"}
+    return [
+        ("metaquery_cache_hits_total", "counter", "Cache hits", [(labels, stats["hits"])]),
+        ("metaquery_cache_misses_total", "counter", "Cache misses", [(labels, stats["misses"])]),
+        ("metaquery_cache_entries", "gauge", "Entries currently cached", [(labels, stats["entries"])]),
+        ("metaquery_cache_hit_ratio", "gauge", "Hits / lookups since start", [(labels, stats["hit_ratio"])]),
+    ]
@@ -25,7 +25,8 @@ from mcp_app import mcp
 from db_connector import oracle_connector
 from config import config
 from monitoring.oracle_monitor import OracleMonitor
-from monitoring.snapshot_manager import SnapshotManager
+from monitoring.snapshot_manager import SnapshotManager, RESOLUTION_SECONDS, choose_resolution
+from monitoring.downsample import downsample_points
 
 logger = logging.getLogger(__name__)
 
@@ -99,13 +100,40 @@ def _format_output(data: Dict, preset: str = None) -> Dict:
     return data
 
 
-def _generate_chart_data(history: List[Dict], metric: str) -> Dict:
+# Chart metric -> snapshot field
+_METRIC_FIELDS = {
+    'cpu_usage': 'cpu_usage_pct',
+    'active_sessions': 'active_sessions',
+    'buffer_cache_hit_ratio': 'buffer_cache_hit_ratio',
+    'cpu_seconds': 'cpu_seconds',
+    'elapsed_seconds': 'elapsed_seconds',
+    'avg_cpu_ms': 'avg_cpu_ms',
+    'interval_executions': 'delta_executions',
+    'interval_cpu_seconds': 'delta_cpu_seconds',
+    'interval_elapsed_seconds': 'delta_elapsed_seconds',
+    'interval_buffer_gets': 'delta_buffer_gets',
+    'interval_disk_reads': 'delta_disk_reads',
+}
+
+# get_top_queries metric -> per-interval field used by ranking='interval'
+_INTERVAL_FIELDS = {
+    'cpu': 'delta_cpu_seconds',
+    'elapsed': 'delta_elapsed_seconds',
+    'reads': 'delta_disk_reads',
+    'executions': 'delta_executions',
+    'buffer_gets': 'delta_buffer_gets',
+}
+
+
+def _generate_chart_data(history: List[Dict], metric: str, resolution: str = 'raw') -> Dict:
     """
     Generate JSON chart data for visualization
     
     Args:
         history: List of historical data points
         metric: Metric to chart
+        resolution: 'raw' or a rollup resolution; rollups chart the bucket
+                    average plus the bucket maximum so spikes stay visible
     
     Returns:
         Chart data in JSON format compatible with matplotlib/plotly/Chart.js
@@ -121,39 +149,32 @@ def _generate_chart_data(history: List[Dict], metric: str) -> Dict:
         }
     
     # Extract timestamps and values
-    timestamps = []
-    values = []
+    field = _METRIC_FIELDS.get(metric)
+    timestamps = [point.get('timestamp', '') for point in history]
+    values = [point.get(field) if field else None for point in history]
     
-    for point in history:
-        timestamps.append(point.get('timestamp', ''))
-        
-        # Map metric name to data field
-        if metric == 'cpu_usage':
-            values.append(point.get('cpu_usage_pct'))
-        elif metric == 'active_sessions':
-            values.append(point.get('active_sessions'))
-        elif metric == 'buffer_cache_hit_ratio':
-            values.append(point.get('buffer_cache_hit_ratio'))
-        elif metric == 'cpu_seconds':
-            values.append(point.get('cpu_seconds'))
-        elif metric == 'elapsed_seconds':
-            values.append(point.get('elapsed_seconds'))
-        elif metric == 'avg_cpu_ms':
-            values.append(point.get('avg_cpu_ms'))
-        else:
-            values.append(None)
+    label = metric.replace('_', ' ').title()
+    datasets = [{
+        'label': label if resolution == 'raw' else f'{label} (avg per {resolution})',
+        'data': values,
+        'borderColor': 'rgb(75, 192, 192)',
+        'backgroundColor': 'rgba(75, 192, 192, 0.2)',
+        'tension': 0.1
+    }]
+    if resolution != 'raw' and field:
+        datasets.append({
+            'label': f'{label} (max per {resolution})',
+            'data': [point.get(f'{field}_max') for point in history],
+            'borderColor': 'rgb(255, 99, 132)',
+            'backgroundColor': 'rgba(255, 99, 132, 0.2)',
+            'tension': 0.1
+        })
     
     return {
         'type': 'line',
         'data': {
             'labels': timestamps,
-            'datasets': [{
-                'label': metric.replace('_', ' ').title(),
-                'data': values,
-                'borderColor': 'rgb(75, 192, 192)',
-                'backgroundColor': 'rgba(75, 192, 192, 0.2)',
-                'tension': 0.1
-            }]
+            'datasets': datasets
         },
         'options': {
             'responsive': True,
@@ -221,14 +242,11 @@ def get_database_health(db_name: str, time_range_minutes: int = 15, save_snapsho
         return {"error": error_msg}
     
     try:
-        # Get database connection
-        conn = oracle_connector.connect(db_name)
-        
-        # Collect health metrics
-        monitor = OracleMonitor(conn)
-        health_data = monitor.get_system_health(time_range_minutes)
-        monitor.close()
-        conn.close()
+        # Borrow a pooled session for the collection only
+        with oracle_connector.connection(db_name) as conn:
+            monitor = OracleMonitor(conn)
+            health_data = monitor.get_system_health(time_range_minutes)
+            monitor.close()
         
         # Format output
         health_data = _format_output(health_data)
@@ -271,6 +289,10 @@ def get_database_health(db_name: str, time_range_minutes: int = 15, save_snapsho
         "• reads: Top queries by disk reads\n"
         "• executions: Most frequently executed queries\n"
         "• buffer_gets: Top queries by logical reads\n\n"
+        "⏱️ Ranking:\n"
+        "• cumulative (default): V$SQL totals since each cursor was loaded\n"
+        "• interval: activity since the previous collection for the same child cursor "
+        "(AWR-style deltas; reloaded/reset cursors count from zero). The first call only stores a baseline.\n\n"
         "🎯 Filtering Options:\n"
         "• exclude_sys: Exclude SYS/SYSTEM schemas (default: true)\n"
         "• schema_filter: Only show queries from specific schema (e.g., 'INFORM')\n"
@@ -297,7 +319,8 @@ def get_top_queries(
     save_snapshot: bool = True,
     exclude_sys: bool = True,
     schema_filter: str = None,
-    module_filter: str = None
+    module_filter: str = None,
+    ranking: str = 'cumulative'
 ):
     """
     Get top queries by specified metric
@@ -311,6 +334,8 @@ def get_top_queries(
         exclude_sys: Exclude SYS/SYSTEM schemas (default True)
         schema_filter: Only include specific schema (e.g., 'INFORM')
         module_filter: Only include specific module/application
+        ranking: 'cumulative' (V$SQL totals) or 'interval' (deltas since
+                 the previous collection)
     
     Returns:
         Dict with top queries and metrics
@@ -323,39 +348,59 @@ def get_top_queries(
     if module_filter:
         logger.info(f"   Module filter: {module_filter}")
     
+    if ranking not in ('cumulative', 'interval'):
+        return {"error": f"Invalid ranking '{ranking}'. Use: cumulative, interval"}
+    
     # Check if monitoring is enabled
     enabled, error_msg = _check_monitoring_enabled(db_name, 'allow_top_queries')
     if not enabled:
         return {"error": error_msg}
     
+    # Interval ranking diffs a wider candidate set: a cursor that is busy now
+    # may be far from the top by lifetime totals
+    fetch_limit = limit
+    if ranking == 'interval':
+        fetch_limit = max(limit, monitoring_config.get('interval_candidates', 200))
+    
     try:
-        # Get database connection
-        conn = oracle_connector.connect(db_name)
+        snapshot_mgr = SnapshotManager()
+        
+        # Borrow a pooled session for the collection only
+        with oracle_connector.connection(db_name) as conn:
+            monitor = OracleMonitor(conn)
+            query_data = monitor.get_top_queries_realtime(
+                metric, 
+                time_range_minutes, 
+                fetch_limit,
+                exclude_sys,
+                schema_filter,
+                module_filter
+            )
+            monitor.close()
         
-        # Collect top queries
-        monitor = OracleMonitor(conn)
-        query_data = monitor.get_top_queries_realtime(
-            metric, 
-            time_range_minutes, 
-            limit,
-            exclude_sys,
-            schema_filter,
-            module_filter
-        )
-        monitor.close()
-        conn.close()
+        if ranking == 'interval' and 'error' not in query_data:
+            snapshot_mgr.apply_deltas(db_name, query_data['queries'], query_data.get('db_time'))
+            candidates = query_data['queries']
+            field = _INTERVAL_FIELDS[metric]
+            active = sorted((q for q in candidates if q.get(field)), key=lambda q: q[field], reverse=True)
+            query_data['ranking'] = 'interval'
+            query_data['candidates_checked'] = len(candidates)
+            query_data['queries'] = active[:limit]
+            query_data['queries_found'] = len(query_data['queries'])
+            if candidates and all(q['delta_status'] == 'baseline' for q in candidates):
+                query_data['interval_note'] = 'First collection for these cursors - baseline stored, call again to rank by interval activity'
         
         # Format output
         query_data = _format_output(query_data)
         
         # Save snapshot if requested
         if save_snapshot and 'error' not in query_data and query_data.get('queries'):
-            snapshot_mgr = SnapshotManager()
             snapshot_mgr.save_query_snapshots(
                 db_name,
                 datetime.now(),
                 query_data['queries'],
-                metric
+                metric,
+                query_data.get('db_time')
             )
             query_data['snapshot_saved'] = True
         
@@ -392,7 +437,14 @@ def get_top_queries(
         "Query Performance:\n"
         "• cpu_seconds: Query CPU consumption trends\n"
         "• elapsed_seconds: Query elapsed time trends\n"
-        "• avg_cpu_ms: Average query CPU trends\n\n"
+        "• avg_cpu_ms: Average query CPU trends\n"
+        "• interval_cpu_seconds / interval_elapsed_seconds / interval_executions / interval_buffer_gets / "
+        "interval_disk_reads: activity between snapshots (deltas of the cumulative V$SQL counters)\n\n"
+        "🕒 Resolution:\n"
+        "resolution='auto' (default) uses the coarsest stored resolution that still gives enough points "
+        "for the window (raw → 5m → 1h → 1d rollups with min/avg/max/p95); or pass 'raw', '5m', '1h', '1d'.\n"
+        "max_points caps the points returned (default from settings, 0 = all); longer series are "
+        "downsampled with LTTB, which keeps spikes instead of averaging them away.\n\n"
         "📉 Chart Format:\n"
         "Returns JSON in Chart.js format with labels, datasets, and configuration.\n"
         "Can be visualized with matplotlib, plotly, or any charting library.\n\n"
@@ -409,7 +461,9 @@ def get_performance_trends(
     db_name: str,
     hours: int = 24,
     metric: str = 'cpu_usage',
-    sql_id: Optional[str] = None
+    sql_id: Optional[str] = None,
+    resolution: str = 'auto',
+    max_points: Optional[int] = None
 ):
     """
     Get historical performance trends with chart data
@@ -419,11 +473,19 @@ def get_performance_trends(
         hours: Hours of history to retrieve
         metric: Metric to chart
         sql_id: Optional SQL ID for query-specific trends
+        resolution: 'auto', 'raw', '5m', '1h' or '1d'
+        max_points: Cap on returned points (LTTB downsampling); None uses
+                    trend_max_points from settings, 0 returns every point
     
     Returns:
         Dict with historical data and JSON chart
     """
-    logger.info(f"get_performance_trends called for {db_name}, metric={metric}, hours={hours}")
+    logger.info(f"get_performance_trends called for {db_name}, metric={metric}, hours={hours}, resolution={resolution}")
+    
+    if resolution == 'auto':
+        resolution = choose_resolution(hours)
+    elif resolution != 'raw' and resolution not in RESOLUTION_SECONDS:
+        return {"error": f"Unknown resolution '{resolution}'. Use auto, raw, {', '.join(RESOLUTION_SECONDS)}"}
     
     # Check if monitoring is enabled (use system_stats for health metrics)
     feature = 'allow_system_stats' if metric in ['cpu_usage', 'active_sessions', 'buffer_cache_hit_ratio'] else 'allow_top_queries'
@@ -437,25 +499,46 @@ def get_performance_trends(
         # Determine if system health or query trend
         if metric in ['cpu_usage', 'active_sessions', 'buffer_cache_hit_ratio']:
             # System health trend
-            history = snapshot_mgr.get_health_history(db_name, hours)
+            if resolution == 'raw':
+                history = snapshot_mgr.get_health_history(db_name, hours)
+            else:
+                history = snapshot_mgr.get_rollups('health', db_name, resolution, hours)
             trend_type = 'system_health'
         else:
             # Query performance trend
-            history = snapshot_mgr.get_query_trends(db_name, sql_id, hours)
+            if resolution == 'raw':
+                history = snapshot_mgr.get_query_trends(db_name, sql_id, hours)
+            else:
+                history = snapshot_mgr.get_rollups('query', db_name, resolution, hours, sql_id)
             trend_type = 'query_performance'
         
+        # Downsample history and chart together; on rollups select by the bucket
+        # maximum so the spikes the max dataset shows are the ones kept
+        if max_points is None:
+            max_points = monitoring_config.get('trend_max_points', 500)
+        source_points = len(history)
+        field = _METRIC_FIELDS.get(metric)
+        if field:
+            history = downsample_points(
+                history, field if resolution == 'raw' else f'{field}_max', max_points,
+                series_key='sql_id' if trend_type == 'query_performance' else None,
+            )
+        
         # Generate chart data
         chart_format = monitoring_config.get('chart_format', 'json')
         chart_data = None
         
         if chart_format in ['json', 'both']:
-            chart_data = _generate_chart_data(history, metric)
+            chart_data = _generate_chart_data(history, metric, resolution)
         
         result = {
             'database': db_name,
             'metric': metric,
             'hours': hours,
             'data_points': len(history),
+            'source_points': source_points,
+            'downsampled': len(history) < source_points,
+            'resolution': resolution,
             'trend_type': trend_type,
             'history': history,
             'tool': 'get_performance_trends',
@@ -7,10 +7,65 @@ import logging
 import traceback
 from mcp_app import mcp
 import mysql_connector
+from metrics import PhaseTimer, phase
 
 logger = logging.getLogger(__name__)
 
 
+def _add_history(result: dict, sql_text: str, db_name: str) -> dict:
+    """
+    Shared post-collector path: historical context and history store.
+    Used by analyze_mysql_query and analyze_mysql_queries_batch.
+    """
+    from history_tracker import normalize_and_hash, store_history, get_recent_history, get_baseline, compare_with_history
+
+    # Check historical executions
+    fingerprint = normalize_and_hash(sql_text)
+    with phase("history_read"):
+        history = get_recent_history(fingerprint, db_name)
+        baseline = get_baseline(fingerprint, db_name)
+
+    facts = result.get("facts", {})
+    plan_details = facts.get("plan_details", [])
+    
+    logger.info(f"📋 Collector returned {len(plan_details)} plan steps")
+    
+    # Add historical context
+    if history or baseline:
+        with phase("history_compare"):
+            facts["historical_context"] = compare_with_history(history, facts, baseline)
+        runs = baseline["executions"] if baseline else len(history)
+        facts["history_count"] = runs
+        if baseline:
+            facts["baseline"] = baseline
+        logger.info(f"📊 Historical context: {facts['historical_context'].get('message', 'N/A')}")
+        
+        # Update the prompt field to emphasize historical context
+        result["prompt"] = (
+            f"🕒 IMPORTANT: This query pattern has been executed {runs} time(s) before. "
+            f"START your response with the historical context section using facts['historical_context']. "
+            f"{result.get('prompt', '')}"
+        )
+    else:
+        facts["historical_context"] = {"status": "new_query", "message": "First execution - establishing baseline"}
+        result["prompt"] = f"🆕 This is the first execution of this query pattern. {result.get('prompt', '')}"
+    
+    # Store current execution in history
+    if plan_details:
+        # MySQL doesn't have plan_hash, use first step's cost
+        plan_hash = "mysql_plan"
+        cost = plan_details[0].get("cost", 0) if plan_details else 0
+        table_stats = {t["table_name"]: t["num_rows"] for t in facts.get("table_stats", [])}
+        plan_operations = [
+            f"{s.get('access_type', '')} {s.get('table', '')}".strip()
+            for s in plan_details[:5]
+        ]
+        with phase("history_write"):
+            store_history(fingerprint, db_name, plan_hash, cost, table_stats, plan_operations, plan_details)
+
+    return result
+
+
 @mcp.tool(
     name="analyze_mysql_query",
     description=(
@@ -30,16 +85,20 @@ logger = logging.getLogger(__name__)
         "❌ INTO OUTFILE/DUMPFILE (data exfiltration)\n"
         "❌ Table locking: LOCK, UNLOCK\n\n"
         "📊 Returns: Execution plan (EXPLAIN FORMAT=JSON), table statistics, index recommendations, usage patterns.\n\n"
+        "♻️ Identical calls within a short TTL (and concurrent duplicates) are answered from one analysis; "
+        "'result_cache' in the response says whether it was served from cache and its age_seconds. "
+        "Set bypass_cache=true to force a fresh analysis.\n\n"
         "⚡ Usage: Provide MySQL database name and SELECT query to analyze."
     ),
 )
-def analyze_mysql_query(db_name: str, sql_text: str):
+def analyze_mysql_query(db_name: str, sql_text: str, bypass_cache: bool = False):
     """
     Analyze a MySQL SELECT query for performance issues.
     
     Args:
         db_name: Name of MySQL database from settings.yaml
         sql_text: SELECT query to analyze
+        bypass_cache: Skip the result cache and always run a fresh analysis
     
     Returns:
         Dict with execution plan, table stats, indexes, and historical context
@@ -51,6 +110,7 @@ def analyze_mysql_query(db_name: str, sql_text: str):
     logger.info(f"   💬 SQL Preview: {sql_text[:100]}")
     logger.info("="*70)
     
+    timer = PhaseTimer("mysql").start()
     try:
         conn = mysql_connector.connect(db_name)
         cur = conn.cursor()
@@ -62,7 +122,8 @@ def analyze_mysql_query(db_name: str, sql_text: str):
         
         # Validate SQL for safety
         logger.info("🔍 Validating SQL query (safety + syntax)...")
-        is_valid, error_msg, is_dangerous = validate_sql(cur, sql_text)
+        with phase("validate"):
+            is_valid, error_msg, is_dangerous = validate_sql(cur, sql_text)
         
         if is_dangerous:
             logger.error(f"🚨 DANGEROUS SQL BLOCKED: {error_msg}")
@@ -96,50 +157,29 @@ def analyze_mysql_query(db_name: str, sql_text: str):
         
         logger.info("✅ SQL query is valid and safe")
 
-        # Check historical executions
-        from history_tracker import normalize_and_hash, store_history, get_recent_history, compare_with_history
-        
-        fingerprint = normalize_and_hash(sql_text)
-        history = get_recent_history(fingerprint, db_name)
+        from tools.analysis_result_cache import result_cache, statement_fingerprint
+        from tools.mysql_collector_impl import get_optimizer_env_signature
 
-        # Call collector
-        result = run_collector(cur, sql_text)
-        
-        facts = result.get("facts", {})
-        plan_details = facts.get("plan_details", [])
-        
-        logger.info(f"📋 Collector returned {len(plan_details)} plan steps")
-        
-        # Add historical context
-        if history:
-            facts["historical_context"] = compare_with_history(history, facts)
-            facts["history_count"] = len(history)
-            logger.info(f"📊 Historical context: {facts['historical_context'].get('message', 'N/A')}")
-            
-            # Update the prompt field to emphasize historical context
-            result["prompt"] = (
-                f"🕒 IMPORTANT: This query pattern has been executed {len(history)} time(s) before. "
-                f"START your response with the historical context section using facts['historical_context']. "
-                f"{result.get('prompt', '')}"
-            )
+        def collect():
+            return _add_history(run_collector(cur, sql_text), sql_text, db_name)
+
+        if bypass_cache:
+            result = collect()
         else:
-            facts["historical_context"] = {"status": "new_query", "message": "First execution - establishing baseline"}
-            result["prompt"] = f"🆕 This is the first execution of this query pattern. {result.get('prompt', '')}"
-        
-        # Store current execution in history
-        if plan_details:
-            # MySQL doesn't have plan_hash, use first step's cost
-            plan_hash = "mysql_plan"
-            cost = plan_details[0].get("cost", 0) if plan_details else 0
-            table_stats = {t["table_name"]: t["num_rows"] for t in facts.get("table_stats", [])}
-            plan_operations = [
-                f"{s.get('access_type', '')} {s.get('table', '')}".strip()
-                for s in plan_details[:5]
-            ]
-            store_history(fingerprint, db_name, plan_hash, cost, table_stats, plan_operations)
+            # Same preset + statement + server settings -> one shared analysis
+            key = (
+                "analyze_mysql_query", db_name, statement_fingerprint(sql_text, "mysql"),
+                get_optimizer_env_signature(cur)
+            )
+            result, cache_info = result_cache.get_or_compute(key, collect)
+            result["result_cache"] = cache_info
+            if cache_info["hit"]:
+                logger.info(f"♻️  Served from result cache (age {cache_info['age_seconds']}s, "
+                            f"coalesced={cache_info['coalesced']})")
 
+        plan_details = result.get("facts", {}).get("plan_details", [])
         logger.info(f"✅ Analysis complete with {len(plan_details)} plan steps")
-        return result
+        return timer.attach(result)
 
     except Exception as e:
         logger.exception("❌ Exception during MySQL analysis")
@@ -150,6 +190,105 @@ def analyze_mysql_query(db_name: str, sql_text: str):
             "prompt": ""
         }
     finally:
+        timer.stop()
+        try:
+            if 'conn' in locals():
+                conn.close()
+        except:
+            pass
+
+
+@mcp.tool(
+    name="analyze_mysql_queries_batch",
+    description=(
+        "🔍 [MYSQL ONLY] Analyzes a whole workload of MySQL SELECT queries in one call.\n\n"
+        "Statements are deduplicated by fingerprint (literals ignored), each unique statement is "
+        "explained once, and table/index metadata is collected ONCE for the union of all referenced "
+        "tables on a single connection.\n\n"
+        "⚠️ Same SECURITY RESTRICTIONS as analyze_mysql_query: unsafe statements are rejected "
+        "individually and reported with an error, the rest of the batch is still analysed.\n\n"
+        "📥 Inputs: db_name, sql_list (list of SELECT statements).\n\n"
+        "📊 Returns: 'statements' (per unique statement: fingerprint, occurrences, input_indexes, "
+        "facts or error) and 'workload_summary' (most expensive plans ranked by cost x occurrences)."
+    ),
+)
+def analyze_mysql_queries_batch(db_name: str, sql_list: list[str]):
+    """
+    Analyze a MySQL workload: one connection, one EXPLAIN per unique statement,
+    one metadata pass for all referenced tables.
+    
+    Args:
+        db_name: Name of MySQL database from settings.yaml
+        sql_list: SELECT queries to analyze (duplicates are grouped)
+    
+    Returns:
+        Dict with per-statement results and a workload summary
+    """
+    from config import config
+    from tools.workload_summary import group_by_fingerprint, summarize_workload
+    
+    logger.info(f"🔍 analyze_mysql_queries_batch(db={db_name}, statements={len(sql_list or [])}) called")
+    
+    groups = group_by_fingerprint(sql_list or [])
+    if not groups:
+        return {"error": "sql_list is empty", "statements": [], "workload_summary": {}, "prompt": ""}
+    
+    max_statements = config.batch_analysis.get("max_statements", 50)
+    if len(groups) > max_statements:
+        return {
+            "error": f"Too many unique statements: {len(groups)} (limit {max_statements}). Split the workload.",
+            "statements": [],
+            "workload_summary": {},
+            "prompt": ""
+        }
+    
+    timer = PhaseTimer("mysql").start()
+    try:
+        conn = mysql_connector.connect(db_name)
+        cur = conn.cursor()
+        
+        from tools.mysql_collector_impl import run_batch_collector
+        
+        unique = list(groups.items())
+        results = run_batch_collector(cur, [g["sql"] for _, g in unique])
+        
+        statements = []
+        for (fingerprint, group), result in zip(unique, results):
+            if not result.get("error"):
+                _add_history(result, group["sql"], db_name)
+            statements.append({
+                "fingerprint": fingerprint,
+                "occurrences": len(group["input_indexes"]),
+                "input_indexes": group["input_indexes"],
+                "sql_text": group["sql"],
+                **result
+            })
+            logger.info(f"   📄 [{len(statements)}/{len(unique)}] "
+                        f"{'❌ ' + result['error'] if result.get('error') else '✅ analysed'}")
+        
+        summary = summarize_workload(statements, config.batch_analysis.get("top_n", 10))
+        logger.info(f"✅ Batch complete: {summary['analysed']} analysed, {summary['failed']} failed")
+        return timer.attach({
+            "statements": statements,
+            "workload_summary": summary,
+            "prompt": (
+                f"MySQL workload analysis: {summary['unique_statements']} unique statement(s) from "
+                f"{summary['statements_submitted']} submitted. START with workload_summary['most_expensive'] "
+                f"(ranked by cost x occurrences), then give per-statement recommendations."
+            )
+        })
+    
+    except Exception as e:
+        logger.exception("❌ Exception during MySQL batch analysis")
+        return {
+            "error": f"Internal error: {e}",
+            "trace": traceback.format_exc(),
+            "statements": [],
+            "workload_summary": {},
+            "prompt": ""
+        }
+    finally:
+        timer.stop()
         try:
             if 'conn' in locals():
                 conn.close()
@@ -4,8 +4,11 @@ Simplified version focusing on: EXPLAIN, table stats, and indexes
 """
 
 import json
+import hashlib
 import logging
-import re
+
+from metrics import phase
+from sql_lexer import tokenize, identifier, is_name, words, first_word, max_paren_depth, WORD, PUNCT
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +26,10 @@ def validate_sql(cursor, sql: str) -> tuple[bool, str, bool]:
     - Only allow SELECT queries
     """
     try:
-        clean = sql.strip().upper()
-        if clean.endswith(";"):
-            clean = clean[:-1]
+        # Keywords are checked on the shared token stream, so comments (incl. #),
+        # string literals and `quoted` identifiers can't trip (or hide) them
+        tokens = tokenize(sql, "mysql")
+        present = words(tokens)
         
         # SECURITY CHECK 1: Block dangerous operations
         dangerous_keywords = [
@@ -39,37 +43,30 @@ def validate_sql(cursor, sql: str) -> tuple[bool, str, bool]:
             'LOCK', 'UNLOCK',  # Table locking
         ]
         
-        # Check first word after WITH/comment removal
-        first_word = clean.split()[0] if clean.split() else ''
+        # Check first word (comments are not tokens)
+        first = first_word(tokens)
         
         # Allow WITH clause (for CTEs)
-        if first_word == 'WITH':
+        if first == 'WITH':
             # Find the main query after CTE - must contain SELECT
-            if 'SELECT' not in clean:
+            if 'SELECT' not in present:
                 return False, "No SELECT found in query with WITH clause", True
-        elif first_word != 'SELECT':
-            return False, f"Only SELECT queries are allowed. Found: {first_word}", True
+        elif first != 'SELECT':
+            return False, f"Only SELECT queries are allowed. Found: {first}", True
         
         # Check for dangerous keywords anywhere in the query
+        # (whole words only - e.g. an "UPDATE_DATE" column is OK)
         for keyword in dangerous_keywords:
-            # Use word boundaries to avoid false positives (e.g., "UPDATE_DATE" column)
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, clean):
+            if keyword in present:
                 return False, f"DANGEROUS OPERATION BLOCKED: {keyword} statements are not allowed", True
         
         # SECURITY CHECK 2: Block INTO OUTFILE/DUMPFILE (data exfiltration)
-        if re.search(r'\bINTO\s+(OUTFILE|DUMPFILE)\b', clean):
-            return False, "DANGEROUS OPERATION BLOCKED: INTO OUTFILE/DUMPFILE not allowed", True
+        for prev, tok in zip(tokens, tokens[1:]):
+            if prev.kind == WORD and prev.upper == 'INTO' and tok.kind == WORD and tok.upper in ('OUTFILE', 'DUMPFILE'):
+                return False, "DANGEROUS OPERATION BLOCKED: INTO OUTFILE/DUMPFILE not allowed", True
         
         # SECURITY CHECK 3: Limit subquery depth to prevent DoS
-        paren_depth = 0
-        max_depth = 0
-        for char in clean:
-            if char == '(':
-                paren_depth += 1
-                max_depth = max(max_depth, paren_depth)
-            elif char == ')':
-                paren_depth -= 1
+        max_depth = max_paren_depth(tokens)
         
         if max_depth > 10:
             return False, f"Query too complex: {max_depth} nested subqueries (max 10)", False
@@ -99,7 +96,8 @@ def run_explain(cursor, sql: str) -> dict:
         plan_json = json.loads(result)
         
         logger.info(f"[MYSQL-COLLECTOR] ✓ EXPLAIN returned JSON plan")
-        logger.debug(f"[MYSQL-COLLECTOR] Plan JSON structure: {json.dumps(plan_json, indent=2)[:500]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[MYSQL-COLLECTOR] Plan JSON structure: %s", json.dumps(plan_json, indent=2)[:500])
         return plan_json
         
     except Exception as e:
@@ -159,8 +157,9 @@ def extract_plan_details(plan_json: dict) -> list:
     query_block = plan_json.get("query_block", {})
     
     # DEBUG: Log the actual structure
-    logger.debug(f"[MYSQL-COLLECTOR] query_block keys: {list(query_block.keys())}")
-    logger.debug(f"[MYSQL-COLLECTOR] Full plan JSON: {json.dumps(plan_json, indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[MYSQL-COLLECTOR] query_block keys: %s", list(query_block.keys()))
+        logger.debug("[MYSQL-COLLECTOR] Full plan JSON: %s", json.dumps(plan_json, indent=2))
     
     # Handle nested_loop at root
     if "nested_loop" in query_block:
@@ -487,23 +486,112 @@ def extract_tables_from_sql(sql: str) -> list:
     """
     tables = set()
     
-    # Pattern: FROM [schema.]table_name or JOIN [schema.]table_name
-    # Captures the table name, ignoring optional schema prefix and aliases
-    patterns = [
-        r'\bFROM\s+(?:[a-zA-Z0-9_]+\.)?([a-zA-Z0-9_]+)',  # FROM [schema.]table
-        r'\bJOIN\s+(?:[a-zA-Z0-9_]+\.)?([a-zA-Z0-9_]+)',  # JOIN [schema.]table
-    ]
-    
-    sql_upper = sql.upper()
-    for pattern in patterns:
-        matches = re.findall(pattern, sql_upper)
-        tables.update(matches)
+    # FROM [schema.]table_name or JOIN [schema.]table_name on the shared
+    # token stream: the table name, ignoring optional schema prefix and aliases
+    tokens = tokenize(sql, "mysql")
+    for i, tok in enumerate(tokens[:-1]):
+        if tok.kind != WORD or tok.upper not in ('FROM', 'JOIN') or not is_name(tokens[i + 1]):
+            continue
+        name = tokens[i + 1]
+        if (i + 3 < len(tokens) and tokens[i + 2].kind == PUNCT and tokens[i + 2].value == "."
+                and is_name(tokens[i + 3])):
+            name = tokens[i + 3]
+        tables.add(identifier(name).upper())
     
-    logger.debug(f"[MYSQL-COLLECTOR] extract_tables_from_sql: {list(tables)}")
+    logger.debug("[MYSQL-COLLECTOR] extract_tables_from_sql: %s", tables)
     
     return list(tables)
 
 
+TABLE_SECTIONS = ("table_stats", "index_stats", "index_usage", "duplicate_indexes")
+
+
+def collect_table_metadata(cursor, tables: list) -> dict:
+    """
+    Per-table metadata sections for `tables` (table names as in extract_tables_from_sql).
+    
+    Returns:
+        Dict with table_stats, index_stats, index_usage and duplicate_indexes lists
+    """
+    if not tables:
+        return {name: [] for name in TABLE_SECTIONS}
+    
+    queries = {
+        "table_stats": get_table_stats,
+        "index_stats": get_index_stats,
+        "index_usage": get_index_usage_stats,  # From performance_schema
+        "duplicate_indexes": get_duplicate_indexes,
+    }
+    sections = {}
+    for name, fn in queries.items():
+        with phase(f"metadata.{name}"):
+            sections[name] = fn(cursor, tables)
+    return sections
+
+
+def run_batch_collector(cursor, statements: list) -> list:
+    """
+    Analyse several statements on one connection with a single metadata pass.
+    
+    Every statement is validated and explained; table/index metadata is then
+    collected once for the union of referenced tables and split per statement.
+    
+    Returns:
+        List of results in input order - same shape as run_collector(),
+        or {"error", ...} for statements that failed validation or EXPLAIN
+    """
+    logger.info(f"[MYSQL-COLLECTOR] ===== START BATCH ANALYSIS ({len(statements)} statements) =====")
+    
+    results = [None] * len(statements)
+    explained = []  # (index, sql, plan_json, plan_details, tables)
+    
+    for i, sql in enumerate(statements):
+        with phase("validate"):
+            is_valid, error_msg, is_dangerous = validate_sql(cursor, sql)
+        if not is_valid:
+            prefix = "SECURITY BLOCK" if is_dangerous else "Invalid SQL query"
+            results[i] = {"error": f"{prefix}: {error_msg}", "facts": {}, "prompt": ""}
+            continue
+        try:
+            with phase("explain"):
+                plan_json = run_explain(cursor, sql)
+        except Exception as e:
+            results[i] = {"error": f"EXPLAIN failed: {e}", "facts": {}, "prompt": ""}
+            continue
+        explained.append((i, sql, plan_json, extract_plan_details(plan_json), extract_tables_from_sql(sql)))
+    
+    all_tables = sorted({t for e in explained for t in e[4]})
+    logger.info(f"[MYSQL-COLLECTOR] Batch metadata for {len(all_tables)} table(s)")
+    shared = collect_table_metadata(cursor, all_tables)
+    
+    for i, sql, plan_json, plan_details, tables in explained:
+        wanted = set(tables)
+        facts = {"plan_json": plan_json, "plan_details": plan_details}
+        for name in TABLE_SECTIONS:
+            facts[name] = [row for row in shared[name] if (row.get("table_name") or "").upper() in wanted]
+        results[i] = {
+            "facts": facts,
+            "prompt": f"MySQL analysis ready. SQL length={len(sql)}, tables={len(tables)}, plan_steps={len(plan_details)}"
+        }
+    
+    logger.info("[MYSQL-COLLECTOR] ===== BATCH ANALYSIS COMPLETE =====")
+    return results
+
+
+def get_optimizer_env_signature(cursor) -> str:
+    """
+    Signature of the server-side settings that shape a plan: server version,
+    optimizer_switch and the default database (unqualified table names).
+    """
+    try:
+        cursor.execute("SELECT VERSION(), @@optimizer_switch, DATABASE()")
+        version, switches, database = cursor.fetchone()
+        return f"{version}:{database}:{hashlib.sha256((switches or '').encode()).hexdigest()[:16]}"
+    except Exception as e:
+        logger.warning(f"[MYSQL-COLLECTOR] optimizer env signature unavailable: {e}")
+        return "unknown"
+
+
 def run_collector(cursor, sql: str) -> dict:
     """
     Main collector function - orchestrates all data collection.
@@ -520,7 +608,8 @@ def run_collector(cursor, sql: str) -> dict:
     facts = {}
     
     # 1. Run EXPLAIN
-    plan_json = run_explain(cursor, sql)
+    with phase("explain"):
+        plan_json = run_explain(cursor, sql)
     facts["plan_json"] = plan_json
     
     # 2. Extract plan details
@@ -531,27 +620,8 @@ def run_collector(cursor, sql: str) -> dict:
     tables = extract_tables_from_sql(sql)
     logger.info(f"[MYSQL-COLLECTOR] Tables found: {tables}")
     
-    # 4. Get table statistics
-    if tables:
-        table_stats = get_table_stats(cursor, tables)
-        facts["table_stats"] = table_stats
-        
-        # 5. Get index statistics
-        index_stats = get_index_stats(cursor, tables)
-        facts["index_stats"] = index_stats
-        
-        # 6. Get index usage statistics (from performance_schema)
-        index_usage = get_index_usage_stats(cursor, tables)
-        facts["index_usage"] = index_usage
-        
-        # 7. Detect duplicate indexes
-        duplicate_indexes = get_duplicate_indexes(cursor, tables)
-        facts["duplicate_indexes"] = duplicate_indexes
-    else:
-        facts["table_stats"] = []
-        facts["index_stats"] = []
-        facts["index_usage"] = []
-        facts["duplicate_indexes"] = []
+    # 4-7. Table stats, index stats, index usage, duplicate indexes
+    facts.update(collect_table_metadata(cursor, tables))
     
     logger.info("[MYSQL-COLLECTOR] ===== ANALYSIS COMPLETE =====")
     
@@ -6,8 +6,14 @@ import json
 from mcp_app import mcp
 from db_connector import oracle_connector
 from tools.oracle_collector_impl import run_full_oracle_analysis as run_collector
+from tools.oracle_collector_impl import run_cursor_plan_analysis as run_cursor_collector
+from tools.oracle_collector_impl import run_batch_oracle_analysis as run_batch_collector
+from tools.oracle_collector_impl import get_optimizer_env_signature
+from tools.analysis_result_cache import result_cache, statement_fingerprint
+from tools.workload_summary import group_by_fingerprint, summarize_workload
 from tools.plan_visualizer import build_visual_plan, get_plan_summary
-from history_tracker import normalize_and_hash, store_history, get_recent_history, compare_with_history
+from history_tracker import normalize_and_hash, store_history, get_recent_history, get_baseline, compare_with_history
+from metrics import PhaseTimer, phase
 from config import config
 
 
@@ -16,6 +22,86 @@ logger = logging.getLogger("oracle_analysis")
 log_level = getattr(logging, config.log_level, logging.INFO)
 logger.setLevel(log_level)
 
+
+def _invalid_sql_response(error_msg: str) -> dict:
+    """Tool response for SQL that failed the (single) EXPLAIN PLAN parse."""
+    logger.error(f"❌ SQL VALIDATION FAILED: {error_msg}")
+    logger.error("   Cannot analyze invalid SQL - returning error to user")
+    return {
+        "error": f"Invalid SQL query: {error_msg}",
+        "facts": {},
+        "prompt": (
+            f"The SQL query is INVALID and cannot be analyzed.\n\n"
+            f"Error: {error_msg}\n\n"
+            f"Suggestions:\n"
+            f"1. Check that all table and column names are spelled correctly\n"
+            f"2. Verify table aliases match the table names\n"
+            f"3. Ensure all referenced columns exist in the tables\n"
+            f"4. Test the query in SQL*Plus or another SQL client first\n\n"
+            f"You can use this query to find correct column names:\n"
+            f"SELECT column_name FROM all_tab_columns WHERE owner='SCHEMA' AND table_name='TABLE';"
+        )
+    }
+
+def _add_plan_and_history(result: dict, sql_text: str, db_name: str) -> dict:
+    """
+    Shared post-collector path: visual plan, historical context, history store.
+    Used by analyze_oracle_query and analyze_oracle_sql_id.
+    """
+    fingerprint = normalize_and_hash(sql_text)
+    with phase("history_read"):
+        history = get_recent_history(fingerprint, db_name)
+        baseline = get_baseline(fingerprint, db_name)
+
+    facts = result.get("facts", {})
+    plan_details = facts.get("plan_details", [])
+    
+    logger.info(f"📋 Collector returned {len(plan_details)} plan steps")
+    if not plan_details:
+        logger.warning("⚠️  Plan has no steps - check if query is valid")
+
+    # Add visual plan
+    if plan_details:
+        with phase("visualization"):
+            facts["visual_plan"] = build_visual_plan(plan_details)
+            facts["plan_summary"] = get_plan_summary(plan_details)
+    
+    # Add historical context
+    if history or baseline:
+        with phase("history_compare"):
+            facts["historical_context"] = compare_with_history(history, facts, baseline)
+        runs = baseline["executions"] if baseline else len(history)
+        facts["history_count"] = runs  # Add count for LLM
+        if baseline:
+            facts["baseline"] = baseline
+        logger.info(f"📊 Historical context: {facts['historical_context'].get('message', 'N/A')}")
+        
+        # Update the prompt field to emphasize historical context
+        result["prompt"] = (
+            f"🕒 IMPORTANT: This query pattern has been executed {runs} time(s) before. "
+            f"START your response with the historical context section using facts['historical_context']. "
+            f"{result.get('prompt', '')}"
+        )
+    else:
+        facts["historical_context"] = {"status": "new_query", "message": "First execution - establishing baseline"}
+        result["prompt"] = f"🆕 This is the first execution of this query pattern. {result.get('prompt', '')}"
+    
+    
+    # Store current execution in history
+    if plan_details:
+        plan_hash = plan_details[0].get("plan_hash_value", "unknown")
+        cost = plan_details[0].get("cost", 0)
+        table_stats = {t["table_name"]: t["num_rows"] for t in facts.get("table_stats", [])}
+        plan_operations = [
+            f"{s.get('operation', '')} {s.get('options', '')}".strip()
+            for s in plan_details[:5]  # Top 5 operations
+        ]
+        with phase("history_write"):
+            store_history(fingerprint, db_name, plan_hash, cost, table_stats, plan_operations, plan_details)
+
+    return result
+
+
 @mcp.tool(
     name="analyze_oracle_query",
     description=(
@@ -34,10 +120,14 @@ logger.setLevel(log_level)
         "❌ PL/SQL blocks: BEGIN, DECLARE\n"
         "❌ SELECT INTO (data insertion)\n\n"
         "📊 Returns: Execution plan, table/index stats, performance recommendations.\n\n"
+        "🗄️ Dictionary metadata is cached per table and refreshed automatically after DDL or a stats gather; "
+        "set bypass_cache=true to force fresh dictionary reads.\n\n"
+        "♻️ Identical calls within a short TTL (and concurrent duplicates) are answered from one analysis; "
+        "'result_cache' in the response says whether it was served from cache and its age_seconds.\n\n"
         "⚡ Usage: Only call this tool with valid SELECT queries that you want to optimize."
     ),
 )
-def analyze_oracle_query(db_name: str, sql_text: str):
+def analyze_oracle_query(db_name: str, sql_text: str, bypass_cache: bool = False):
     """
     MCP tool entrypoint for Oracle query analysis.
     Opens Oracle DB connection and calls the real collector.
@@ -62,20 +152,23 @@ def analyze_oracle_query(db_name: str, sql_text: str):
     if not sql_text or not sql_text.strip():
         return {"error": "sql_text is empty", "facts": {}, "prompt": ""}
 
+    timer = PhaseTimer("oracle").start()
     try:
-        # Open DB connection
-        conn = oracle_connector.connect(db_name)
+        # Acquire pooled DB session (released in finally)
+        conn = oracle_connector.acquire(db_name)
         cur = conn.cursor()
 
         logger.info("📡 Connected to Oracle, collecting performance metadata…")
 
         # PRE-VALIDATE SQL before expensive metadata collection
-        logger.info("🔍 Validating SQL query (safety + syntax)...")
+        # (lexical safety checks; syntax is checked by the single EXPLAIN PLAN parse)
+        logger.info("🔍 Validating SQL query (safety)...")
         
         # Import validation function
         from tools.oracle_collector_impl import validate_sql
         
-        is_valid, error_msg, is_dangerous = validate_sql(cur, sql_text)
+        with phase("validate"):
+            is_valid, error_msg, is_dangerous = validate_sql(cur, sql_text)
         
         if is_dangerous:
             logger.error(f"🚨 DANGEROUS OPERATION BLOCKED: {error_msg}")
@@ -99,75 +192,40 @@ def analyze_oracle_query(db_name: str, sql_text: str):
             }
         
         if not is_valid:
-            logger.error(f"❌ SQL VALIDATION FAILED: {error_msg}")
-            logger.error("   Cannot analyze invalid SQL - returning error to user")
-            return {
-                "error": f"Invalid SQL query: {error_msg}",
-                "facts": {},
-                "prompt": (
-                    f"The SQL query is INVALID and cannot be analyzed.\n\n"
-                    f"Error: {error_msg}\n\n"
-                    f"Suggestions:\n"
-                    f"1. Check that all table and column names are spelled correctly\n"
-                    f"2. Verify table aliases match the table names\n"
-                    f"3. Ensure all referenced columns exist in the tables\n"
-                    f"4. Test the query in SQL*Plus or another SQL client first\n\n"
-                    f"You can use this query to find correct column names:\n"
-                    f"SELECT column_name FROM all_tab_columns WHERE owner='SCHEMA' AND table_name='TABLE';"
-                )
-            }
+            return _invalid_sql_response(error_msg)
         
-        logger.info("✅ SQL query is valid and safe")
+        logger.info("✅ SQL query passed safety checks")
 
-        # Check historical executions
-        fingerprint = normalize_and_hash(sql_text)
-        history = get_recent_history(fingerprint, db_name)
-
-        # Call real collector
-        result = run_collector(cur, sql_text)
-        
-        facts = result.get("facts", {})
-        plan_details = facts.get("plan_details", [])
-        
-        logger.info(f"📋 Collector returned {len(plan_details)} plan steps")
-        if not plan_details:
-            logger.warning("⚠️  EXPLAIN PLAN returned no steps - check if query is valid")
-
-        # Add visual plan
-        if plan_details:
-            facts["visual_plan"] = build_visual_plan(plan_details)
-            facts["plan_summary"] = get_plan_summary(plan_details)
-        
-        # Add historical context
-        if history:
-            facts["historical_context"] = compare_with_history(history, facts)
-            facts["history_count"] = len(history)  # Add count for LLM
-            logger.info(f"📊 Historical context: {facts['historical_context'].get('message', 'N/A')}")
-            
-            # Update the prompt field to emphasize historical context
-            result["prompt"] = (
-                f"🕒 IMPORTANT: This query pattern has been executed {len(history)} time(s) before. "
-                f"START your response with the historical context section using facts['historical_context']. "
-                f"{result.get('prompt', '')}"
+        def collect():
+            # Call real collector (reuses the verdict; EXPLAIN PLAN is the only parse)
+            result = run_collector(
+                cur, sql_text, db_name=db_name, use_cache=not bypass_cache,
+                validation=(is_valid, error_msg, is_dangerous)
             )
+            if result.get("parse_error"):
+                return _invalid_sql_response(result["parse_error"])
+            return _add_plan_and_history(result, sql_text, db_name)
+
+        if bypass_cache:
+            result = collect()
         else:
-            facts["historical_context"] = {"status": "new_query", "message": "First execution - establishing baseline"}
-            result["prompt"] = f"🆕 This is the first execution of this query pattern. {result.get('prompt', '')}"
-        
-        
-        # Store current execution in history
-        if plan_details:
-            plan_hash = plan_details[0].get("plan_hash_value", "unknown")
-            cost = plan_details[0].get("cost", 0)
-            table_stats = {t["table_name"]: t["num_rows"] for t in facts.get("table_stats", [])}
-            plan_operations = [
-                f"{s.get('operation', '')} {s.get('options', '')}".strip()
-                for s in plan_details[:5]  # Top 5 operations
-            ]
-            store_history(fingerprint, db_name, plan_hash, cost, table_stats, plan_operations)
+            # Same preset + statement + optimizer environment -> one shared analysis
+            key = (
+                "analyze_oracle_query", db_name, statement_fingerprint(sql_text),
+                get_optimizer_env_signature(cur), config.output_preset
+            )
+            result, cache_info = result_cache.get_or_compute(key, collect)
+            result["result_cache"] = cache_info
+            if cache_info["hit"]:
+                logger.info(f"♻️  Served from result cache (age {cache_info['age_seconds']}s, "
+                            f"coalesced={cache_info['coalesced']})")
+        if result.get("error"):
+            return result
+
+        plan_details = result["facts"].get("plan_details", [])
 
         logger.info(f"✅ Analysis complete with {len(plan_details)} plan steps")
-        return result
+        return timer.attach(result)
 
     except Exception as e:
         logger.exception("❌ Exception during analysis")
@@ -178,11 +236,150 @@ def analyze_oracle_query(db_name: str, sql_text: str):
             "prompt": ""
         }
     finally:
-        try:
-            if 'conn' in locals():
-                conn.close()
-        except:
-            pass
+        timer.stop()
+        if 'conn' in locals():
+            oracle_connector.release(conn)
+
+
+@mcp.tool(
+    name="analyze_oracle_sql_id",
+    description=(
+        "🔍 [ORACLE ONLY] Analyzes a statement straight from the Oracle cursor cache by SQL_ID.\n\n"
+        "Uses the plan actually in use (V$SQL_PLAN) instead of re-explaining the text, "
+        "so no EXPLAIN PLAN and no parse happen on the database.\n\n"
+        "📥 Inputs: db_name, sql_id (e.g. from get_top_queries), optional child_number "
+        "(default: most recently active child), optional bypass_cache.\n\n"
+        "🎯 runtime_stats=true: reads V$SQL_PLAN_STATISTICS_ALL for the last execution and reports "
+        "E-Rows vs A-Rows, misestimate ratios, self time, buffers and the worst steps "
+        "(needs the GATHER_PLAN_STATISTICS hint or STATISTICS_LEVEL=ALL when the statement ran).\n\n"
+        "📊 Returns: Same facts as analyze_oracle_query (plan, table/index stats, history) "
+        "plus sql_id, child_number and plan_hash_value in the summary.\n\n"
+        "⚠️ Requires SELECT on V$SQL_PLAN and V$SQL. Fails if the cursor has aged out of the shared pool."
+    ),
+)
+def analyze_oracle_sql_id(db_name: str, sql_id: str, child_number: int = None, bypass_cache: bool = False,
+                          runtime_stats: bool = False):
+    """
+    MCP tool entrypoint for cursor-cache analysis of an Oracle SQL_ID.
+    """
+    logger.info(f"🔍 analyze_oracle_sql_id(db={db_name}, sql_id={sql_id}, child={child_number}) called")
+
+    timer = PhaseTimer("oracle").start()
+    try:
+        conn = oracle_connector.acquire(db_name)
+        cur = conn.cursor()
+
+        result = run_cursor_collector(
+            cur, (sql_id or "").strip(), child_number,
+            db_name=db_name, use_cache=not bypass_cache, runtime_stats=runtime_stats
+        )
+        if result.get("error"):
+            logger.error(f"❌ {result['error']}")
+            return result
+
+        _add_plan_and_history(result, result["facts"]["sql_text"], db_name)
+
+        plan_details = result["facts"].get("plan_details", [])
+        logger.info(f"✅ Cursor analysis complete with {len(plan_details)} plan steps")
+        return timer.attach(result)
+
+    except Exception as e:
+        logger.exception("❌ Exception during cursor analysis")
+        return {
+            "error": f"Internal error: {e}",
+            "trace": traceback.format_exc(),
+            "facts": {},
+            "prompt": ""
+        }
+    finally:
+        timer.stop()
+        if 'conn' in locals():
+            oracle_connector.release(conn)
+
+
+@mcp.tool(
+    name="analyze_oracle_queries_batch",
+    description=(
+        "🔍 [ORACLE ONLY] Analyzes a whole workload of Oracle SELECT queries in one call.\n\n"
+        "Statements are deduplicated by fingerprint (literals ignored), each unique statement is "
+        "explained once, and dictionary metadata is collected ONCE for the union of all referenced "
+        "tables on a single session.\n\n"
+        "⚠️ Same SECURITY RESTRICTIONS as analyze_oracle_query: unsafe statements are rejected "
+        "individually and reported with an error, the rest of the batch is still analysed.\n\n"
+        "📥 Inputs: db_name, sql_list (list of SELECT statements), optional bypass_cache.\n\n"
+        "📊 Returns: 'statements' (per unique statement: fingerprint, occurrences, input_indexes, "
+        "facts or error) and 'workload_summary' (most expensive plans ranked by cost x occurrences)."
+    ),
+)
+def analyze_oracle_queries_batch(db_name: str, sql_list: list[str], bypass_cache: bool = False):
+    """
+    MCP tool entrypoint for Oracle workload (batch) analysis.
+    One pooled session, one EXPLAIN per unique statement, one metadata pass.
+    """
+    logger.info(f"🔍 analyze_oracle_queries_batch(db={db_name}, statements={len(sql_list or [])}) called")
+
+    groups = group_by_fingerprint(sql_list or [])
+    if not groups:
+        return {"error": "sql_list is empty", "statements": [], "workload_summary": {}, "prompt": ""}
+
+    max_statements = config.batch_analysis.get("max_statements", 50)
+    if len(groups) > max_statements:
+        return {
+            "error": f"Too many unique statements: {len(groups)} (limit {max_statements}). Split the workload.",
+            "statements": [],
+            "workload_summary": {},
+            "prompt": ""
+        }
+
+    timer = PhaseTimer("oracle").start()
+    try:
+        conn = oracle_connector.acquire(db_name)
+        cur = conn.cursor()
+
+        unique = list(groups.items())
+        results = run_batch_collector(
+            cur, [g["sql"] for _, g in unique], db_name=db_name, use_cache=not bypass_cache
+        )
+
+        statements = []
+        for (fingerprint, group), result in zip(unique, results):
+            if not result.get("error"):
+                _add_plan_and_history(result, group["sql"], db_name)
+            statements.append({
+                "fingerprint": fingerprint,
+                "occurrences": len(group["input_indexes"]),
+                "input_indexes": group["input_indexes"],
+                "sql_text": group["sql"],
+                **result
+            })
+            logger.info(f"   📄 [{len(statements)}/{len(unique)}] "
+                        f"{'❌ ' + result['error'] if result.get('error') else '✅ analysed'}")
+
+        summary = summarize_workload(statements, config.batch_analysis.get("top_n", 10))
+        logger.info(f"✅ Batch complete: {summary['analysed']} analysed, {summary['failed']} failed")
+        return timer.attach({
+            "statements": statements,
+            "workload_summary": summary,
+            "prompt": (
+                f"Oracle workload analysis: {summary['unique_statements']} unique statement(s) from "
+                f"{summary['statements_submitted']} submitted. START with workload_summary['most_expensive'] "
+                f"(ranked by cost x occurrences), then give per-statement recommendations."
+            )
+        })
+
+    except Exception as e:
+        logger.exception("❌ Exception during batch analysis")
+        return {
+            "error": f"Internal error: {e}",
+            "trace": traceback.format_exc(),
+            "statements": [],
+            "workload_summary": {},
+            "prompt": ""
+        }
+    finally:
+        timer.stop()
+        if 'conn' in locals():
+            oracle_connector.release(conn)
 
 
 @mcp.tool(
@@ -207,7 +404,7 @@ def compare_oracle_query_plans(db_name: str, original_sql: str, optimized_sql: s
     logger.info(f"🔍 compare_oracle_query_plans(db={db_name})")
     
     try:
-        conn = oracle_connector.connect(db_name)
+        conn = oracle_connector.acquire(db_name)
         cur = conn.cursor()
         
         # Import Oracle validation function
@@ -248,15 +445,33 @@ def compare_oracle_query_plans(db_name: str, original_sql: str, optimized_sql: s
                 "comparison": None
             }
         
-        logger.info("✅ Both queries are valid and safe")
+        logger.info("✅ Both queries passed safety checks")
         
         # Analyze original query
         logger.info("📊 Analyzing original query...")
-        original_result = run_collector(cur, original_sql)
+        original_result = run_collector(
+            cur, original_sql, db_name=db_name,
+            validation=(is_valid_orig, error_orig, is_dangerous_orig)
+        )
+        if original_result.get("parse_error"):
+            logger.error(f"❌ Original query invalid: {original_result['parse_error']}")
+            return {
+                "error": f"Invalid original query: {original_result['parse_error']}",
+                "comparison": None
+            }
         
         # Analyze optimized query
         logger.info("📊 Analyzing optimized query...")
-        optimized_result = run_collector(cur, optimized_sql)
+        optimized_result = run_collector(
+            cur, optimized_sql, db_name=db_name,
+            validation=(is_valid_opt, error_opt, is_dangerous_opt)
+        )
+        if optimized_result.get("parse_error"):
+            logger.error(f"❌ Optimized query invalid: {optimized_result['parse_error']}")
+            return {
+                "error": f"Invalid optimized query: {optimized_result['parse_error']}",
+                "comparison": None
+            }
         
         # Debug: Log what we got
         logger.info(f"   Original result keys: {list(original_result.keys())}")
@@ -318,9 +533,6 @@ def compare_oracle_query_plans(db_name: str, original_sql: str, optimized_sql: s
         logger.exception("❌ Exception during comparison")
         return {"error": str(e), "trace": traceback.format_exc()}
     finally:
-        try:
-            if 'conn' in locals():
-                conn.close()
-        except:
-            pass
+        if 'conn' in locals():
+            oracle_connector.release(conn)
 
@@ -2,20 +2,43 @@
 # CLEAN & FIXED VERSION — Avi Cohen 2025
 
 import re
-from datetime import datetime
+import uuid
+import logging
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from config import config
+from db_connector import oracle_connector
+from metrics import phase, run_in_context
+from sql_lexer import (
+    tokenize, identifier, is_name, words, first_word, max_paren_depth, qualified_names,
+    WORD, QUOTED_IDENT, PUNCT
+)
+from tools.oracle_metadata_cache import metadata_cache, split_by_table, merge_tables, OPTIMIZER_KEY
 
 # ============================================================
 # DEBUG HELPER
 # ============================================================
 
+_log = logging.getLogger("oracle_collector")
+_log.setLevel(logging.DEBUG if config.show_sql_queries else logging.INFO)
+
+
+class _Joined:
+    """Message built only if the record is actually emitted."""
+    __slots__ = ("parts",)
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __str__(self):
+        return "[ORACLE-COLLECTOR] " + " ".join(str(m) for m in self.parts)
+
+
 def dbg(*msg):
-    """Debug print with prefix - respects config.show_sql_queries"""
-    # TEMP: Always print for debugging - bypass config check
-    import sys
-    sys.stderr.write("[ORACLE-COLLECTOR] " + " ".join(str(m) for m in msg) + "\n")
-    sys.stderr.flush()
+    """Collector debug line - only when config.show_sql_queries is on; formatted lazily"""
+    if _log.isEnabledFor(logging.DEBUG):
+        _log.debug(_Joined(msg))
 
 
 # ============================================================
@@ -33,17 +56,18 @@ def extract_sql_objects(sql_text: str):
     """
     Extract table references from SQL - handles both qualified (OWNER.TABLE) 
     and unqualified (TABLE) references.
+
+    Works on the shared token stream, so names inside comments, string
+    literals and q-quotes are ignored.
     """
-    s = (sql_text or "").upper()
-    
-    # Find qualified references (OWNER.TABLE)
-    qualified = re.findall(r'\b([A-Z0-9_]+)\.([A-Z0-9_]+)\b', s)
+    tokens = tokenize(sql_text or "")
     
     seen = set()
     result = []
     
-    # Add qualified references
-    for owner, table in qualified:
+    # Add qualified references (OWNER.TABLE)
+    for _, parts in qualified_names(tokens):
+        owner, table = parts[0], parts[1]
         # Skip if owner looks like a table alias or column reference
         if owner not in ('DUAL', 'SYS', 'SYSTEM') and len(owner) > 1:
             if (owner, table) not in seen:
@@ -51,15 +75,17 @@ def extract_sql_objects(sql_text: str):
                 result.append((owner, table))
     
     # Find unqualified table references after FROM/JOIN keywords
-    # Pattern: FROM/JOIN <whitespace> <table_name> (with optional alias)
-    unqualified = re.findall(
-        r'\b(?:FROM|JOIN)\s+([A-Z0-9_]+)\b',
-        s
-    )
-    
     # For unqualified tables, we can't know the owner from SQL alone
     # These will be resolved by the execution plan
-    for table in unqualified:
+    for i, tok in enumerate(tokens[:-1]):
+        if tok.kind != WORD or tok.upper not in ('FROM', 'JOIN'):
+            continue
+        nxt = tokens[i + 1]
+        if not is_name(nxt):
+            continue
+        if i + 2 < len(tokens) and tokens[i + 2].kind == PUNCT and tokens[i + 2].value == ".":
+            continue  # qualified - handled above
+        table = identifier(nxt)
         # Skip common keywords and already qualified tables
         if table not in ('SELECT', 'DUAL', 'WHERE', 'TABLE') and not any(t == table for _, t in result):
             # Mark as unknown owner - will be resolved from plan
@@ -75,8 +101,6 @@ def extract_columns_from_sql(sql_text: str):
     Extract potential column names from SQL, filtering out common keywords.
     This is used for column statistics gathering.
     """
-    s = (sql_text or "").upper()
-    
     # Common SQL keywords to exclude
     keywords = {
         'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'EXISTS', 'BETWEEN',
@@ -97,11 +121,14 @@ def extract_columns_from_sql(sql_text: str):
         'PRIOR', 'NOCYCLE', 'SIBLINGS'
     }
     
-    # Extract potential column names (alphanumeric + underscore, 2+ chars)
-    tokens = re.findall(r'\b[A-Z0-9_]{2,}\b', s)
+    # Potential column names: identifiers outside comments/strings, 2+ chars
+    names = [
+        identifier(t) for t in tokenize(sql_text or "")
+        if t.kind == QUOTED_IDENT or (t.kind == WORD and len(t.value) >= 2)
+    ]
     
     # Filter out keywords and limit to reasonable count
-    columns = [t for t in tokens if t not in keywords]
+    columns = [n for n in names if n and n not in keywords]
     
     # Remove duplicates and limit to first 100 unique columns (performance consideration)
     unique_cols = []
@@ -114,14 +141,176 @@ def extract_columns_from_sql(sql_text: str):
     return sorted(unique_cols)
 
 
+# ============================================================
+# COLUMN → TABLE RESOLUTION
+# ============================================================
+
+# Words that end a table reference instead of being its alias
+_NOT_ALIAS = {
+    'WHERE', 'JOIN', 'ON', 'USING', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'FULL', 'CROSS',
+    'NATURAL', 'GROUP', 'ORDER', 'HAVING', 'UNION', 'INTERSECT', 'MINUS', 'EXCEPT',
+    'CONNECT', 'START', 'PARTITION', 'SAMPLE', 'FOR', 'FETCH', 'OFFSET', 'WITH', 'MODEL',
+    'PIVOT', 'UNPIVOT', 'SELECT', 'LATERAL', 'APPLY', 'AS', 'WINDOW', 'LIMIT',
+}
+
+
+def _skip_parens(tokens, i):
+    """Index just past the parenthesised group opening at tokens[i]."""
+    depth = 0
+    while i < len(tokens):
+        if tokens[i].kind == PUNCT:
+            if tokens[i].value == "(":
+                depth += 1
+            elif tokens[i].value == ")":
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+        i += 1
+    return i
+
+
+def extract_table_aliases(sql_text: str) -> dict:
+    """
+    Map FROM/JOIN table references to tables: {ALIAS: (owner or None, TABLE)}.
+
+    Handles [owner.]table [AS] alias and comma-separated FROM lists; the
+    table name itself is mapped too, so TABLE.COLUMN resolves. Inline views
+    are skipped (their own FROM clauses are mapped as the walk reaches them).
+    """
+    tokens = tokenize(sql_text or "")
+    aliases = {}
+    n = len(tokens)
+
+    def punct(i, value):
+        return i < n and tokens[i].kind == PUNCT and tokens[i].value == value
+
+    for i, tok in enumerate(tokens):
+        if tok.kind != WORD or tok.upper not in ('FROM', 'JOIN'):
+            continue
+        j = i + 1
+        while j < n:
+            if punct(j, "("):
+                j = _skip_parens(tokens, j)          # inline view
+                if j < n and tokens[j].kind == WORD and tokens[j].upper == 'AS':
+                    j += 1
+                if j < n and is_name(tokens[j]) and tokens[j].upper not in _NOT_ALIAS:
+                    j += 1
+            elif is_name(tokens[j]) and tokens[j].upper not in _NOT_ALIAS:
+                owner, table = None, identifier(tokens[j])
+                j += 1
+                if punct(j, ".") and j + 1 < n and is_name(tokens[j + 1]):
+                    owner, table = table, identifier(tokens[j + 1])
+                    j += 2
+                if punct(j, "@"):                    # db link - not resolvable
+                    break
+                aliases.setdefault(table, (owner, table))
+                if j < n and tokens[j].kind == WORD and tokens[j].upper == 'AS':
+                    j += 1
+                if j < n and is_name(tokens[j]) and tokens[j].upper not in _NOT_ALIAS:
+                    aliases[identifier(tokens[j])] = (owner, table)
+                    j += 1
+            else:
+                break
+            if not punct(j, ","):
+                break
+            j += 1
+
+    return aliases
+
+
+def _plan_aliases(plan_details) -> dict:
+    """{ALIAS: (owner, table)} from PLAN_TABLE/V$SQL_PLAN object_alias of table steps."""
+    aliases = {}
+    for step in plan_details:
+        alias = (step.get("object_alias") or "").split("@")[0].strip('"')
+        if alias and step.get("object_name") and (step.get("operation") or "").startswith("TABLE ACCESS"):
+            aliases[alias] = (step.get("object_owner"), step["object_name"])
+    return aliases
+
+
+def resolve_column_targets(sql_text: str, plan_details, tables) -> dict:
+    """
+    Resolve the columns the statement uses to their owning tables.
+
+    Sources:
+        - ALIAS.COLUMN / TABLE.COLUMN / OWNER.TABLE.COLUMN references in the SQL
+        - access/filter predicates of every plan step; unqualified predicate
+          columns belong to the step's object alias (index steps carry the
+          alias of their table)
+        - for single-table statements, every unqualified column candidate
+
+    Returns {(owner, table): sorted [COLUMN, ...]} limited to `tables`.
+    """
+    tables = list(tables)
+    by_name = defaultdict(list)
+    for owner, table in tables:
+        by_name[table].append((owner, table))
+
+    sql_aliases = extract_table_aliases(sql_text)
+    plan_aliases = _plan_aliases(plan_details)
+
+    def resolve(alias):
+        if alias in plan_aliases:
+            return plan_aliases[alias]
+        owner, table = sql_aliases.get(alias, (None, alias))
+        if owner:
+            return (owner, table)
+        candidates = by_name.get(table, [])
+        return candidates[0] if len(candidates) == 1 else None
+
+    wanted = set(tables)
+    targets = defaultdict(set)
+
+    def add(table_key, column):
+        if table_key in wanted:
+            targets[table_key].add(column)
+
+    # Qualified column references in the statement
+    for _, parts in qualified_names(tokenize(sql_text or "")):
+        if len(parts) == 2:
+            add(resolve(parts[0]), parts[1])
+        elif len(parts) == 3:
+            add((parts[0], parts[1]), parts[2])
+
+    # Predicate columns from the plan
+    for step in plan_details:
+        step_alias = (step.get("object_alias") or "").split("@")[0].strip('"')
+        for predicate in (step.get("access_predicates"), step.get("filter_predicates")):
+            if not predicate:
+                continue
+            ptokens = tokenize(predicate)
+            qualified_at = set()
+            for start, parts in qualified_names(ptokens):
+                qualified_at.update(range(start, start + 2 * len(parts) - 1))
+                if len(parts) >= 2:
+                    add(resolve(parts[-2]), parts[-1])
+            if step_alias:
+                for k, t in enumerate(ptokens):
+                    if t.kind == QUOTED_IDENT and k not in qualified_at:
+                        add(resolve(step_alias), identifier(t))
+
+    # Single-table statement: unqualified names can only be its columns
+    if len(tables) == 1:
+        noise = set(sql_aliases) | {o for o, _ in tables}
+        for col in extract_columns_from_sql(sql_text):
+            if col not in noise:
+                targets[tables[0]].add(col)
+
+    return {t: sorted(cols) for t, cols in targets.items()}
+
+
 # ============================================================
 # PLAN COLLECTION
 # ============================================================
 
 def validate_sql(cur, sql_text: str):
     """
-    Pre-validate SQL for safety and correctness.
+    Pre-validate SQL for safety (lexical checks only - no round trip).
     Returns (is_valid, error_message, is_dangerous)
+
+    Syntax/semantic errors are reported by the single EXPLAIN PLAN parse in
+    explain_plan(), so the statement is parsed on the server only once.
+    `cur` is unused and kept for the tools' call signature.
     
     Safety checks:
     - Block DDL (CREATE, DROP, ALTER, TRUNCATE)
@@ -130,11 +319,11 @@ def validate_sql(cur, sql_text: str):
     - Block system operations (SHUTDOWN, STARTUP)
     - Only allow SELECT queries
     """
-    return True, None, False  # TEMP: Bypass for testing
     try:
-        clean = sql_text.strip().upper()
-        if clean.endswith(";"):
-            clean = clean[:-1]
+        # Keywords are checked on the shared token stream, so comments,
+        # string literals and quoted identifiers can't trip (or hide) them
+        tokens = tokenize(sql_text)
+        present = words(tokens)
         
         # SECURITY CHECK 1: Only allow SELECT statements
         dangerous_keywords = [
@@ -147,54 +336,34 @@ def validate_sql(cur, sql_text: str):
             'BEGIN', 'DECLARE',  # PL/SQL blocks
         ]
         
-        # Check first word after WITH/comment removal
-        first_word = clean.split()[0] if clean.split() else ''
+        # Check first word (comments are not tokens)
+        first = first_word(tokens)
         
         # Allow WITH clause (for CTEs)
-        if first_word == 'WITH':
+        if first == 'WITH':
             # Find the main query after CTE
             # Look for SELECT after the CTE definition        
-            if 'SELECT' not in clean:
+            if 'SELECT' not in present:
                 return False, "No SELECT found in query with WITH clause", True
-        elif first_word != 'SELECT':
-            return False, f"Only SELECT queries are allowed. Found: {first_word}", True
+        elif first != 'SELECT':
+            return False, f"Only SELECT queries are allowed. Found: {first}", True
         
         # Check for dangerous keywords anywhere in the query
+        # (whole words only - e.g. an "UPDATE_DATE" column is OK)
         for keyword in dangerous_keywords:
-            # Use word boundaries to avoid false positives
-            # e.g., "UPDATE_DATE" column should be OK
-            import re
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, clean):
+            if keyword in present:
                 return False, f"DANGEROUS OPERATION BLOCKED: {keyword} statements are not allowed", True
         
         # SECURITY CHECK 2: Block INTO clauses (SELECT INTO)
-        if re.search(r'\bINTO\b', clean):
+        if 'INTO' in present:
             return False, "DANGEROUS OPERATION BLOCKED: SELECT INTO is not allowed", True
         
         # SECURITY CHECK 3: Limit subquery depth to prevent DoS
-        paren_depth = 0
-        max_depth = 0
-        for char in clean:
-            if char == '(':
-                paren_depth += 1
-                max_depth = max(max_depth, paren_depth)
-            elif char == ')':
-                paren_depth -= 1
+        max_depth = max_paren_depth(tokens)
         
         if max_depth > 10:
             return False, f"Query too complex: subquery nesting depth {max_depth} exceeds limit of 10", False
         
-        # SYNTAX/SEMANTIC CHECK: Try to execute with ROWNUM = 0
-        original_sql = sql_text.strip()
-        if original_sql.endswith(";"):
-            original_sql = original_sql[:-1]
-        
-        # Wrap in subquery and limit to 0 rows - validates structure without data
-        test_stmt = f"SELECT * FROM ({original_sql}) subq WHERE ROWNUM = 0"
-        cur.execute(test_stmt)
-        cur.fetchall()
-        
         return True, None, False
         
     except Exception as e:
@@ -206,34 +375,70 @@ def validate_sql(cur, sql_text: str):
         return False, error_msg, False
 
 
-def explain_plan(cur, sql_text: str, stmt_id: str):
+def clean_parse_error(error) -> str:
+    """First line of an ORA- error, or the full message otherwise."""
+    error_msg = str(error)
+    if "ORA-" in error_msg:
+        error_msg = error_msg.split('\n')[0]
+    return error_msg
+
+
+# Identifier check for the configured plan table (it is formatted into SQL)
+_PLAN_TABLE_RE = re.compile(r'^[A-Za-z][A-Za-z0-9_$#]*(\.[A-Za-z][A-Za-z0-9_$#]*)?$')
+
+
+def plan_table_name() -> str:
+    """Configured plan table (default PLAN_TABLE, a session-private GTT)."""
+    name = config.plan_table or "PLAN_TABLE"
+    if not _PLAN_TABLE_RE.match(name):
+        raise ValueError(f"Invalid oracle_analysis.plan_table: {name!r}")
+    return name
+
+
+def new_statement_id() -> str:
+    """Unique STATEMENT_ID per analysis (30 chars, fits PLAN_TABLE.STATEMENT_ID)."""
+    return f"MQ_{uuid.uuid4().hex[:27]}"
+
+
+def discard_plan(cur):
+    """
+    Drop this session's plan rows by rolling back the EXPLAIN PLAN insert.
+    No DELETE and no COMMIT, so nothing is written to redo for other sessions.
+    """
+    try:
+        cur.connection.rollback()
+    except Exception as e:
+        dbg("discard_plan ERROR:", e)
+
+
+def explain_plan(cur, sql_text: str, stmt_id: str, validation=None, parse_stats=None):
+    """
+    Run EXPLAIN PLAN for the statement - the only server-side parse of it.
+
+    Plan rows go to the configured plan table under `stmt_id` and stay in the
+    open transaction; callers read them and then call discard_plan().
+
+    Args:
+        validation: (is_valid, error, is_dangerous) verdict already computed by
+                    the caller; validate_sql() runs here only when omitted
+        parse_stats: optional dict; its "statement_parses" counter is incremented
+
+    Returns:
+        (xplan_lines, error) - error is None on success
+    """
     try:
         dbg("-> explain_plan START")
-        
-        # First check if PLAN_TABLE exists
-        try:
-            cur.execute("SELECT COUNT(*) FROM plan_table WHERE ROWNUM = 1")
-            dbg("✓ PLAN_TABLE exists and is accessible")
-        except Exception as e:
-            dbg("✗ PLAN_TABLE check failed:", e)
-            dbg("   Attempting to create PLAN_TABLE...")
-            try:
-                cur.execute("@?/rdbms/admin/utlxplan.sql")
-                cur.connection.commit()
-                dbg("✓ PLAN_TABLE created successfully")
-            except Exception as create_err:
-                dbg("✗ Cannot create PLAN_TABLE:", create_err)
-        
-        cur.execute("DELETE FROM plan_table WHERE statement_id = :sid", sid=stmt_id)
-        cur.connection.commit()
+        plan_table = plan_table_name()
 
         clean = sql_text.strip()
         if clean.endswith(";"):
             clean = clean[:-1]
 
-        # PRE-VALIDATE SQL BEFORE EXPLAIN PLAN
-        dbg("Pre-validating SQL syntax and semantics...")
-        is_valid, validation_error, is_dangerous = validate_sql(cur, clean)
+        # Reuse the caller's verdict instead of validating twice
+        if validation is None:
+            dbg("Pre-validating SQL safety...")
+            validation = validate_sql(cur, clean)
+        is_valid, validation_error, is_dangerous = validation
         
         if is_dangerous:
             dbg("🚨 DANGEROUS OPERATION BLOCKED:", validation_error)
@@ -248,18 +453,30 @@ def explain_plan(cur, sql_text: str, stmt_id: str):
         
         dbg("✓ SQL is valid and safe - proceeding with EXPLAIN PLAN")
 
-        stmt = f"EXPLAIN PLAN SET STATEMENT_ID = '{stmt_id}' FOR {clean}"
+        stmt = f"EXPLAIN PLAN SET STATEMENT_ID = '{stmt_id}' INTO {plan_table} FOR {clean}"
         dbg("Running EXPLAIN PLAN:", stmt[:180], "...")
 
-        cur.execute(stmt)
-        cur.connection.commit()
+        if parse_stats is not None:
+            parse_stats["statement_parses"] = parse_stats.get("statement_parses", 0) + 1
+        try:
+            cur.execute(stmt)
+        except Exception as parse_err:
+            error_msg = clean_parse_error(parse_err)
+            if "ORA-02402" in error_msg:
+                # Plan table missing - not a problem with the statement
+                raise
+            dbg("✗ EXPLAIN PLAN parse failed:", error_msg)
+            if parse_stats is not None:
+                parse_stats["parse_error"] = error_msg
+            return [f"SQL VALIDATION ERROR: {error_msg}"], error_msg
 
         cur.execute("""
             SELECT plan_table_output
             FROM TABLE(DBMS_XPLAN.DISPLAY(
+                table_name => :tab,
                 statement_id => :sid,
                 format => 'TYPICAL +PREDICATE +COST +BYTES'))
-        """, sid=stmt_id)
+        """, tab=plan_table, sid=stmt_id)
 
         lines = [r[0] for r in cur.fetchall()]
         dbg("EXPLAIN returned lines:", len(lines))
@@ -270,10 +487,32 @@ def explain_plan(cur, sql_text: str, stmt_id: str):
         return [f"(EXPLAIN PLAN failed: {e})"], str(e)
 
 
+def get_session_parse_counts(cur):
+    """
+    Parse counters of the current session from V$MYSTAT.
+    Returns {"total": n, "hard": n}, or None without V$ access.
+    """
+    try:
+        cur.execute("""
+            SELECT n.name, s.value
+            FROM v$mystat s
+            JOIN v$statname n ON n.statistic# = s.statistic#
+            WHERE n.name IN ('parse count (total)', 'parse count (hard)')
+        """)
+        counts = dict(cur.fetchall())
+        return {
+            "total": counts.get("parse count (total)", 0),
+            "hard": counts.get("parse count (hard)", 0),
+        }
+    except Exception as e:
+        dbg("get_session_parse_counts ERROR (may need V$ privileges):", e)
+        return None
+
+
 def get_plan_objects(cur, stmt_id: str):
     dbg("-> get_plan_objects()")
     try:
-        cur.execute("""
+        cur.execute(f"""
             SELECT DISTINCT 
                 p.object_owner,
                 p.object_name,
@@ -281,7 +520,7 @@ def get_plan_objects(cur, stmt_id: str):
                 p.operation,
                 p.options,
                 MIN(p.id) as step
-            FROM plan_table p
+            FROM {plan_table_name()} p
             WHERE p.statement_id = :sid
               AND p.object_owner IS NOT NULL
               AND p.object_name IS NOT NULL
@@ -314,15 +553,17 @@ def get_plan_objects(cur, stmt_id: str):
 def get_plan_details(cur, stmt_id: str):
     dbg("-> get_plan_details()")
     try:
-        cur.execute("""
+        cur.execute(f"""
             SELECT 
                 id,
                 parent_id,
+                depth,
                 operation,
                 options,
                 object_owner,
                 object_name,
                 object_type,
+                object_alias,
                 cost,
                 cardinality,
                 bytes,
@@ -330,7 +571,7 @@ def get_plan_details(cur, stmt_id: str):
                 filter_predicates,
                 partition_start,
                 partition_stop
-            FROM plan_table
+            FROM {plan_table_name()}
             WHERE statement_id = :sid
             ORDER BY id
         """, sid=stmt_id)
@@ -346,27 +587,306 @@ def get_plan_details(cur, stmt_id: str):
 
 
 # ============================================================
-# METADATA HELPERS
+# CURSOR CACHE PLANS (V$SQL_PLAN)
 # ============================================================
 
-def build_clause(tables, alias=None):
-    """Generic OR clause for OWNER.TABLE filters except for ALL_IND_COLUMNS"""
-    if not tables:
-        return "", {}
+SQL_ID_RE = re.compile(r'^[0-9a-z]{13}$')
+
+# Rowsource statistics of the last execution (V$SQL_PLAN_STATISTICS_ALL)
+RUNTIME_STAT_COLUMNS = """,
+            p.last_starts,
+            p.last_output_rows,
+            p.last_elapsed_time,
+            p.last_cr_buffer_gets,
+            p.last_cu_buffer_gets,
+            p.last_disk_reads"""
+
+MISESTIMATE_THRESHOLD = 10   # flag steps whose E-Rows and A-Rows differ by 10x or more
+WORST_STEPS = 5
+
 
-    parts = []
-    binds = {}
+def get_cursor_plan(cur, sql_id: str, child_number: int = None, runtime_stats: bool = False):
+    """
+    Actual plan of a cached cursor from V$SQL_PLAN, in one round trip.
+
+    Without child_number the most recently active child is used. The statement
+    text (V$SQL.SQL_FULLTEXT) is returned on the id = 0 row only. With
+    runtime_stats the rows come from V$SQL_PLAN_STATISTICS_ALL and also carry
+    the last execution's starts, output rows, elapsed time, buffers and reads.
+
+    Returns:
+        (plan_details, sql_text) - plan_details is [] when the cursor is not cached
+    """
+    dbg("-> get_cursor_plan()", sql_id, child_number, runtime_stats)
+    view = "v$sql_plan_statistics_all" if runtime_stats else "v$sql_plan"
+    extra_columns = RUNTIME_STAT_COLUMNS if runtime_stats else ""
+    cur.execute(f"""
+        SELECT
+            p.id,
+            p.parent_id,
+            p.depth,
+            p.operation,
+            p.options,
+            p.object_owner,
+            p.object_name,
+            p.object_type,
+            p.object_alias,
+            p.cost,
+            p.cardinality,
+            p.bytes,
+            p.access_predicates,
+            p.filter_predicates,
+            p.partition_start,
+            p.partition_stop,
+            p.plan_hash_value,
+            p.child_number{extra_columns},
+            CASE WHEN p.id = 0 THEN (
+                SELECT s.sql_fulltext FROM v$sql s
+                WHERE s.sql_id = p.sql_id
+                  AND s.child_number = p.child_number
+                  AND s.address = p.address
+            ) END AS sql_fulltext
+        FROM {view} p
+        WHERE p.sql_id = :sql_id
+          AND p.child_number = NVL(:child_number, (
+                SELECT MAX(s.child_number) KEEP (DENSE_RANK LAST ORDER BY s.last_active_time)
+                FROM v$sql s
+                WHERE s.sql_id = :sql_id
+          ))
+        ORDER BY p.id
+    """, sql_id=sql_id, child_number=child_number)
+
+    cols = [c[0].lower() for c in cur.description]
+    rows = [dict(zip(cols, r)) for r in cur.fetchall()]
 
-    for i, (o, t) in enumerate(tables, 1):
-        if alias:
-            parts.append(f"({alias}.owner = :o{i} AND {alias}.table_name = :t{i})")
+    sql_text = ""
+    for row in rows:
+        text = row.pop("sql_fulltext")
+        if text is not None:
+            sql_text = text.read() if hasattr(text, "read") else text
+
+    dbg("Cursor plan rows:", len(rows))
+    return rows, sql_text
+
+
+def apply_runtime_stats(plan_details, threshold: float = MISESTIMATE_THRESHOLD, top_n: int = WORST_STEPS):
+    """
+    Annotate plan steps with estimated vs actual rows and self time.
+
+    Per step (from the last execution):
+        e_rows = optimizer cardinality x starts (CARDINALITY is per start)
+        a_rows = actual output rows
+        misestimate_ratio = max(a/e, e/a), both floored at 1
+        elapsed_ms / self_ms = elapsed incl. children / minus children's elapsed
+        buffers, disk_reads, starts
+
+    Returns a summary dict with the worst misestimates and self-time steps;
+    {"available": False, ...} when the cursor has no rowsource statistics.
+    """
+    if not any(step.get("last_starts") for step in plan_details):
+        for step in plan_details:
+            for key in ("last_starts", "last_output_rows", "last_elapsed_time",
+                        "last_cr_buffer_gets", "last_cu_buffer_gets", "last_disk_reads"):
+                step.pop(key, None)
+        return {
+            "available": False,
+            "reason": (
+                "No rowsource statistics for this cursor. Execute it with the "
+                "/*+ GATHER_PLAN_STATISTICS */ hint or STATISTICS_LEVEL=ALL, then retry."
+            )
+        }
+
+    children_elapsed = defaultdict(int)
+    for step in plan_details:
+        if step.get("parent_id") is not None:
+            children_elapsed[step["parent_id"]] += step.get("last_elapsed_time") or 0
+
+    for step in plan_details:
+        starts = step.pop("last_starts", None) or 0
+        a_rows = step.pop("last_output_rows", None) or 0
+        elapsed_us = step.pop("last_elapsed_time", None) or 0
+        buffers = (step.pop("last_cr_buffer_gets", None) or 0) + (step.pop("last_cu_buffer_gets", None) or 0)
+        disk_reads = step.pop("last_disk_reads", None) or 0
+
+        step["starts"] = starts
+        step["a_rows"] = a_rows
+        step["buffers"] = buffers
+        step["disk_reads"] = disk_reads
+        step["elapsed_ms"] = round(elapsed_us / 1000, 3)
+        step["self_ms"] = round(max(elapsed_us - children_elapsed[step["id"]], 0) / 1000, 3)
+
+        if step.get("cardinality") is None or not starts:
+            step["e_rows"] = None
+            step["misestimate_ratio"] = None
+            continue
+
+        e_rows = step["cardinality"] * starts
+        step["e_rows"] = e_rows
+        ratio = max(a_rows, 1) / max(e_rows, 1)
+        step["misestimate_ratio"] = round(max(ratio, 1 / ratio), 1)
+        step["misestimate"] = step["misestimate_ratio"] >= threshold
+
+    def brief(step, *keys):
+        return {
+            "id": step["id"],
+            "operation": f"{step.get('operation', '')} {step.get('options') or ''}".strip(),
+            "object_name": step.get("object_name"),
+            **{k: step.get(k) for k in keys}
+        }
+
+    misestimated = sorted(
+        (s for s in plan_details if s.get("misestimate")),
+        key=lambda s: s["misestimate_ratio"], reverse=True
+    )
+    slowest = sorted(plan_details, key=lambda s: s["self_ms"], reverse=True)
+    total_ms = plan_details[0]["elapsed_ms"] if plan_details else 0
+
+    return {
+        "available": True,
+        "threshold": threshold,
+        "elapsed_ms": total_ms,
+        "misestimated_steps": len(misestimated),
+        "worst_misestimates": [
+            brief(s, "e_rows", "a_rows", "starts", "misestimate_ratio") for s in misestimated[:top_n]
+        ],
+        "top_self_time": [
+            brief(s, "self_ms", "buffers", "disk_reads") for s in slowest[:top_n] if s["self_ms"] > 0
+        ],
+    }
+
+
+def display_cursor(cur, sql_id: str, child_number: int):
+    """DBMS_XPLAN.DISPLAY_CURSOR text for a cached child cursor."""
+    try:
+        cur.execute("""
+            SELECT plan_table_output
+            FROM TABLE(DBMS_XPLAN.DISPLAY_CURSOR(
+                sql_id => :sql_id,
+                cursor_child_no => :child_number,
+                format => 'TYPICAL +PREDICATE +COST +BYTES'))
+        """, sql_id=sql_id, child_number=child_number)
+        return [r[0] for r in cur.fetchall()]
+    except Exception as e:
+        dbg("display_cursor ERROR:", e)
+        return [f"(DBMS_XPLAN.DISPLAY_CURSOR failed: {e})"]
+
+
+def plan_objects_from_details(plan_details):
+    """Same table/index split as get_plan_objects(), computed from plan rows."""
+    tables = set()
+    indexes = set()
+    for step in plan_details:
+        owner, name = step.get("object_owner"), step.get("object_name")
+        if not owner or not name:
+            continue
+        obj_type = step.get("object_type")
+        op = step.get("operation")
+        if obj_type in ("INDEX", "INDEX PARTITION", "INDEX SUBPARTITION"):
+            indexes.add((owner, name))
+        elif op and "INDEX" in op:
+            indexes.add((owner, name))
         else:
-            parts.append(f"(owner = :o{i} AND table_name = :t{i})")
+            tables.add((owner, name))
+    return {"tables": list(tables), "indexes": list(indexes)}
+
+
+def run_cursor_plan_analysis(cur, sql_id: str, child_number: int = None,
+                             db_name: str = None, use_cache: bool = True, runtime_stats: bool = False):
+    """
+    Analyze a statement from the cursor cache: the real plan from V$SQL_PLAN,
+    no EXPLAIN PLAN and no parse of the statement. Metadata, facts and output
+    filtering are shared with run_full_oracle_analysis().
+
+    runtime_stats adds estimated-vs-actual rows, self time and the worst
+    misestimated steps (facts["cardinality_analysis"]) from the last execution.
+    """
+    dbg("===== START CURSOR ANALYSIS =====", sql_id)
+
+    if not SQL_ID_RE.match(sql_id or ""):
+        return {"error": f"Invalid sql_id: {sql_id!r} (expected 13 characters, 0-9 a-z)", "facts": {}, "prompt": ""}
+
+    try:
+        with phase("plan_fetch"):
+            plan_details, sql_text = get_cursor_plan(cur, sql_id, child_number, runtime_stats)
+    except Exception as e:
+        error_msg = clean_parse_error(e)
+        if "ORA-00942" in error_msg:
+            error_msg += " (requires SELECT on V$SQL_PLAN, V$SQL_PLAN_STATISTICS_ALL and V$SQL)"
+        return {"error": f"Cannot read cursor cache: {error_msg}", "facts": {}, "prompt": ""}
+
+    if not plan_details:
+        target = f"{sql_id} child {child_number}" if child_number is not None else sql_id
+        return {
+            "error": f"No plan in the cursor cache for sql_id {target} (aged out or never executed here)",
+            "facts": {},
+            "prompt": ""
+        }
+
+    child = plan_details[0]["child_number"]
+    sql = normalize_sql(sql_text)
+    cardinality_analysis = apply_runtime_stats(plan_details) if runtime_stats else None
+
+    # Text plan only matters for the standard preset (others drop it)
+    xplan = []
+    if config.output_preset == "standard":
+        with phase("display_cursor"):
+            xplan = display_cursor(cur, sql_id, child)
+
+    result = build_analysis_result(
+        cur, sql, xplan, plan_objects_from_details(plan_details), plan_details,
+        db_name, use_cache, source="cursor_cache"
+    )
+    result["facts"]["summary"]["sql_id"] = sql_id
+    result["facts"]["summary"]["child_number"] = child
+    result["facts"]["summary"]["plan_hash_value"] = plan_details[0].get("plan_hash_value")
+    if cardinality_analysis is not None:
+        result["facts"]["cardinality_analysis"] = cardinality_analysis
+        if cardinality_analysis["available"]:
+            result["prompt"] += (
+                f" Runtime statistics: {cardinality_analysis['misestimated_steps']} step(s) misestimated "
+                f"by >= {MISESTIMATE_THRESHOLD}x - see facts['cardinality_analysis']."
+            )
+    return result
 
-        binds[f"o{i}"] = o
-        binds[f"t{i}"] = t
 
-    return " OR ".join(parts), binds
+# ============================================================
+# METADATA HELPERS
+# ============================================================
+
+# Built-in VARRAY(32767) OF VARCHAR2(4000); used for collection binds
+LIST_TYPE = "SYS.ODCIVARCHAR2LIST"
+
+
+def varchar_list(cur, values):
+    """Build a SYS.ODCIVARCHAR2LIST bind value from an iterable of strings."""
+    list_type = cur.connection.gettype(LIST_TYPE)
+    return list_type.newobject(list(values))
+
+
+def build_clause(cur, tables, alias=None, owner_col="owner", table_col="table_name"):
+    """
+    Fixed-shape OWNER.TABLE filter using collection binds.
+
+    The SQL text is the same for any number of tables, so Oracle reuses one
+    shared cursor per query instead of hard-parsing a new OR chain per call.
+    The owner/table IN-lists keep dictionary index access; the pair list
+    restricts the result to the exact (owner, table) combinations.
+    """
+    if not tables:
+        return "", {}
+
+    a = f"{alias}." if alias else ""
+    where = (
+        f"{a}{owner_col} IN (SELECT column_value FROM TABLE(:owners)) "
+        f"AND {a}{table_col} IN (SELECT column_value FROM TABLE(:tabs)) "
+        f"AND {a}{owner_col} || '.' || {a}{table_col} IN (SELECT column_value FROM TABLE(:pairs))"
+    )
+    binds = {
+        "owners": varchar_list(cur, sorted({o for o, _ in tables})),
+        "tabs": varchar_list(cur, sorted({t for _, t in tables})),
+        "pairs": varchar_list(cur, sorted({f"{o}.{t}" for o, t in tables})),
+    }
+    return where, binds
 
 
 # ============================================================
@@ -378,7 +898,7 @@ def get_table_stats(cur, tables):
     if not tables:
         return []
 
-    where, binds = build_clause(tables)
+    where, binds = build_clause(cur, tables)
 
     q = f"""
         SELECT owner, table_name, num_rows, blocks, empty_blocks,
@@ -402,7 +922,7 @@ def get_index_stats(cur, tables):
     if not tables:
         return []
 
-    where, binds = build_clause(tables)
+    where, binds = build_clause(cur, tables)
 
     q = f"""
         SELECT owner, index_name, table_name, index_type, uniqueness,
@@ -428,15 +948,7 @@ def get_index_columns(cur, tables):
         return []
 
     # 🚨 FIX: ALL_IND_COLUMNS uses TABLE_OWNER — NOT OWNER 🚨
-    where_parts = []
-    binds = {}
-
-    for i, (owner, table) in enumerate(tables, 1):
-        where_parts.append(f"(ic.table_owner = :o{i} AND ic.table_name = :t{i})")
-        binds[f"o{i}"] = owner
-        binds[f"t{i}"] = table
-
-    where = " OR ".join(where_parts)
+    where, binds = build_clause(cur, tables, alias="ic", owner_col="table_owner")
 
     q = f"""
         SELECT ic.table_owner,
@@ -487,7 +999,7 @@ def get_partition_info(cur, tables):
     if not tables:
         return [], []
 
-    where, binds = build_clause(tables)
+    where, binds = build_clause(cur, tables)
 
     q1 = f"""
         SELECT owner, table_name, partitioning_type,
@@ -501,38 +1013,41 @@ def get_partition_info(cur, tables):
     cols1 = [c[0].lower() for c in cur.description]
     part_tables = [dict(zip(cols1, r)) for r in cur.fetchall()]
 
-    # Partition key columns
-    pk_cond = []
-    for i, (o, t) in enumerate(tables, 1):
-        pk_cond.append(f"(owner = :o{i} AND name = :t{i})")
+    # Partition key columns (ALL_PART_KEY_COLUMNS uses NAME, not TABLE_NAME)
+    pk_where, pk_binds = build_clause(cur, tables, table_col="name")
 
     q2 = f"""
         SELECT owner, name AS table_name, column_name,
                column_position, object_type
         FROM all_part_key_columns
-        WHERE {" OR ".join(pk_cond)}
+        WHERE {pk_where}
         ORDER BY owner, name, object_type, column_position
     """
 
-    cur.execute(q2, binds)
+    cur.execute(q2, pk_binds)
     cols2 = [c[0].lower() for c in cur.description]
     keys = [dict(zip(cols2, r)) for r in cur.fetchall()]
 
     return part_tables, keys
 
 
-def get_column_stats(cur, tables, sql_columns):
+def get_column_stats(cur, column_targets):
+    """
+    Column statistics for exactly the (table, column) pairs the SQL uses.
+
+    Args:
+        column_targets: {(owner, table): [COLUMN, ...]} from resolve_column_targets()
+    """
     dbg("-> get_column_stats()")
-    if not tables or not sql_columns:
+    column_targets = {t: cols for t, cols in column_targets.items() if cols}
+    if not column_targets:
         return []
 
-    where, binds = build_clause(tables)
-
-    placeholders = []
-    for i, col in enumerate(sql_columns):
-        key = f"c{i}"
-        binds[key] = col
-        placeholders.append(f":{key}")
+    where, binds = build_clause(cur, list(column_targets))
+    binds["cols"] = varchar_list(cur, sorted({c for cols in column_targets.values() for c in cols}))
+    binds["triples"] = varchar_list(cur, sorted(
+        f"{o}.{t}.{c}" for (o, t), cols in column_targets.items() for c in cols
+    ))
 
     q = f"""
         SELECT owner, table_name, column_name,
@@ -540,7 +1055,9 @@ def get_column_stats(cur, tables, sql_columns):
                num_buckets, TO_CHAR(last_analyzed,'YYYY-MM-DD HH24:MI:SS') last_analyzed,
                sample_size
         FROM all_tab_col_statistics
-        WHERE ({where}) AND column_name IN ({",".join(placeholders)})
+        WHERE {where}
+          AND column_name IN (SELECT column_value FROM TABLE(:cols))
+          AND owner || '.' || table_name || '.' || column_name IN (SELECT column_value FROM TABLE(:triples))
         ORDER BY owner, table_name, column_name
     """
 
@@ -561,7 +1078,7 @@ def get_constraints(cur, tables):
     if not tables:
         return []
 
-    where, binds = build_clause(tables, alias='c')
+    where, binds = build_clause(cur, tables, alias='c')
 
     q = f"""
         SELECT c.owner, c.table_name, c.constraint_name, c.constraint_type,
@@ -572,7 +1089,7 @@ def get_constraints(cur, tables):
         LEFT JOIN all_cons_columns cc 
             ON c.owner = cc.owner 
             AND c.constraint_name = cc.constraint_name
-        WHERE ({where}) 
+        WHERE {where}
           AND c.constraint_type IN ('P', 'R', 'U')
         ORDER BY c.owner, c.table_name, c.constraint_name, cc.position
     """
@@ -631,18 +1148,16 @@ def get_optimizer_parameters(cur):
         'optimizer_adaptive_features'
     ]
     
-    placeholders = ', '.join([f"'{p}'" for p in params])
-    
-    q = f"""
+    q = """
         SELECT name, value, isdefault, description
         FROM v$parameter
-        WHERE name IN ({placeholders})
+        WHERE name IN (SELECT column_value FROM TABLE(:params))
         ORDER BY name
     """
     
     try:
         dbg("Optimizer params query:", q.replace("\n", " "))
-        cur.execute(q)
+        cur.execute(q, params=varchar_list(cur, params))
         cols = [c[0].lower() for c in cur.description]
         rows = [dict(zip(cols, r)) for r in cur.fetchall()]
         dbg("Optimizer param rows:", len(rows))
@@ -658,13 +1173,8 @@ def get_segment_sizes(cur, tables):
     if not tables:
         return []
     
-    # Build OR conditions for matching tables
     # DBA_SEGMENTS uses SEGMENT_NAME (not TABLE_NAME) and OWNER
-    owner_segment_pairs = []
-    for owner, table in tables:
-        owner_segment_pairs.append(f"(owner = '{owner}' AND segment_name = '{table}')")
-    
-    where_clause = " OR ".join(owner_segment_pairs)
+    where_clause, binds = build_clause(cur, tables, table_col="segment_name")
     
     # Try DBA_SEGMENTS first, fallback to USER_SEGMENTS
     queries = [
@@ -676,26 +1186,30 @@ def get_segment_sizes(cur, tables):
                    ROUND(bytes/1024/1024/1024, 2) as size_gb
             FROM dba_segments
             WHERE segment_type IN ('TABLE', 'TABLE PARTITION', 'INDEX', 'INDEX PARTITION')
-              AND ({where_clause})
+              AND {where_clause}
             ORDER BY owner, segment_name
         """,
-        # USER_SEGMENTS (fallback - only current user's segments)
-        f"""
+        # USER_SEGMENTS (fallback - only current user's segments: tables of
+        # other owners are left out rather than matched by name)
+        """
             SELECT USER as owner, segment_name, segment_type,
                    bytes, blocks, extents,
                    ROUND(bytes/1024/1024, 2) as size_mb,
                    ROUND(bytes/1024/1024/1024, 2) as size_gb
             FROM user_segments
             WHERE segment_type IN ('TABLE', 'TABLE PARTITION', 'INDEX', 'INDEX PARTITION')
+              AND segment_name IN (SELECT column_value FROM TABLE(:tabs))
+              AND USER || '.' || segment_name IN (SELECT column_value FROM TABLE(:pairs))
             ORDER BY segment_name
         """
     ]
+    query_binds = [binds, {"tabs": binds["tabs"], "pairs": binds["pairs"]}]
     
     for i, q in enumerate(queries):
         try:
             view_name = "DBA_SEGMENTS" if i == 0 else "USER_SEGMENTS"
             dbg(f"Trying {view_name}...")
-            cur.execute(q)  # No binds needed - SQL is built directly
+            cur.execute(q, query_binds[i])
             cols = [c[0].lower() for c in cur.description]
             rows = [dict(zip(cols, r)) for r in cur.fetchall()]
             dbg(f"Segment size rows from {view_name}:", len(rows))
@@ -709,6 +1223,39 @@ def get_segment_sizes(cur, tables):
     return []
 
 
+def get_object_versions(cur, tables):
+    """
+    One round trip returning {(owner, table): (last_ddl_time, last_analyzed)}.
+    Used to validate metadata cache entries.
+    """
+    dbg("-> get_object_versions()")
+    if not tables:
+        return {}
+
+    where, binds = build_clause(cur, tables, alias="t")
+
+    q = f"""
+        SELECT t.owner, t.table_name,
+               TO_CHAR(o.last_ddl_time,'YYYY-MM-DD HH24:MI:SS') last_ddl_time,
+               TO_CHAR(t.last_analyzed,'YYYY-MM-DD HH24:MI:SS') last_analyzed
+        FROM all_tables t
+        JOIN all_objects o
+          ON o.owner = t.owner
+         AND o.object_name = t.table_name
+         AND o.object_type = 'TABLE'
+        WHERE {where}
+    """
+
+    try:
+        cur.execute(q, binds)
+        versions = {(r[0], r[1]): (r[2], r[3]) for r in cur.fetchall()}
+        dbg("Object versions:", len(versions))
+        return versions
+    except Exception as e:
+        dbg("get_object_versions ERROR:", e)
+        return {}
+
+
 def diagnose_partition_pruning(plan_details, partition_tables, sql_text):
     """
     Diagnose partition pruning issues.
@@ -765,28 +1312,363 @@ def diagnose_partition_pruning(plan_details, partition_tables, sql_text):
     return diagnostics
 
 
+# ============================================================
+# CONCURRENT METADATA PHASES
+# ============================================================
+
+_phase_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ora-meta")
+_phase_slots = {}
+_phase_slots_lock = threading.Lock()
+_NO_SESSION = object()
+
+
+def _preset_slots(db_name: str):
+    """Per-preset semaphore bounding extra sessions used for metadata phases."""
+    with _phase_slots_lock:
+        if db_name not in _phase_slots:
+            pool_cfg = config.get_db_preset(db_name).get("pool", {}) or {}
+            _phase_slots[db_name] = threading.BoundedSemaphore(max(1, pool_cfg.get("metadata_parallelism", 3)))
+        return _phase_slots[db_name]
+
+
+def _run_phase_on_pooled_session(db_name, name, fn, args):
+    """Run one metadata phase on its own pooled session; _NO_SESSION if none was available."""
+    with _preset_slots(db_name):
+        try:
+            conn = oracle_connector.acquire(db_name)
+        except Exception as e:
+            dbg(f"No extra session for {fn.__name__} ({e}) - will run on main session")
+            return _NO_SESSION
+        try:
+            cur = conn.cursor()
+            try:
+                with phase(f"metadata.{name}"):
+                    return fn(cur, *args)
+            finally:
+                cur.close()
+        finally:
+            oracle_connector.release(conn)
+
+
+def run_phases(cur, phases: dict, db_name: str = None) -> dict:
+    """
+    Run independent metadata phases {name: (fn, args)} and return {name: result}.
+
+    With a db_name (pooled preset) and parallelism enabled, phases run
+    concurrently on separate pooled sessions, bounded per preset by
+    pool.metadata_parallelism. Phases that could not get a session, or all
+    phases when no pool is available, run sequentially on `cur`.
+    """
+    parallelism = 1
+    if db_name:
+        pool_cfg = config.get_db_preset(db_name).get("pool", {}) or {}
+        parallelism = pool_cfg.get("metadata_parallelism", 3)
+
+    results = {}
+    if parallelism > 1 and len(phases) > 1:
+        futures = {
+            name: _phase_executor.submit(run_in_context(_run_phase_on_pooled_session), db_name, name, fn, args)
+            for name, (fn, args) in phases.items()
+        }
+        for name, future in futures.items():
+            result = future.result()  # re-raises phase errors like the sequential path
+            if result is not _NO_SESSION:
+                results[name] = result
+
+    for name, (fn, args) in phases.items():
+        if name not in results:
+            with phase(f"metadata.{name}"):
+                results[name] = fn(cur, *args)
+
+    return results
+
+
+def _table_phases(tables, column_targets) -> dict:
+    return {
+        "table_stats": (get_table_stats, (tables,)),
+        "index_stats": (get_index_stats, (tables,)),
+        "index_columns": (get_index_columns, (tables,)),
+        "partition_info": (get_partition_info, (tables,)),
+        "column_stats": (get_column_stats, ({t: column_targets.get(t, ()) for t in tables},)),
+        "constraints": (get_constraints, (tables,)),
+        "segment_sizes": (get_segment_sizes, (tables,)),
+    }
+
+
+def _unpack_partition_info(results: dict) -> dict:
+    part_tables, part_keys = results.pop("partition_info")
+    results["partition_tables"] = part_tables
+    results["partition_keys"] = part_keys
+    return results
+
+
+def collect_table_metadata(cur, tables, column_targets, db_name: str = None):
+    """
+    Run the per-table dictionary queries for `tables` (no caching).
+    column_targets: {(owner, table): [COLUMN, ...]} for the column stats query.
+    """
+    return _unpack_partition_info(run_phases(cur, _table_phases(tables, column_targets), db_name))
+
+
 # ============================================================
 # MAIN ENTRY CALLED BY MCP TOOL
 # ============================================================
 
-def run_full_oracle_analysis(cur, sql_text: str):
+def collect_table_metadata_cached(cur, tables, column_targets, db_name):
+    """
+    Per-table metadata through the (preset, owner, table) cache.
+
+    Returns (sections, cache_info). Only tables whose entry is missing,
+    expired or invalidated by DDL/stats changes are re-queried; column
+    stats are fetched only for columns not yet looked up for that table.
+    """
+    with phase("metadata.object_versions"):
+        versions = get_object_versions(cur, tables)
+
+    per_table = {}
+    missing = []
+    for t in tables:
+        entry = metadata_cache.get((db_name, t[0], t[1]), versions.get(t))
+        if entry is None:
+            missing.append(t)
+        else:
+            per_table[t] = entry
+
+    dbg(f"Metadata cache: {len(per_table)} hit(s), {len(missing)} miss(es)")
+
+    if missing:
+        fetched = split_by_table(collect_table_metadata(cur, missing, column_targets, db_name), missing)
+        for t in missing:
+            fetched[t]["columns_checked"] = set(column_targets.get(t, ()))
+            metadata_cache.put((db_name, t[0], t[1]), fetched[t], versions.get(t))
+        per_table.update(fetched)
+
+    # Cached tables may not have stats for every column this SQL references
+    hit_tables = [t for t in tables if t not in missing]
+    need = {}
+    for t in hit_tables:
+        cols = set(column_targets.get(t, ())) - per_table[t]["columns_checked"]
+        if cols:
+            need[t] = sorted(cols)
+    if need:
+        with phase("metadata.column_stats_topup"):
+            extra_rows = get_column_stats(cur, need)
+        extra = split_by_table({"column_stats": extra_rows}, list(need))
+        for t, cols in need.items():
+            # Merge into a new entry under the cache lock: cached data is shared
+            # by reference with concurrent analyses and must not be mutated
+            def top_up(data, new_stats=extra[t]["column_stats"], cols=cols):
+                known = {c["column_name"] for c in data["column_stats"]}
+                return dict(
+                    data,
+                    column_stats=data["column_stats"] + [c for c in new_stats if c["column_name"] not in known],
+                    columns_checked=data["columns_checked"] | set(cols),
+                )
+            merged = metadata_cache.update((db_name, t[0], t[1]), top_up, versions.get(t))
+            per_table[t] = merged if merged is not None else top_up(per_table[t])
+
+    # Keep only stats for the columns this SQL references, per table
+    view = {}
+    for t, data in per_table.items():
+        wanted = set(column_targets.get(t, ()))
+        view[t] = dict(data, column_stats=[c for c in data["column_stats"] if c["column_name"] in wanted])
+    sections = merge_tables(view)
+
+    return sections, {"hits": len(hit_tables), "misses": len(missing)}
+
+
+def get_optimizer_parameters_cached(cur, db_name):
+    """Optimizer parameters are preset-wide - cache them under a per-preset key (TTL only)."""
+    key = (db_name, None, OPTIMIZER_KEY)
+    params = metadata_cache.get(key)
+    if params is None:
+        with phase("metadata.optimizer_parameters"):
+            params = get_optimizer_parameters(cur)
+        metadata_cache.put(key, params)  # empty too - missing V$ privileges won't change per call
+    return params
+
+
+def get_optimizer_env_signature(cur) -> str:
+    """
+    Cheap signature of everything outside the statement that shapes its plan:
+    server version plus an order-independent hash of the session's optimizer
+    environment. Falls back to the version alone without V$ access.
+    """
+    version = getattr(cur.connection, "version", "unknown")
+    try:
+        cur.execute("""
+            SELECT SUM(ORA_HASH(name || '=' || value)), COUNT(*)
+            FROM v$ses_optimizer_env
+            WHERE sid = SYS_CONTEXT('USERENV', 'SID')
+        """)
+        env_hash, env_count = cur.fetchone()
+        return f"{version}:{env_hash}:{env_count}"
+    except Exception as e:
+        dbg("Optimizer env signature unavailable:", e)
+        return str(version)
+
+
+def run_full_oracle_analysis(cur, sql_text: str, db_name: str = None, use_cache: bool = True,
+                             validation=None):
+    """
+    Collect plan + metadata for one statement.
+
+    db_name enables the per-preset metadata cache; use_cache=False bypasses it
+    (fresh dictionary reads, cache left untouched).
+
+    validation is the (is_valid, error, is_dangerous) verdict from validate_sql()
+    when the caller already ran it. The statement itself is parsed on the server
+    exactly once, by EXPLAIN PLAN; a parse failure is returned as
+    {"error", "parse_error"} without collecting any metadata.
+    """
     dbg("===== START ANALYSIS =====")
 
     sql = normalize_sql(sql_text)
     dbg("SQL normalized:", sql[:100], "...")
 
-    sql_objects = extract_sql_objects(sql)
-    sql_cols = extract_columns_from_sql(sql)
-
-    dbg("Objects extracted:", sql_objects)
-    dbg("Column tokens:", len(sql_cols))
+    if validation is None:
+        with phase("validate"):
+            validation = validate_sql(cur, sql)
+    is_valid, validation_error, is_dangerous = validation
+    if not is_valid:
+        prefix = "SECURITY BLOCK" if is_dangerous else "Invalid SQL query"
+        return {"error": f"{prefix}: {validation_error}", "facts": {}, "prompt": ""}
 
-    stmt_id = f"LLM_{int(datetime.now().timestamp())}"
+    stmt_id = new_statement_id()
     dbg("Statement ID:", stmt_id)
 
-    xplan, plan_err = explain_plan(cur, sql, stmt_id)
-    plan_objs = get_plan_objects(cur, stmt_id)
-    plan_details = get_plan_details(cur, stmt_id)
+    parse_stats = {"statement_parses": 0}
+    # Two reads back to back: their difference is what one V$MYSTAT probe
+    # itself adds to the counters (0 or 1 depending on the statement cache)
+    session_parses_probe = get_session_parse_counts(cur)
+    session_parses_before = get_session_parse_counts(cur)
+
+    with phase("explain"):
+        xplan, plan_err = explain_plan(cur, sql, stmt_id, validation, parse_stats)
+    if parse_stats.get("parse_error"):
+        discard_plan(cur)
+        return {
+            "error": f"Invalid SQL query: {parse_stats['parse_error']}",
+            "parse_error": parse_stats["parse_error"],
+            "facts": {},
+            "prompt": ""
+        }
+
+    with phase("plan_fetch"):
+        plan_objs = get_plan_objects(cur, stmt_id)
+        plan_details = get_plan_details(cur, stmt_id)
+
+        # Plan rows are read - roll them back (session-private, nothing to commit)
+        discard_plan(cur)
+
+    result = build_analysis_result(cur, sql, xplan, plan_objs, plan_details, db_name, use_cache)
+
+    # Parses performed on the main session during this analysis, less the
+    # measured cost of the closing V$MYSTAT read
+    parse_info = {"statement_parses": parse_stats["statement_parses"]}
+    session_parses_after = get_session_parse_counts(cur)
+    if session_parses_probe and session_parses_before and session_parses_after:
+        for key, counter in (("session_parses", "total"), ("session_hard_parses", "hard")):
+            probe_cost = session_parses_before[counter] - session_parses_probe[counter]
+            delta = session_parses_after[counter] - session_parses_before[counter]
+            parse_info[key] = max(delta - probe_cost, 0)
+    result["facts"]["summary"]["parses"] = parse_info
+
+    return result
+
+
+def run_batch_oracle_analysis(cur, statements, db_name: str = None, use_cache: bool = True):
+    """
+    Analyse several statements on one session with a single metadata pass.
+
+    Every statement is explained (one parse each); the dictionary queries then
+    run once for the union of tables/columns of all statements, and each
+    statement's facts are cut from the shared sections.
+
+    Args:
+        statements: list of SQL texts (already deduplicated by the caller)
+
+    Returns:
+        list of results in input order - same shape as run_full_oracle_analysis(),
+        or {"error", ...} for statements that failed validation or parsing
+    """
+    dbg(f"===== START BATCH ANALYSIS ({len(statements)} statements) =====")
+
+    results = [None] * len(statements)
+    explained = []   # (index, sql, xplan, plan_objs, plan_details, tables, column_targets)
+
+    for i, sql_text in enumerate(statements):
+        sql = normalize_sql(sql_text)
+        with phase("validate"):
+            is_valid, validation_error, is_dangerous = validation = validate_sql(cur, sql)
+        if not is_valid:
+            prefix = "SECURITY BLOCK" if is_dangerous else "Invalid SQL query"
+            results[i] = {"error": f"{prefix}: {validation_error}", "facts": {}, "prompt": ""}
+            continue
+
+        stmt_id = new_statement_id()
+        parse_stats = {"statement_parses": 0}
+        with phase("explain"):
+            xplan, _ = explain_plan(cur, sql, stmt_id, validation, parse_stats)
+        if parse_stats.get("parse_error"):
+            discard_plan(cur)
+            results[i] = {
+                "error": f"Invalid SQL query: {parse_stats['parse_error']}",
+                "parse_error": parse_stats["parse_error"],
+                "facts": {},
+                "prompt": ""
+            }
+            continue
+
+        with phase("plan_fetch"):
+            plan_objs = get_plan_objects(cur, stmt_id)
+            plan_details = get_plan_details(cur, stmt_id)
+            discard_plan(cur)
+
+        tables = analysis_tables(sql, plan_objs)
+        column_targets = resolve_column_targets(sql, plan_details, tables)
+        explained.append((i, sql, xplan, plan_objs, plan_details, tables, column_targets))
+
+    if not explained:
+        return results
+
+    # One metadata pass for the whole workload
+    all_tables = sorted({t for e in explained for t in e[5]})
+    all_targets = defaultdict(set)
+    for e in explained:
+        for t, cols in e[6].items():
+            all_targets[t].update(cols)
+    all_targets = {t: sorted(cols) for t, cols in all_targets.items()}
+    dbg("Batch metadata for", len(all_tables), "table(s),",
+        sum(len(c) for c in all_targets.values()), "column target(s)")
+
+    sections, optimizer_params, cache_info = fetch_metadata(cur, all_tables, all_targets, db_name, use_cache)
+    per_table = split_by_table(sections, all_tables)
+
+    for i, sql, xplan, plan_objs, plan_details, tables, column_targets in explained:
+        view = {}
+        for t in tables:
+            wanted = set(column_targets.get(t, ()))
+            view[t] = dict(per_table[t], column_stats=[
+                c for c in per_table[t]["column_stats"] if c["column_name"] in wanted
+            ])
+        results[i] = assemble_result(
+            sql, xplan, plan_objs, plan_details, tables, column_targets,
+            merge_tables(view), optimizer_params, dict(cache_info, shared_tables=len(all_tables))
+        )
+
+    dbg("===== BATCH ANALYSIS COMPLETE =====")
+    return results
+
+
+def analysis_tables(sql: str, plan_objs) -> list:
+    """
+    Tables whose metadata an analysis needs: plan objects (authoritative owners)
+    plus owner-qualified tables named in the SQL.
+    """
+    sql_objects = extract_sql_objects(sql)
+
+    dbg("Objects extracted:", sql_objects)
 
     # Merge tables from plan (authoritative) with SQL-extracted objects
     # Plan objects are the source of truth since they have correct owners
@@ -806,23 +1688,65 @@ def run_full_oracle_analysis(cur, sql_text: str):
     
     tables = sorted(list(tables_set))
     dbg("Tables to fetch metadata for:", tables)
+    return tables
 
-    table_stats = get_table_stats(cur, tables)
-    index_stats = get_index_stats(cur, tables)
-    index_cols = get_index_columns(cur, tables)
-    part_tables, part_keys = get_partition_info(cur, tables)
-    col_stats = get_column_stats(cur, tables, sql_cols)
-    constraints = get_constraints(cur, tables)
-    optimizer_params = get_optimizer_parameters(cur)
-    segment_sizes = get_segment_sizes(cur, tables)
-    partition_diagnostics = diagnose_partition_pruning(plan_details, part_tables, sql)
 
-    # Cleanup
-    try:
-        cur.execute("DELETE FROM plan_table WHERE statement_id = :sid", sid=stmt_id)
-        cur.connection.commit()
-    except:
-        pass
+def fetch_metadata(cur, tables, column_targets, db_name: str = None, use_cache: bool = True):
+    """
+    Dictionary metadata for `tables` plus optimizer parameters, through the
+    metadata cache when enabled. Returns (sections, optimizer_params, cache_info).
+    """
+    cache_active = bool(db_name) and use_cache and metadata_cache.enabled
+    if cache_active:
+        sections, cache_info = collect_table_metadata_cached(cur, tables, column_targets, db_name)
+        optimizer_params = get_optimizer_parameters_cached(cur, db_name)
+    else:
+        phases = _table_phases(tables, column_targets)
+        phases["optimizer_parameters"] = (get_optimizer_parameters, ())
+        sections = _unpack_partition_info(run_phases(cur, phases, db_name))
+        optimizer_params = sections.pop("optimizer_parameters")
+        cache_info = {"hits": 0, "misses": len(tables)}
+    cache_info["bypassed"] = not cache_active
+    return sections, optimizer_params, cache_info
+
+
+def build_analysis_result(cur, sql: str, xplan, plan_objs, plan_details,
+                          db_name: str = None, use_cache: bool = True, source: str = "explain_plan"):
+    """
+    Shared second half of every Oracle analysis: metadata for the plan objects,
+    partition diagnostics, facts dict and output preset filtering.
+
+    Args:
+        xplan: DBMS_XPLAN text lines
+        plan_objs: {"tables": [(owner, name)], "indexes": [(owner, name)]}
+        plan_details: structured plan rows (PLAN_TABLE or V$SQL_PLAN)
+        source: where the plan came from ("explain_plan" | "cursor_cache")
+    """
+    with phase("resolve_objects"):
+        tables = analysis_tables(sql, plan_objs)
+
+        # Only the (table, column) pairs the statement actually uses
+        column_targets = resolve_column_targets(sql, plan_details, tables)
+    dbg("Column targets:", sum(len(c) for c in column_targets.values()), "across", len(column_targets), "table(s)")
+
+    sections, optimizer_params, cache_info = fetch_metadata(cur, tables, column_targets, db_name, use_cache)
+
+    return assemble_result(sql, xplan, plan_objs, plan_details, tables, column_targets,
+                           sections, optimizer_params, cache_info, source)
+
+
+def assemble_result(sql: str, xplan, plan_objs, plan_details, tables, column_targets,
+                    sections, optimizer_params, cache_info, source: str = "explain_plan"):
+    """Facts dict + prompt for one statement from already collected metadata sections."""
+    table_stats = sections["table_stats"]
+    index_stats = sections["index_stats"]
+    index_cols = sections["index_columns"]
+    part_tables = sections["partition_tables"]
+    part_keys = sections["partition_keys"]
+    col_stats = sections["column_stats"]
+    constraints = sections["constraints"]
+    segment_sizes = sections["segment_sizes"]
+    partition_diagnostics = diagnose_partition_pruning(plan_details, part_tables, sql)
 
     # Build full facts dictionary
     full_facts = {
@@ -843,9 +1767,12 @@ def run_full_oracle_analysis(cur, sql_text: str):
             "tables": len(tables),
             "indexes": len(index_stats),
             "columns": len(col_stats),
+            "column_targets": sum(len(c) for c in column_targets.values()),
             "constraints": len(constraints),
             "partitioned_tables": len(part_tables),
-            "partition_issues": len(partition_diagnostics)
+            "partition_issues": len(partition_diagnostics),
+            "metadata_cache": cache_info,
+            "plan_source": source
         }
     }
     
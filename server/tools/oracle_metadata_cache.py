@@ -0,0 +1,170 @@
+# server/tools/oracle_metadata_cache.py
+# In-process LRU cache for Oracle dictionary metadata, keyed by (preset, owner, table)
+
+import time
+import threading
+from collections import OrderedDict
+
+from config import config
+from metrics import register_collector
+
+# Per-table metadata sections stored in each cache entry
+TABLE_SECTIONS = (
+    "table_stats",
+    "index_stats",
+    "index_columns",
+    "partition_tables",
+    "partition_keys",
+    "column_stats",
+    "constraints",
+    "segment_sizes",
+)
+
+# Preset-level entry (not tied to a table)
+OPTIMIZER_KEY = "__optimizer_parameters__"
+
+
+class MetadataCache:
+    """
+    LRU cache of per-table dictionary metadata.
+
+    An entry is valid while it is younger than ttl_seconds AND the table's
+    version - (ALL_OBJECTS.LAST_DDL_TIME, ALL_TABLES.LAST_ANALYZED) - still
+    matches the version it was stored with. DDL or a stats gather therefore
+    invalidates the entry on the next lookup.
+    """
+
+    def __init__(self, max_entries: int = 500, ttl_seconds: int = 900, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key, version=None):
+        """Return cached data for key, or None on miss/expiry/version change."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if time.time() - entry["stored_at"] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            if entry["version"] != version:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["data"]
+
+    def put(self, key, data, version=None):
+        with self._lock:
+            self._entries[key] = {"data": data, "version": version, "stored_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, key, fn, version=None):
+        """
+        Replace the data of a live entry with fn(current data), under the lock.
+
+        fn must build a new object rather than modify its argument: get()
+        hands out the stored data by reference, so entries are never
+        mutated in place. The entry keeps its original stored_at (a top-up
+        does not extend the TTL). Returns the new data, or None when the
+        entry is gone or its version no longer matches.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["version"] != version:
+                return None
+            entry = dict(entry, data=fn(entry["data"]))
+            self._entries[key] = entry
+            return entry["data"]
+
+    def clear(self, preset: str = None):
+        """Drop every entry, or only the entries of one preset."""
+        with self._lock:
+            if preset is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == preset]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
+
+
+def split_by_table(sections: dict, tables) -> dict:
+    """
+    Split collector output lists into per-table dicts.
+
+    Returns {(owner, table): {section: [rows]}} for every requested table,
+    including tables that returned no rows (so empty results are cached too).
+    """
+    per_table = {t: {name: [] for name in TABLE_SECTIONS} for t in tables}
+
+    for name in TABLE_SECTIONS:
+        for row in sections.get(name, []):
+            owner = row.get("owner", row.get("table_owner"))
+            table = row.get("table_name", row.get("segment_name"))
+            if (owner, table) in per_table:
+                per_table[(owner, table)][name].append(row)
+
+    return per_table
+
+
+def merge_tables(per_table: dict) -> dict:
+    """Inverse of split_by_table: concatenate per-table sections in table order."""
+    merged = {name: [] for name in TABLE_SECTIONS}
+    for key in sorted(per_table, key=lambda k: (k[0] or "", k[1] or "")):
+        for name in TABLE_SECTIONS:
+            merged[name].extend(per_table[key].get(name, []))
+    return merged
+
+
+_settings = config.metadata_cache
+metadata_cache = MetadataCache(
+    max_entries=_settings.get("max_entries", 500),
+    ttl_seconds=_settings.get("ttl_seconds", 900),
+    enabled=_settings.get("enabled", True),
+)
+
+
+@register_collector
+def _cache_metrics():
+    stats = metadata_cache.stats()
+    labels = {"cache": "oracle_metadata"}
+    return [
+        ("metaquery_cache_hits_total", "counter", "Cache hits", [(labels, stats["hits"])]),
+        ("metaquery_cache_misses_total", "counter", "Cache misses", [(labels, stats["misses"])]),
+        ("metaquery_cache_entries", "gauge", "Entries currently cached", [(labels, stats["entries"])]),
+        ("metaquery_cache_hit_ratio", "gauge", "Hits / lookups since start", [(labels, stats["hit_ratio"])]),
+    ]
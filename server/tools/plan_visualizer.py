@@ -27,9 +27,9 @@ def build_visual_plan(plan_details: list, show_costs: bool = True) -> str:
     for i, step in enumerate(plan_details[1:], 1):  # Skip root
         depth = step.get("depth", 0)
         operation = step.get("operation", "")
-        options = step.get("options", "")
+        options = step.get("options") or ""
         object_name = step.get("object_name", "")
-        cost = step.get("cost", 0)
+        cost = step.get("cost") or 0
         cardinality = step.get("cardinality", 0)
         
         # Determine if this is the last child at this depth
@@ -58,10 +58,18 @@ def build_visual_plan(plan_details: list, show_costs: bool = True) -> str:
         # Add performance indicators
         if show_costs:
             op_text += f" (Cost: {cost}"
-            if cardinality is not None and cardinality > 0:
+            if "a_rows" in step:
+                # Runtime statistics: estimated (x starts) vs actual rows
+                if step.get("e_rows") is not None:
+                    op_text += f", E-Rows: {step['e_rows']:,}"
+                op_text += f", A-Rows: {step['a_rows']:,}, Self: {step.get('self_ms', 0)}ms"
+            elif cardinality is not None and cardinality > 0:
                 op_text += f", Rows: {cardinality:,}"
             op_text += ")"
         
+        if step.get("misestimate"):
+            op_text += f" 🎯 MISESTIMATE x{step['misestimate_ratio']}"
+        
         # Add warning emoji for problematic operations
         warning = get_operation_warning(operation, options, cost, cardinality)
         if warning:
@@ -0,0 +1,72 @@
+# server/tools/workload_summary.py
+# Grouping and ranking helpers for the analyze_*_queries_batch tools
+
+from collections import OrderedDict
+
+from history_tracker import normalize_and_hash
+
+
+def group_by_fingerprint(sql_list) -> "OrderedDict":
+    """
+    Deduplicate a workload by history fingerprint (literals normalized).
+
+    Returns OrderedDict {fingerprint: {"sql": first text seen, "input_indexes": [i, ...]}}
+    in order of first appearance; blank entries are skipped.
+    """
+    groups = OrderedDict()
+    for i, sql in enumerate(sql_list):
+        if not sql or not sql.strip():
+            continue
+        group = groups.setdefault(normalize_and_hash(sql), {"sql": sql, "input_indexes": []})
+        group["input_indexes"].append(i)
+    return groups
+
+
+def _is_full_scan(step: dict) -> bool:
+    """Oracle TABLE ACCESS FULL / MySQL access_type ALL."""
+    return step.get("options") == "FULL" or step.get("access_type") == "ALL"
+
+
+def summarize_workload(statements, top_n: int = 10) -> dict:
+    """
+    Workload-level view of a batch: totals plus the most expensive plans.
+
+    Plans are ranked by root cost x occurrences, so a cheap statement that
+    appears 500 times outranks an expensive one-off.
+
+    Args:
+        statements: per-statement entries with fingerprint, occurrences,
+                    input_indexes, sql_text and the collector's facts/error
+    """
+    ranked = []
+    failed = 0
+    for entry in statements:
+        plan = entry.get("facts", {}).get("plan_details") or []
+        if entry.get("error") or not plan:
+            failed += 1
+            continue
+        cost = plan[0].get("cost") or 0
+        ranked.append({
+            "fingerprint": entry["fingerprint"],
+            "input_indexes": entry["input_indexes"],
+            "occurrences": entry["occurrences"],
+            "cost": cost,
+            "weighted_cost": cost * entry["occurrences"],
+            "plan_hash_value": plan[0].get("plan_hash_value"),
+            "full_scans": sum(1 for s in plan if _is_full_scan(s)),
+            "plan_steps": len(plan),
+            "sql_preview": entry["sql_text"][:200],
+        })
+
+    ranked.sort(key=lambda r: r["weighted_cost"], reverse=True)
+    for rank, r in enumerate(ranked, 1):
+        r["rank"] = rank
+
+    return {
+        "statements_submitted": sum(e["occurrences"] for e in statements),
+        "unique_statements": len(statements),
+        "analysed": len(ranked),
+        "failed": failed,
+        "total_weighted_cost": sum(r["weighted_cost"] for r in ranked),
+        "most_expensive": ranked[:top_n],
+    }
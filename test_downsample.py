@@ -0,0 +1,80 @@
+"""
+Test LTTB downsampling of trend series.
+
+Usage:
+    python test_downsample.py   (or: pytest test_downsample.py)
+"""
+
+import os
+import sys
+import tempfile
+import math
+sys.path.insert(0, 'server')
+
+# Keep the server's database out of it: storage resolves its path on import
+os.environ["METAQUERY_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "query_history.db")
+
+import monitoring.downsample as downsample
+from monitoring.downsample import lttb_indices, downsample_points
+
+
+def _series(n=10_000, spike_at=6_789):
+    values = [50 + 5 * math.sin(i / 200) for i in range(n)]
+    values[spike_at] = 400.0
+    return values
+
+
+def test_spike_and_endpoints_survive():
+    values = _series()
+    kept = lttb_indices(values, 100)
+    assert len(kept) == 100
+    assert kept[0] == 0 and kept[-1] == len(values) - 1
+    assert kept == sorted(kept)
+    assert 6_789 in kept
+
+
+def test_short_series_and_missing_values():
+    assert lttb_indices([1, 2, 3], 10) == [0, 1, 2]
+    assert lttb_indices([1, 2, 3], 0) == [0, 1, 2]
+    values = _series(1_000, 500)
+    values[10] = None
+    kept = lttb_indices(values, 50)
+    assert 10 not in kept and 500 in kept
+
+
+def test_numpy_and_python_select_the_same_points():
+    if downsample.np is None:
+        return  # numpy not installed; the fallback is what runs
+    values = _series()
+    assert downsample._lttb_numpy(values, 250) == downsample._lttb_python(values, 250)
+
+
+def test_interleaved_series_are_downsampled_separately():
+    points = []
+    for i in range(1_000):
+        points.append({"sql_id": "a", "cpu_seconds": 1.0 + (i == 300) * 99})
+        points.append({"sql_id": "b", "cpu_seconds": 2.0})
+    kept = downsample_points(points, "cpu_seconds", 100, series_key="sql_id")
+    assert len(kept) == 100
+    assert sum(p["sql_id"] == "a" for p in kept) == 50
+    assert any(p["cpu_seconds"] == 100.0 for p in kept)
+
+
+def test_many_series_stay_within_max_points():
+    # 200 sql_ids x 10 snapshots at a cap of 500: 3 points each would be 600
+    points = [{"sql_id": f"q{s:03d}", "cpu_seconds": float(s)} for _ in range(10) for s in range(200)]
+    kept = downsample_points(points, "cpu_seconds", 500, series_key="sql_id")
+    assert len(kept) <= 500
+    kept_ids = {p["sql_id"] for p in kept}
+    assert "q199" in kept_ids and "q000" not in kept_ids  # least active series are the ones dropped
+    positions = [next(i for i, p in enumerate(points) if p is k) for k in kept]
+    assert positions == sorted(positions)  # original order
+
+
+if __name__ == "__main__":
+    test_spike_and_endpoints_survive()
+    test_short_series_and_missing_values()
+    test_numpy_and_python_select_the_same_points()
+    test_interleaved_series_are_downsampled_separately()
+    test_many_series_stay_within_max_points()
+    print("✅ LTTB downsampling keeps spikes")
@@ -0,0 +1,47 @@
+"""
+Test history fingerprinting: literal, bind and list-length differences map to
+one fingerprint; structural differences do not.
+
+Usage:
+    python test_fingerprint.py   (or: pytest test_fingerprint.py)
+"""
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, 'server')
+
+# Keep the server's database out of it: storage resolves its path on import
+os.environ["METAQUERY_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "query_history.db")
+
+from history_tracker import normalize_and_hash, normalize_sql_text
+
+
+def test_in_lists_collapse():
+    a = normalize_and_hash("SELECT * FROM orders WHERE id IN (1, 2)")
+    b = normalize_and_hash("select *\n  from orders -- ORM batch\n where id in (7,8,9,10);")
+    c = normalize_and_hash("SELECT * FROM orders WHERE id IN (:1, :2, :3)")
+
+    assert a == b == c
+    assert a != normalize_and_hash("SELECT * FROM orders WHERE id IN (SELECT id FROM archive)")
+
+
+def test_values_rows_collapse():
+    one = normalize_and_hash("INSERT INTO t (a, b) VALUES (1, 'x')")
+    many = normalize_and_hash("INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y'), (3, 'z')")
+
+    assert one == many
+    assert normalize_sql_text("INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y')") == \
+        "INSERT INTO T ( A , B ) VALUES ( :N , :S )"
+
+
+def test_structure_still_distinguishes():
+    assert normalize_and_hash("SELECT a FROM t WHERE x = 1") != normalize_and_hash("SELECT b FROM t WHERE x = 1")
+    assert normalize_and_hash("SELECT a FROM t WHERE x = :1") == normalize_and_hash("SELECT a FROM t WHERE x=:x")
+
+
+if __name__ == "__main__":
+    test_in_lists_collapse()
+    test_values_rows_collapse()
+    test_structure_still_distinguishes()
+    print("✅ Fingerprinting behaves")
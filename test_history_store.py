@@ -0,0 +1,258 @@
+"""
+Test the SQLite history store: WAL mode, batched write-behind inserts,
+flush-before-read and flush on close, baselines, stored plans and schema
+migrations of the shared storage.
+
+Usage:
+    python test_history_store.py   (or: pytest test_history_store.py)
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+sys.path.insert(0, 'server')
+
+# Keep the server's database out of it: storage resolves its path on import
+os.environ["METAQUERY_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "query_history.db")
+
+from storage import Storage
+from history_tracker import HistoryStore, init_db, get_baseline, compare_with_history, encode_plan, get_plan
+
+
+def _store(tmp, **kwargs):
+    store = HistoryStore(Storage(Path(tmp) / "history.db"), **kwargs)
+    init_db(store)
+    return store
+
+
+def _row(i):
+    return ("fp", "db", f"2026-01-01T00:00:{i:02d}", "plan", i, "{}", "[]", None, None)
+
+
+def _count(store):
+    return store.connect().execute("SELECT COUNT(*) FROM executions").fetchone()[0]
+
+
+def test_concurrent_inserts_are_batched():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp, batch_size=50, flush_interval_ms=1000)
+        threads = [threading.Thread(target=lambda: [store.add(_row(i)) for i in range(25)]) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert store.flush(timeout=5)
+        stats = store.stats()
+        assert store.storage.journal_mode == "wal"
+        assert _count(store) == 200
+        assert stats["queue_depth"] == 0
+        assert stats["batches"] < 200 and stats["avg_batch_rows"] > 1
+        store.close()
+
+
+def test_close_writes_pending_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp, flush_interval_ms=60000)
+        for i in range(3):
+            store.add(_row(i))
+        store.close()
+
+        conn = sqlite3.connect(Path(tmp) / "history.db")
+        assert conn.execute("SELECT COUNT(*) FROM executions").fetchone()[0] == 3
+        conn.close()
+
+
+def test_synchronous_mode():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp, write_behind=False)
+        store.add(_row(1))
+        assert _count(store) == 1
+        assert store.stats()["sync_writes"] == 1
+
+
+def test_baseline_running_statistics():
+    import history_tracker
+    costs = [100, 110, 90, 100, 400]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        for i, cost in enumerate(costs):
+            store.add(("fp", "db", f"2026-01-01T00:00:{i:02d}", "111" if i < 4 else "222", cost, "{}", "[]", None, None))
+        original, history_tracker.history_store = history_tracker.history_store, store
+        try:
+            baseline = get_baseline("fp", "db")
+        finally:
+            history_tracker.history_store = original
+        store.close()
+
+    mean = sum(costs) / len(costs)
+    stddev = (sum((c - mean) ** 2 for c in costs) / (len(costs) - 1)) ** 0.5
+    assert baseline["executions"] == 5
+    assert baseline["cost_mean"] == round(mean, 2)
+    assert baseline["cost_stddev"] == round(stddev, 2)
+    assert baseline["plan_hashes"] == {"111": 4, "222": 1}
+    assert baseline["dominant_plan_hash"] == "111" and baseline["last_plan_hash"] == "222"
+
+    def facts(plan_hash, cost):
+        return {"plan_details": [{"plan_hash_value": plan_hash, "cost": cost}]}
+
+    assert compare_with_history([], facts(111, 200), baseline)["status"] == "stable"  # within 2 stddev
+    assert compare_with_history([], facts(111, 900), baseline)["status"] == "data_growth"
+    assert compare_with_history([], facts(333, 100), baseline)["status"] == "plan_changed"
+
+
+def test_different_explain_plans_are_a_plan_change():
+    import history_tracker
+    # PLAN_TABLE rows carry no plan_hash_value: both plans are stored as "unknown"
+    full_scan = [
+        {"id": 0, "operation": "SELECT STATEMENT", "cost": 100},
+        {"id": 1, "parent_id": 0, "operation": "TABLE ACCESS", "options": "FULL", "object_name": "ORDERS", "cost": 100},
+    ]
+    by_index = [
+        {"id": 0, "operation": "SELECT STATEMENT", "cost": 100},
+        {"id": 1, "parent_id": 0, "operation": "TABLE ACCESS", "options": "BY INDEX ROWID", "object_name": "ORDERS", "cost": 100},
+        {"id": 2, "parent_id": 1, "operation": "INDEX", "options": "RANGE SCAN", "object_name": "ORDERS_IX", "cost": 3},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp, write_behind=False)
+        original, history_tracker.history_store = history_tracker.history_store, store
+        try:
+            for _ in range(4):
+                history_tracker.store_history("fp", "db", "unknown", 100, {}, [], full_scan)
+            baseline = get_baseline("fp", "db")
+            history = history_tracker.get_recent_history("fp", "db")
+            assert len(baseline["plans"]) == 1
+            assert compare_with_history(history, {"plan_details": full_scan}, baseline)["status"] == "stable"
+            assert compare_with_history(history[:1], {"plan_details": full_scan})["status"] == "stable"
+
+            changed = compare_with_history(history, {"plan_details": by_index}, baseline)
+            assert changed["status"] == "plan_changed"
+            assert changed["old_plan_digest"] == encode_plan(full_scan)[0]
+            assert changed["new_plan_digest"] == encode_plan(by_index)[0]
+            assert compare_with_history(history[:1], {"plan_details": by_index})["status"] == "plan_changed"
+
+            history_tracker.store_history("fp", "db", "unknown", 100, {}, [], by_index)
+            assert get_baseline("fp", "db")["plans"] == {encode_plan(full_scan)[0]: 4, encode_plan(by_index)[0]: 1}
+        finally:
+            history_tracker.history_store = original
+        store.close()
+
+
+def test_plans_are_stored_once_and_round_trip():
+    import history_tracker
+    plan = [
+        {"id": 0, "operation": "SELECT STATEMENT", "cost": 12, "depth": 0, "plan_hash_value": 42},
+        {"id": 1, "operation": "TABLE ACCESS", "options": "FULL", "object_name": "ORDERS", "cost": 12, "depth": 1},
+    ]
+    digest, text, runtime = encode_plan(plan)
+    assert runtime is None
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        for i in range(5):
+            store.add(("fp", "db", f"2026-01-01T00:00:{i:02d}", "42", 12, "{}", "[]", digest, None), (digest, "42", text))
+        store.flush()
+        conn = store.connect()
+        assert conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM executions WHERE plan_digest = ?", (digest,)).fetchone()[0] == 5
+
+        original, history_tracker.history_store = history_tracker.history_store, store
+        try:
+            assert get_plan(digest) == plan
+            assert get_baseline("fp", "db")["dominant_plan_digest"] == digest
+        finally:
+            history_tracker.history_store = original
+        store.close()
+
+
+def test_runtime_figures_do_not_change_the_plan_digest():
+    import history_tracker
+    plan = [
+        {"id": 0, "operation": "SELECT STATEMENT", "cost": 12},
+        {"id": 1, "parent_id": 0, "operation": "TABLE ACCESS", "options": "FULL", "object_name": "ORDERS", "cost": 12},
+    ]
+    first = [dict(step, child_number=0, a_rows=10, buffers=30, elapsed_ms=1.5) for step in plan]
+    second = [dict(step, child_number=2, a_rows=9000, buffers=4100, elapsed_ms=88.0) for step in plan]
+    (d1, t1, r1), (d2, t2, r2) = encode_plan(first), encode_plan(second)
+    assert d1 == d2 and t1 == t2 and r1 != r2
+    assert d1 != encode_plan([plan[0], dict(plan[1], options="BY INDEX ROWID")])[0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        for i, (runtime, text) in enumerate([(r1, t1), (r2, t2)]):
+            store.add(("fp", "db", f"2026-01-01T00:00:{i:02d}", "42", 12, "{}", "[]", d1, runtime), (d1, "42", text))
+        store.flush()
+        assert store.connect().execute("SELECT COUNT(*) FROM plans").fetchone()[0] == 1
+
+        original, history_tracker.history_store = history_tracker.history_store, store
+        try:
+            assert get_plan(d1) == plan
+            history = history_tracker.get_recent_history("fp", "db", days=3650)
+            assert [h["runtime_stats"][1]["a_rows"] for h in history] == [9000, 10]
+        finally:
+            history_tracker.history_store = original
+        store.close()
+
+
+def test_migrations_run_once_and_snapshots_share_the_file():
+    from monitoring.snapshot_manager import SnapshotManager
+    from storage import MIGRATIONS
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "shared.db"
+        store = Storage(path)
+        assert store.migrate() == MIGRATIONS[-1][0]
+        assert store.migrate() == MIGRATIONS[-1][0]
+        versions = store.connect().execute("SELECT COUNT(*) FROM schema_version").fetchone()[0]
+        assert versions == len(MIGRATIONS)
+
+        snapshots = SnapshotManager(str(path))
+        assert snapshots.save_health_snapshot("db", {"timestamp": "2026-01-01T00:00:00", "cpu_usage_pct": 12.5})
+        assert snapshots.get_health_history("db", hours=24 * 365 * 10)[0]["cpu_usage_pct"] == 12.5
+        tables = {r[0] for r in store.connect().execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert {"executions", "baselines", "plans", "system_health_snapshots"} <= tables
+
+
+
+def test_failed_migration_is_rolled_back():
+    import storage as storage_module
+
+    def broken(conn, store):
+        conn.execute("CREATE TABLE half_done (id INTEGER)")
+        conn.execute("ALTER TABLE executions ADD COLUMN half_done_column TEXT")
+        raise RuntimeError("migration failed")
+
+    latest = storage_module.MIGRATIONS[-1][0]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Storage(Path(tmp) / "history.db")
+        assert store.migrate() == latest
+        storage_module.MIGRATIONS.append((latest + 1, "broken", broken))
+        try:
+            store._migrated = False
+            try:
+                store.migrate()
+                assert False, "migration error was swallowed"
+            except RuntimeError:
+                pass
+        finally:
+            storage_module.MIGRATIONS.pop()
+
+        conn = store.connect()
+        assert store.schema_version() == latest
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+        assert "half_done_column" not in {r[1] for r in conn.execute("PRAGMA table_info(executions)")}
+        assert not conn.in_transaction
+
+
+if __name__ == "__main__":
+    test_concurrent_inserts_are_batched()
+    test_close_writes_pending_rows()
+    test_synchronous_mode()
+    test_baseline_running_statistics()
+    test_different_explain_plans_are_a_plan_change()
+    test_plans_are_stored_once_and_round_trip()
+    test_runtime_figures_do_not_change_the_plan_digest()
+    test_migrations_run_once_and_snapshots_share_the_file()
+    test_failed_migration_is_rolled_back()
+    print("✅ History store behaves")
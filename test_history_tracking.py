@@ -6,15 +6,20 @@ Usage:
 2. Run with DIFFERENT literal values → Should match as same fingerprint
 """
 
+import os
 import sys
+import tempfile
 sys.path.insert(0, 'server')
 
+# Never the server's own database; a fixed temp file so history builds up across runs
+os.environ["METAQUERY_DB_PATH"] = os.path.join(tempfile.gettempdir(), "metaquery_test_history.db")
+
 from history_tracker import normalize_and_hash, store_history, get_recent_history
 import sqlite3
 from pathlib import Path
 
 # Database path
-DB_PATH = Path("server/data/query_history.db")
+DB_PATH = Path(os.environ["METAQUERY_DB_PATH"])
 
 def test_fingerprinting():
     """Test that queries with different literals get same fingerprint."""
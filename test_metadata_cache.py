@@ -0,0 +1,57 @@
+"""
+Test the Oracle metadata cache: top-ups replace entries under the lock
+instead of mutating data that other analyses hold by reference.
+
+Usage:
+    python test_metadata_cache.py   (or: pytest test_metadata_cache.py)
+"""
+
+import sys
+import threading
+sys.path.insert(0, 'server')
+
+from tools.oracle_metadata_cache import MetadataCache
+
+KEY = ("preset", "APP", "ORDERS")
+
+
+def _add_column(name):
+    def top_up(data):
+        known = {c["column_name"] for c in data["column_stats"]}
+        extra = [] if name in known else [{"column_name": name}]
+        return dict(data, column_stats=data["column_stats"] + extra,
+                    columns_checked=data["columns_checked"] | {name})
+    return top_up
+
+
+def test_update_replaces_without_mutating():
+    cache = MetadataCache()
+    cache.put(KEY, {"column_stats": [{"column_name": "ID"}], "columns_checked": {"ID"}}, version="v1")
+    held = cache.get(KEY, "v1")
+
+    new = cache.update(KEY, _add_column("STATUS"), version="v1")
+    assert [c["column_name"] for c in new["column_stats"]] == ["ID", "STATUS"]
+    assert held["column_stats"] == [{"column_name": "ID"}] and held["columns_checked"] == {"ID"}
+    assert cache.get(KEY, "v1") is new
+    # Entry invalidated by DDL / stats: nothing to update
+    assert cache.update(KEY, _add_column("X"), version="v2") is None
+
+
+def test_concurrent_top_ups_do_not_duplicate():
+    cache = MetadataCache()
+    cache.put(KEY, {"column_stats": [], "columns_checked": set()}, version="v1")
+    threads = [threading.Thread(target=cache.update, args=(KEY, _add_column(f"C{i % 5}"), "v1")) for i in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    data = cache.get(KEY, "v1")
+    assert sorted(c["column_name"] for c in data["column_stats"]) == ["C0", "C1", "C2", "C3", "C4"]
+    assert data["columns_checked"] == {"C0", "C1", "C2", "C3", "C4"}
+
+
+if __name__ == "__main__":
+    test_update_replaces_without_mutating()
+    test_concurrent_top_ups_do_not_duplicate()
+    print("✅ Metadata cache top-ups are atomic")
@@ -0,0 +1,92 @@
+"""
+Test phase timing: histogram quantiles, PhaseTimer breakdowns and timing
+of phases that run on worker threads.
+
+Usage:
+    python test_metrics.py   (or: pytest test_metrics.py)
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, 'server')
+
+import metrics
+from metrics import Histogram, PhaseTimer, phase, run_in_context, register_collector, render_prometheus
+
+
+def test_histogram_quantiles():
+    h = Histogram("t", "test", ("phase",), buckets=(0.01, 0.1, 1))
+    for _ in range(90):
+        h.observe(("x",), 0.005)
+    for _ in range(10):
+        h.observe(("x",), 0.5)
+
+    assert h.series()[("x",)]["count"] == 100
+    assert h.quantile(("x",), 0.5) <= 0.01
+    assert 0.1 < h.quantile(("x",), 0.95) <= 1
+    assert h.quantile(("missing",), 0.5) is None
+
+
+def test_timer_collects_phases_from_worker_threads():
+    executor = ThreadPoolExecutor(2)
+
+    def work():
+        with phase("metadata.table_stats"):
+            time.sleep(0.01)
+
+    with PhaseTimer("test") as timer:
+        with phase("explain"):
+            time.sleep(0.01)
+        executor.submit(run_in_context(work)).result()
+        executor.submit(run_in_context(work)).result()
+
+    breakdown = timer.as_dict()
+    assert breakdown["phases"]["explain"]["calls"] == 1
+    assert breakdown["phases"]["metadata.table_stats"]["calls"] == 2
+    assert breakdown["phases"]["metadata.table_stats"]["ms"] >= 20
+    assert breakdown["total_ms"] >= breakdown["phases"]["explain"]["ms"]
+    assert metrics.current_timer() is None
+
+
+def test_attach_is_opt_in():
+    with PhaseTimer("test") as timer:
+        with phase("validate"):
+            pass
+
+    saved = metrics.ATTACH_TIMINGS
+    try:
+        metrics.ATTACH_TIMINGS = False
+        assert "_timings" not in timer.attach({"facts": {}})
+        metrics.ATTACH_TIMINGS = True
+        result = timer.attach({"facts": {}})
+        assert "validate" in result["_timings"]["phases"]
+        assert result["_timings"]["response_bytes"] > 0
+    finally:
+        metrics.ATTACH_TIMINGS = saved
+
+
+def test_prometheus_exposition():
+    metrics.TOOL_CALLS.inc(("analyze_oracle_query", "prod", "ok"))
+    metrics.TOOL_SECONDS.observe(("analyze_oracle_query", "prod"), 0.3)
+    register_collector(lambda: [("test_cache_hits_total", "counter", "hits", [({"cache": "a"}, 1)])])
+    register_collector(lambda: [("test_cache_hits_total", "counter", "hits", [({"cache": "b"}, 2)])])
+
+    text = render_prometheus()
+    lines = text.splitlines()
+
+    assert 'metaquery_tool_calls_total{tool="analyze_oracle_query",preset="prod",status="ok"} 1' in lines
+    assert 'metaquery_tool_duration_seconds_bucket{tool="analyze_oracle_query",preset="prod",le="0.25"} 0' in lines
+    assert 'metaquery_tool_duration_seconds_bucket{tool="analyze_oracle_query",preset="prod",le="+Inf"} 1' in lines
+    # One HELP/TYPE per family even when several collectors contribute
+    assert lines.count("# TYPE test_cache_hits_total counter") == 1
+    assert 'test_cache_hits_total{cache="b"} 2' in lines
+    assert text.endswith("\n")
+
+
+if __name__ == "__main__":
+    test_histogram_quantiles()
+    test_timer_collects_phases_from_worker_threads()
+    test_attach_is_opt_in()
+    test_prometheus_exposition()
+    print("✅ Phase timing works")
@@ -0,0 +1,53 @@
+"""
+Test MySQL SQL validation: keywords hidden in /*! ... */ executable
+comments (run by the server) are blocked like any other code.
+
+Usage:
+    python test_mysql_validation.py   (or: pytest test_mysql_validation.py)
+"""
+
+import sys
+sys.path.insert(0, 'server')
+
+from tools.mysql_collector_impl import validate_sql
+
+
+class _Cursor:
+    """Stands in for the EXPLAIN round trip; records what would be sent."""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+    def fetchall(self):
+        return []
+
+
+def _check(sql):
+    cursor = _Cursor()
+    return validate_sql(cursor, sql), cursor.executed
+
+
+def test_executable_comments_are_checked():
+    for sql in (
+        "SELECT 1 /*! ; DROP TABLE t */",
+        "SELECT * FROM t /*! FOR UPDATE */",
+        "SELECT * FROM t /*!50000 INTO OUTFILE '/tmp/t.csv' */",
+    ):
+        (valid, _, dangerous), executed = _check(sql)
+        assert not valid and dangerous, sql
+        assert executed == [], sql  # rejected before EXPLAIN
+
+
+def test_plain_comments_and_arithmetic_still_pass():
+    for sql in ("SELECT 1 /* DROP TABLE t */", "SELECT 2*/*c*/3 FROM dual"):
+        (valid, error, _), _ = _check(sql)
+        assert valid, (sql, error)
+
+
+if __name__ == "__main__":
+    test_executable_comments_are_checked()
+    test_plain_comments_and_arithmetic_still_pass()
+    print("✅ MySQL executable comments cannot hide statements")
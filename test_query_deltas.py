@@ -0,0 +1,90 @@
+"""
+Test per-interval query deltas computed from cumulative V$SQL counters:
+plain deltas, cursor reloads/resets, new cursors and per-child snapshots.
+
+Usage:
+    python test_query_deltas.py   (or: pytest test_query_deltas.py)
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+from datetime import datetime, timedelta
+sys.path.insert(0, 'server')
+
+# Keep the server's database out of it: storage resolves its path on import
+os.environ["METAQUERY_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "query_history.db")
+
+from monitoring.snapshot_manager import SnapshotManager, counter_deltas, load_time_iso
+
+LOADED = "2026-10-16T08:00:00"
+LOADED_VSQL = "2026-10-16/08:00:00"  # V$SQL.LAST_LOAD_TIME is VARCHAR2 in this form
+
+
+def _row(sql_id, cpu, executions, child=0, loaded=LOADED):
+    return {
+        "sql_id": sql_id, "child_number": child, "plan_hash_value": 111, "last_load_time": loaded,
+        "sql_text": "SELECT 1 FROM dual", "executions": executions, "cpu_seconds": cpu,
+        "elapsed_seconds": cpu, "buffer_gets": 10 * executions, "disk_reads": 0, "rows_processed": executions,
+        "avg_cpu_ms": cpu * 1000 / executions, "avg_elapsed_ms": cpu * 1000 / executions, "parsing_schema": "APP",
+    }
+
+
+def test_counter_delta_rules():
+    previous = {**_row("a", 10.0, 100), "observed_at": "2026-10-16T09:00:00"}
+    assert counter_deltas(previous, _row("a", 12.5, 150)) == ("delta", {
+        "executions": 50, "cpu_seconds": 2.5, "elapsed_seconds": 2.5,
+        "buffer_gets": 500, "disk_reads": 0, "rows_processed": 50,
+    })
+    # The raw V$SQL load time is the same load as the stored ISO one
+    assert load_time_iso(LOADED_VSQL) == LOADED
+    assert counter_deltas(previous, _row("a", 12.5, 150, loaded=LOADED_VSQL))[0] == "delta"
+    # Reloaded cursor, or counters that went down: count from zero
+    assert counter_deltas(previous, _row("a", 20.0, 400, loaded="2026-10-16T09:30:00"))[0] == "reset"
+    status, deltas = counter_deltas(previous, _row("a", 1.0, 5))
+    assert status == "reset" and deltas["executions"] == 5
+    # Unknown cursor: new if loaded after the previous collection, else a baseline
+    assert counter_deltas(None, _row("b", 3.0, 3, loaded="2026-10-16T09:10:00"), "2026-10-16T09:00:00")[0] == "new"
+    status, deltas = counter_deltas(None, _row("b", 3.0, 3), "2026-10-16T09:00:00")
+    assert status == "baseline" and deltas["cpu_seconds"] is None
+
+
+def test_snapshots_store_interval_deltas():
+    t0 = datetime.now().replace(microsecond=0) - timedelta(minutes=20)
+    t1 = t0 + timedelta(minutes=10)
+    with tempfile.TemporaryDirectory() as tmp:
+        mgr = SnapshotManager(str(Path(tmp) / "snap.db"))
+        mgr.save_query_snapshots("db", t0, [_row("a", 10.0, 100), _row("a", 1.0, 10, child=1)], "cpu")
+        second = [_row("a", 12.0, 120, loaded=LOADED_VSQL), _row("a", 4.0, 40, child=1)]
+        mgr.save_query_snapshots("db", t1, second, "cpu")
+
+        assert [q["delta_status"] for q in second] == ["delta", "delta"]
+        assert second[0]["interval_seconds"] == 600
+        trends = mgr.get_query_trends("db", "a", hours=1)
+        assert len(trends) == 4  # one row per child cursor and snapshot
+        assert [t["delta_cpu_seconds"] for t in trends if t["timestamp"] == str(t1)] == [2.0, 3.0]
+
+        # Rollups sum the children of a snapshot
+        rollup = [p for p in mgr.get_rollups("query", "db", "1d", hours=48, sql_id="a") if p.get("delta_cpu_seconds")]
+        assert rollup[0]["delta_cpu_seconds_max"] == 5.0
+
+
+def test_counter_state_ages_on_the_database_clock():
+    # The database clock is years behind this host: state is aged against
+    # the newest observed_at of the preset, never against datetime.now()
+    with tempfile.TemporaryDirectory() as tmp:
+        mgr = SnapshotManager(str(Path(tmp) / "snap.db"))
+        mgr.apply_deltas("db", [_row("stale", 1.0, 1)], observed_at="2020-01-01T08:00:00")
+        mgr.apply_deltas("db", [_row("a", 1.0, 1)], observed_at="2020-01-03T08:00:00")
+        mgr.apply_deltas("other", [_row("b", 1.0, 1)], observed_at="2019-06-01T08:00:00")
+        mgr.cleanup_old_snapshots()
+
+        kept = mgr.storage.connect().execute("SELECT db_name, sql_id FROM query_counter_state ORDER BY db_name").fetchall()
+        assert kept == [("db", "a"), ("other", "b")]
+
+if __name__ == "__main__":
+    test_counter_delta_rules()
+    test_snapshots_store_interval_deltas()
+    test_counter_state_ages_on_the_database_clock()
+    print("✅ Interval deltas from cumulative V$SQL counters")
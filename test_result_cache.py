@@ -0,0 +1,89 @@
+"""
+Test the analyze_* result cache: TTL hits, single-flight coalescing of
+concurrent identical calls, and that failures are never cached.
+
+Usage:
+    python test_result_cache.py   (or: pytest test_result_cache.py)
+"""
+
+import os
+import sys
+import tempfile
+import time
+import threading
+sys.path.insert(0, 'server')
+
+# Keep the server's database out of it: storage resolves its path on import
+os.environ["METAQUERY_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "query_history.db")
+
+from tools.analysis_result_cache import ResultCache, statement_fingerprint
+
+
+def test_hit_reports_age():
+    cache = ResultCache(ttl_seconds=60)
+    calls = []
+
+    first, info1 = cache.get_or_compute("k", lambda: calls.append(1) or {"facts": {"n": 1}})
+    second, info2 = cache.get_or_compute("k", lambda: calls.append(1) or {"facts": {"n": 2}})
+
+    assert len(calls) == 1
+    assert info1["hit"] is False
+    assert info2["hit"] is True and info2["age_seconds"] >= 0
+    assert second == first
+
+    second["facts"]["n"] = 99  # callers get private copies
+    third, _ = cache.get_or_compute("k", lambda: {})
+    assert third["facts"]["n"] == 1
+
+
+def test_concurrent_identical_calls_share_one_computation():
+    cache = ResultCache(ttl_seconds=60)
+    started = []
+    release = threading.Event()
+    results = []
+
+    def compute():
+        started.append(1)
+        release.wait(5)
+        return {"facts": {"n": 1}}
+
+    def call():
+        results.append(cache.get_or_compute("k", compute))
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(started) == 1
+    assert sum(1 for _, info in results if info["coalesced"]) == 7
+    assert all(r == {"facts": {"n": 1}} for r, _ in results)
+
+
+def test_errors_are_not_cached():
+    cache = ResultCache(ttl_seconds=60)
+    cache.get_or_compute("k", lambda: {"error": "ORA-00942"})
+    result, info = cache.get_or_compute("k", lambda: {"facts": {}})
+
+    assert info["hit"] is False
+    assert "error" not in result
+
+
+def test_fingerprint_ignores_formatting_but_not_literals():
+    a = statement_fingerprint("select * from t where x = 1")
+    b = statement_fingerprint("SELECT *\n  FROM t -- comment\n WHERE x = 1")
+    c = statement_fingerprint("select * from t where x = 2")
+
+    assert a == b
+    assert a != c
+
+
+if __name__ == "__main__":
+    test_hit_reports_age()
+    test_concurrent_identical_calls_share_one_computation()
+    test_errors_are_not_cached()
+    test_fingerprint_ignores_formatting_but_not_literals()
+    print("✅ Result cache behaves")
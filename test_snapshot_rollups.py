@@ -0,0 +1,82 @@
+"""
+Test snapshot rollups: 5m/1h/1d buckets maintained on save, p95 of closed
+buckets, backfill of existing snapshots, and trend resolution selection.
+
+Usage:
+    python test_snapshot_rollups.py   (or: pytest test_snapshot_rollups.py)
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+from datetime import datetime, timedelta
+sys.path.insert(0, 'server')
+
+# Keep the server's database out of it: storage resolves its path on import
+os.environ["METAQUERY_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "query_history.db")
+
+from monitoring.snapshot_manager import SnapshotManager, bucket_start, choose_resolution
+import monitoring.snapshot_manager as snapshot_manager
+
+
+def _health(at, cpu):
+    return {"timestamp": at.isoformat(), "cpu_usage_pct": cpu, "active_sessions": 10}
+
+
+def test_hourly_rollup_matches_raw_snapshots():
+    hour = bucket_start(datetime.now() - timedelta(hours=3), "1h")
+    cpus = [float(i) for i in range(1, 13)]  # 12 snapshots, one per 5 minutes
+    with tempfile.TemporaryDirectory() as tmp:
+        mgr = SnapshotManager(str(Path(tmp) / "snap.db"))
+        for i, cpu in enumerate(cpus):
+            mgr.save_health_snapshot("db", _health(hour + timedelta(minutes=5 * i), cpu))
+        # Saving the same snapshot again must not count it twice
+        mgr.save_health_snapshot("db", _health(hour, cpus[0]))
+
+        def hourly():
+            return [p for p in mgr.get_rollups("health", "db", "1h", hours=6) if p["timestamp"].startswith(str(hour)[:13])]
+
+        open_hour = hourly()
+        # The next hour's first snapshot closes the bucket: p95 from the raw rows
+        mgr.save_health_snapshot("db", _health(hour + timedelta(hours=1), 50.0))
+        closed_hour = hourly()
+        five_min = mgr.get_rollups("health", "db", "5m", hours=6)
+
+    assert len(open_hour) == 1 and open_hour[0]["cpu_usage_pct_p95"] is None
+    assert len(closed_hour) == 1
+    point = closed_hour[0]
+    assert point["samples"] == 12
+    assert point["cpu_usage_pct"] == sum(cpus) / 12
+    assert (point["cpu_usage_pct_min"], point["cpu_usage_pct_max"], point["cpu_usage_pct_p95"]) == (1.0, 12.0, 12.0)
+    assert len(five_min) == 13
+
+
+def test_existing_snapshots_are_backfilled():
+    at = datetime.now() - timedelta(hours=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "snap.db")
+        mgr = SnapshotManager(path)
+        mgr.save_health_snapshot("db", _health(at, 50.0))
+        conn = mgr.storage.connect()
+        conn.execute("DELETE FROM snapshot_rollups")
+        conn.commit()
+
+        snapshot_manager._backfill_checked.discard(mgr.db_path)
+        mgr = SnapshotManager(path)
+        assert mgr.get_rollups("health", "db", "1d", hours=48)[0]["cpu_usage_pct"] == 50.0
+
+
+def test_resolution_choice():
+    assert choose_resolution(1, min_points=24) == "raw"
+    assert choose_resolution(6, min_points=24) == "5m"
+    assert choose_resolution(24, min_points=24) == "1h"
+    assert choose_resolution(24 * 7, min_points=24) == "1h"
+    assert choose_resolution(24 * 30, min_points=24) == "1d"
+
+
+if __name__ == "__main__":
+    test_hourly_rollup_matches_raw_snapshots()
+    test_existing_snapshots_are_backfilled()
+    test_resolution_choice()
+    print("✅ Snapshot rollups behave")
@@ -0,0 +1,135 @@
+"""
+Test that the Oracle collector's dictionary SQL has a stable shape.
+
+The metadata queries must bind table/column lists as collections, so the
+set of distinct SQL texts does not depend on how many tables a query touches
+(otherwise every analysis hard-parses new cursors on the target database).
+
+Usage:
+    python test_stable_sql_shapes.py   (or: pytest test_stable_sql_shapes.py)
+"""
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, 'server')
+
+# Keep the server's database out of it: storage resolves its path on import
+os.environ["METAQUERY_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "query_history.db")
+
+from tools.oracle_collector_impl import (
+    collect_table_metadata,
+    get_optimizer_parameters,
+    get_object_versions,
+    resolve_column_targets,
+)
+
+
+class FakeListType:
+    def newobject(self, values):
+        return list(values)
+
+
+class FakeConnection:
+    def gettype(self, name):
+        assert name == "SYS.ODCIVARCHAR2LIST"
+        return FakeListType()
+
+
+class RecordingCursor:
+    """Cursor stand-in that records every SQL text and returns no rows."""
+
+    def __init__(self):
+        self.connection = FakeConnection()
+        self.statements = []
+        self.description = [("X",)]
+
+    def execute(self, sql, binds=None, **kwargs):
+        self.statements.append((sql, binds or kwargs))
+
+    def fetchall(self):
+        return []
+
+
+def run_collector(tables, columns):
+    cur = RecordingCursor()
+    collect_table_metadata(cur, tables, {t: columns for t in tables})
+    get_optimizer_parameters(cur)
+    get_object_versions(cur, tables)
+    return cur.statements
+
+
+def sql_texts(statements):
+    return {sql for sql, _ in statements}
+
+
+def test_sql_texts_independent_of_table_count():
+    """1 table and 25 tables must produce exactly the same set of SQL texts."""
+    one = run_collector([("HR", "EMPLOYEES")], ["EMPLOYEE_ID"])
+    many = run_collector(
+        [(f"OWNER{i % 3}", f"TABLE_{i}") for i in range(25)],
+        [f"COL_{i}" for i in range(40)],
+    )
+
+    assert sql_texts(one) == sql_texts(many)
+    assert len(one) == len(many)
+
+
+def test_no_literals_interpolated():
+    """Owner/table/column names travel as binds, never inside the SQL text."""
+    statements = run_collector([("SCOTT", "SECRET_TABLE")], ["SECRET_COLUMN"])
+
+    for sql, binds in statements:
+        assert "SCOTT" not in sql
+        assert "SECRET_TABLE" not in sql
+        assert "SECRET_COLUMN" not in sql
+
+    bound = [b for _, b in statements if b]
+    assert any("SECRET_TABLE" in v for b in bound for v in b.values())
+
+
+def test_exact_pairs_are_bound():
+    """The pair filter restricts cross-owner matches to the requested tables."""
+    statements = run_collector([("A", "X"), ("B", "Y")], ["C1"])
+    binds = next(b for _, b in statements if b and "pairs" in b)
+
+    assert binds["owners"] == ["A", "B"]
+    assert binds["tabs"] == ["X", "Y"]
+    assert binds["pairs"] == ["A.X", "B.Y"]
+
+
+def test_column_stats_bound_per_table():
+    """Column stats are requested for exact (table, column) pairs only."""
+    cur = RecordingCursor()
+    collect_table_metadata(cur, [("A", "X"), ("B", "Y")], {("A", "X"): ["C1"], ("B", "Y"): ["C2"]})
+    binds = next(b for _, b in cur.statements if b and "triples" in b)
+
+    assert binds["cols"] == ["C1", "C2"]
+    assert binds["triples"] == ["A.X.C1", "B.Y.C2"]
+
+
+def test_alias_columns_resolve_to_their_tables():
+    sql = """
+        SELECT e.first_name, d.department_name
+        FROM hr.employees e JOIN hr.departments d ON e.department_id = d.department_id
+        WHERE e.salary > :min_salary
+    """
+    plan = [
+        {"operation": "TABLE ACCESS", "object_owner": "HR", "object_name": "EMPLOYEES",
+         "object_alias": "E@SEL$1", "filter_predicates": '"E"."SALARY">:MIN_SALARY AND "HIRE_DATE" IS NOT NULL'},
+    ]
+    tables = [("HR", "DEPARTMENTS"), ("HR", "EMPLOYEES")]
+
+    targets = resolve_column_targets(sql, plan, tables)
+
+    assert targets[("HR", "EMPLOYEES")] == ["DEPARTMENT_ID", "FIRST_NAME", "HIRE_DATE", "SALARY"]
+    assert targets[("HR", "DEPARTMENTS")] == ["DEPARTMENT_ID", "DEPARTMENT_NAME"]
+
+
+if __name__ == "__main__":
+    test_sql_texts_independent_of_table_count()
+    test_no_literals_interpolated()
+    test_exact_pairs_are_bound()
+    test_column_stats_bound_per_table()
+    test_alias_columns_resolve_to_their_tables()
+    print("✅ Collector SQL shapes are stable")